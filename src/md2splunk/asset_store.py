@@ -0,0 +1,76 @@
+import os
+import logging
+
+from md2splunk.file_handler import format_bytes
+
+
+class AssetStore:
+    """
+    A content-addressed view of the files published in appserver/static.
+
+    Every asset is registered with its content hash. The first path registered for a
+    given content becomes its canonical path; later files with the same content become
+    aliases of it and are not published, and references to them are rewritten to the
+    canonical path. Paths are relative to appserver/static, e.g. 'images/sub/a.png'.
+    """
+
+    def __init__(self):
+        self.canonical_paths = {}
+        self.aliases = {}
+        self.saved_bytes = 0
+
+    def publish(self, path, file_hash):
+        """Registers a file that is always published at path, e.g. one referenced from CSS."""
+        self.canonical_paths.setdefault(file_hash, path)
+
+    def add(self, path, file_hash, size):
+        """
+        Registers a file whose references can be rewritten.
+
+        Returns:
+            str: The canonical path for its content, which is path itself unless an
+                 identical file was registered before.
+        """
+        canonical_path = self.canonical_paths.setdefault(file_hash, path)
+        if canonical_path != path:
+            self.aliases[path] = canonical_path
+            self.saved_bytes += size
+        return canonical_path
+
+
+def plan_image_dedup(images_folder, image_hashes, always_published=()):
+    """
+    Finds images that are byte-identical to another image.
+
+    Args:
+        images_folder (str): The source 'images' folder.
+        image_hashes (dict): Content hashes keyed by path relative to images_folder.
+        always_published (iterable): Images that must keep their own file (e.g. referenced
+                                     from stylesheets, whose references are not rewritten).
+
+    Returns:
+        AssetStore: The store; its aliases map 'images/<alias>' to 'images/<canonical>'.
+    """
+    store = AssetStore()
+    always_published = set(always_published)
+    for reference in sorted(always_published & image_hashes.keys()):
+        store.publish(f"images/{reference}", image_hashes[reference])
+    for reference in sorted(image_hashes.keys() - always_published):
+        size = os.path.getsize(os.path.join(images_folder, reference))
+        store.add(f"images/{reference}", image_hashes[reference], size)
+    return store
+
+
+def image_aliases(store):
+    """Returns the store's image aliases as {alias: canonical} paths relative to the 'images' folder."""
+    prefix = 'images/'
+    return {alias[len(prefix):]: canonical[len(prefix):] for alias, canonical in store.aliases.items()
+            if alias.startswith(prefix) and canonical.startswith(prefix)}
+
+
+def log_dedup_summary(image_store, download_duplicates, download_saved_bytes):
+    """Logs how many duplicate assets were not published and how many bytes that saved."""
+    duplicates = len(image_store.aliases) + download_duplicates
+    saved_bytes = image_store.saved_bytes + download_saved_bytes
+    logging.info(f"Asset deduplication: {duplicates} duplicate files not published "
+                 f"({len(image_store.aliases)} images, {download_duplicates} downloads), {format_bytes(saved_bytes)} saved.")
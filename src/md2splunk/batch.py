@@ -0,0 +1,173 @@
+import os
+import sys
+import glob
+import json
+import time
+import logging
+import argparse
+from concurrent.futures.process import BrokenProcessPool
+
+from md2splunk.md2app import build_app, parse_args, configure_logging
+from md2splunk.errors import BuildError
+from md2splunk.build_config import BuildConfig
+from md2splunk.manifest import get_manifest_path
+from md2splunk.source_catalog import SourceCatalog
+from md2splunk.file_handler import format_bytes, new_process_pool
+
+# md2app options that name a single output file or keep the process running,
+# which do not make sense for a batch of courses
+UNSUPPORTED_OPTIONS = ('--watch', '--report', '--profile')
+
+
+def not_a_course(path):
+    """
+    Tells why a directory matched by a glob pattern is not a course.
+
+    Returns:
+        str: The reason, or None if path looks like a course (metadata.yml and guides).
+    """
+    if os.path.isfile(os.path.join(path, 'default', 'app.conf')) or get_manifest_path(path).is_file():
+        return "it is an app generated by md2app"
+    catalog = SourceCatalog(path)
+    if catalog.metadata_path is None:
+        return "it has no metadata.yml"
+    if not catalog.guides:
+        return "it has no guides"
+    return None
+
+
+def expand_courses(patterns):
+    """
+    Expands course directories and glob patterns.
+
+    Directories matched by a glob pattern that are not courses are skipped, e.g. the
+    apps an earlier batch wrote next to their courses. Directories named explicitly
+    are always built.
+
+    Args:
+        patterns (list): Directories or glob patterns, e.g. 'courses/*'.
+
+    Returns:
+        list: Course directories in the given order, each listed once. Patterns that
+              match nothing are kept as is, so the build reports them as invalid.
+    """
+    courses = []
+    for pattern in patterns:
+        matches = [pattern]
+        if glob.has_magic(pattern):
+            matches = []
+            for path in sorted(path for path in glob.glob(pattern) if os.path.isdir(path)):
+                reason = not_a_course(path)
+                if reason:
+                    logging.info(f"Skipping {path}: {reason}")
+                else:
+                    matches.append(path)
+        if not matches:
+            logging.warning(f"No course directories match {pattern}")
+        for course in matches:
+            if course not in courses:
+                courses.append(course)
+    return courses
+
+
+def build_course(course, build_args, executor):
+    """
+    Builds one course, turning build failures into a result.
+
+    Returns:
+        dict: 'course', 'status' ('ok' or 'failed'), 'seconds', 'error', 'warnings'
+              and the build report of a successful build.
+    """
+    start = time.perf_counter()
+    result = {'course': course, 'status': 'failed', 'seconds': None, 'error': None, 'warnings': [], 'report': None}
+    try:
+        build_result = build_app(BuildConfig.from_args(parse_args([course, *build_args]), command='md2app-batch'), executor)
+        result['status'] = 'ok'
+        result['warnings'] = build_result.warnings
+        result['report'] = build_result.report
+    except BuildError as e:
+        if isinstance(e.__cause__, BrokenProcessPool):
+            raise e.__cause__
+        logging.error(f"Building {course} failed: {e}")
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def log_batch_summary(results):
+    """Logs one line per course and the number of failures."""
+    logging.info("=== Batch summary ===")
+    for result in results:
+        line = f"{result['status'].upper():6} {result['course']} ({result['seconds']:.2f}s)"
+        if result['report']:
+            report = result['report']
+            line += f": {report['total_files']} files, {format_bytes(report['total_bytes'])}"
+            if report.get('archive'):
+                line += f" -> {report['archive']}"
+            if result['warnings']:
+                line += f" ({len(result['warnings'])} warnings)"
+        elif result['error']:
+            line += f": {result['error']}"
+        logging.info(line)
+    failed = [result for result in results if result['status'] != 'ok']
+    logging.info(f"{len(results) - len(failed)} of {len(results)} courses built, {len(failed)} failed.")
+
+
+def main(argv=None):
+    """
+    Builds several courses in one process.
+
+    The courses share the process and its caches (Markdown renderers, image sizes, the
+    render and image caches) and one pool of worker processes for rendering guides.
+    A course that fails is reported and the batch moves on to the next one; the exit
+    status is 1 if any course failed.
+    """
+    configure_logging()
+    parser = argparse.ArgumentParser(
+        description="Build several Splunk apps in one process. Options not listed here are passed to every md2app build.")
+    parser.add_argument('courses', nargs='+', help="Course source directories or glob patterns (e.g. 'courses/*')")
+    parser.add_argument('--summary', type=str, default=None,
+                        help="Write the status, build time and build report of every course as JSON to this path")
+    args, build_args = parser.parse_known_args(argv)
+
+    for option in UNSUPPORTED_OPTIONS:
+        if any(arg == option or arg.startswith(f"{option}=") for arg in build_args):
+            parser.error(f"{option} is not supported in batch builds")
+    # Validate the shared options once, before building anything
+    jobs = max(1, parse_args(['.', *build_args]).jobs)
+
+    courses = expand_courses(args.courses)
+    if not courses:
+        parser.error("no course directories to build")
+
+    executor = None
+    results = []
+    try:
+        for index, course in enumerate(courses, start=1):
+            if executor is None and jobs > 1:
+                executor = new_process_pool(jobs, ignore_interrupts=True)
+            logging.info(f"=== Building course {index} of {len(courses)}: {course} ===")
+            try:
+                results.append(build_course(course, build_args, executor))
+            except BrokenProcessPool as e:
+                # A worker died; start a new pool for the remaining courses
+                logging.error(f"Worker pool failed while building {course}: {e}")
+                executor.shutdown(wait=False)
+                executor = None
+                results.append({'course': course, 'status': 'failed', 'seconds': 0.0, 'error': str(e), 'warnings': [], 'report': None})
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    log_batch_summary(results)
+    if args.summary:
+        with open(args.summary, 'w', encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        logging.info(f"Wrote batch summary to {args.summary}")
+
+    sys.exit(1 if any(result['status'] != 'ok' for result in results) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,409 @@
+"""
+Benchmarks the build on synthetic courses.
+
+Generates a course of configurable size, times the main build steps and the full
+build on it, and writes the results as JSON so runs on different commits can be
+compared:
+
+    python -m md2splunk.benchmark --guides 40 --images 200 --output bench.json
+
+It also measures how long the command line tools take to import, and with
+--check-imports fails if they load a package that only a build phase needs:
+
+    python -m md2splunk.benchmark --check-imports --max-import-ms 150
+"""
+import os
+import sys
+import json
+import time
+import random
+import contextlib
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+from PIL import Image
+
+from md2splunk.md2app import build_app, parse_args
+from md2splunk.build_config import BuildConfig
+from md2splunk.source_catalog import SourceCatalog, GUIDE_NAME_PATTERN
+from md2splunk.renderer import render_markdown
+from md2splunk.xml_generator import convert_colons_to_blocks, generate_nav, extensions, extension_configs
+from md2splunk.html_pipeline import panel_pipeline
+from md2splunk.image_optimizer import DEFAULT_SRCSET_WIDTHS
+
+# Bump this whenever the generated courses or the measured steps change, so results
+# from different harness versions are not compared
+BENCHMARK_VERSION = 3
+
+# Modules behind the command line tools, whose import time is their startup time
+STARTUP_MODULES = ('md2splunk.md2app', 'md2splunk.batch', 'md2splunk.server')
+
+# Packages the command line tools must not import at startup; the build phases
+# that need them import them on first use
+DEFERRED_IMPORTS = ('markdown', 'pymdownx', 'lxml', 'yaml', 'PIL.Image', 'importlib.metadata')
+
+ADMONITION_TYPES = ('note', 'info', 'tip', 'hint', 'caution', 'warning', 'danger')
+
+WORDS = ('splunk', 'search', 'index', 'event', 'field', 'dashboard', 'panel', 'query', 'lookup', 'report',
+         'alert', 'token', 'macro', 'data', 'source', 'type', 'host', 'time', 'value', 'count')
+
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def _write_image(path, width, height, rng):
+    """Writes a PNG with some structure, so it compresses like a screenshot rather than noise."""
+    image = Image.new('RGB', (width, height), (rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    block = max(8, width // 16)
+    for _ in range(32):
+        x, y = rng.randrange(width), rng.randrange(height)
+        image.paste((rng.randrange(256), rng.randrange(256), rng.randrange(256)), (x, y, min(width, x + block), min(height, y + block)))
+    image.save(path, format='PNG')
+
+
+def generate_course(course_path, guides=10, sections=20, admonition_density=0.2, answer_density=0.2,
+                    images=20, image_size=(1600, 900), downloads=5, seed=0):
+    """
+    Writes a synthetic course with the layout md2app expects.
+
+    Args:
+        course_path (str): Directory to create the course in. It must not exist yet.
+        guides (int): Number of NN-*.md guides.
+        sections (int): Task sections per guide; each has a paragraph and a numbered list.
+        admonition_density (float): Probability that a section contains a ::: <type> block.
+        answer_density (float): Probability that a list step is followed by a ::: answers block.
+        images (int): Number of PNG images in images/ (a quarter of them in a subfolder).
+        image_size (tuple): (width, height) of the images.
+        downloads (int): Number of files linked from downloads.md.
+        seed (int): Seed of the random generator, so the same arguments give the same course.
+
+    Returns:
+        dict: The arguments the course was generated with.
+    """
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(course_path, 'images', 'screens'))
+    os.makedirs(os.path.join(course_path, 'files'))
+    os.makedirs(os.path.join(course_path, 'static'))
+
+    with open(os.path.join(course_path, 'metadata.yml'), 'w', encoding="utf-8") as f:
+        f.write("course_title: Benchmark Course\nversion: 1.0.0\ndescription: A synthetic course for benchmarks\n")
+
+    image_references = []
+    for index in range(images):
+        reference = f"screens/screen-{index:04d}.png" if index % 4 == 3 else f"figure-{index:04d}.png"
+        _write_image(os.path.join(course_path, 'images', reference), image_size[0], image_size[1], rng)
+        image_references.append(reference)
+    _write_image(os.path.join(course_path, 'static', 'appIcon.png'), 36, 36, rng)
+
+    for index in range(guides):
+        lines = [f"# Lab {index}: {_sentence(rng, 4)[:-1]}", ""]
+        for section in range(sections):
+            lines += [f"### Task {section + 1}: {_sentence(rng, 5)[:-1]}", "", _sentence(rng, 40), ""]
+            for step in range(1, 5):
+                lines.append(f"{step}. {_sentence(rng)}")
+                if image_references and rng.random() < 0.3:
+                    lines.append(f"    ![{_sentence(rng, 3)}](images/{rng.choice(image_references)})")
+                if rng.random() < answer_density:
+                    lines += ["", "    ::: answers", f"    {_sentence(rng)}", "    :::", ""]
+            lines.append("")
+            if rng.random() < admonition_density:
+                lines += [f"::: {rng.choice(ADMONITION_TYPES)}", _sentence(rng, 20), ":::", ""]
+            if rng.random() < 0.2:
+                lines += ["| Field | Value |", "| --- | --- |"] + [f"| {rng.choice(WORDS)} | {rng.randrange(1000)} |" for _ in range(5)] + [""]
+            if rng.random() < 0.2:
+                lines += ["```", "index=main sourcetype=access_combined | stats count by status", "```", ""]
+        guide_name = "00-introduction.md" if index == 0 else f"{index:02d}-lab-{index}.md"
+        with open(os.path.join(course_path, guide_name), 'w', encoding="utf-8") as f:
+            f.write('\n'.join(lines))
+
+    download_lines = ["# Downloads", ""]
+    for index in range(downloads):
+        file_name = f"dataset-{index:03d}.csv"
+        with open(os.path.join(course_path, 'files', file_name), 'w', encoding="utf-8") as f:
+            f.write('\n'.join(f"{row},{rng.choice(WORDS)},{rng.randrange(10 ** 6)}" for row in range(1000)))
+        download_lines.append(f"- [{file_name}](files/{file_name})")
+    with open(os.path.join(course_path, 'downloads.md'), 'w', encoding="utf-8") as f:
+        f.write('\n'.join(download_lines) + '\n')
+
+    return {
+        'guides': guides,
+        'sections': sections,
+        'admonition_density': admonition_density,
+        'answer_density': answer_density,
+        'images': images,
+        'image_size': list(image_size),
+        'downloads': downloads,
+        'seed': seed,
+    }
+
+
+def time_repeated(func, repeat):
+    """
+    Calls func repeat times.
+
+    Returns:
+        dict: Minimum, median and mean wall time in seconds, and the number of runs.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return _summarize(times)
+
+
+def _summarize(times):
+    """Returns the minimum, median and mean of a list of run times in seconds."""
+    return {
+        'min': round(min(times), 6),
+        'median': round(statistics.median(times), 6),
+        'mean': round(statistics.fmean(times), 6),
+        'runs': len(times),
+    }
+
+
+def time_pipeline(pipeline, documents, repeat):
+    """
+    Runs an HtmlPipeline over every document repeat times.
+
+    Args:
+        pipeline (html_pipeline.HtmlPipeline): The pipeline to time, e.g. panel_pipeline.
+        documents (list): (html, context) tuples. Each run gets fresh copies of the contexts.
+        repeat (int): Runs over all documents.
+
+    Returns:
+        dict: Timings of the whole pipeline under 'pipeline', and of each transform,
+              'parse' and 'serialize' under their names, as returned by time_repeated.
+    """
+    totals = []
+    steps = {}
+    for _ in range(repeat):
+        timings = {}
+        start = time.perf_counter()
+        for html, context in documents:
+            pipeline.run(html, dict(context, img_src_map={}, download_assets=[]), timings)
+        totals.append(time.perf_counter() - start)
+        for name, seconds in timings.items():
+            steps.setdefault(name, []).append(seconds)
+    return {'pipeline': _summarize(totals), **{name: _summarize(times) for name, times in steps.items()}}
+
+
+def measure_import_time(module, repeat=5):
+    """
+    Imports module in fresh interpreters started with `python -X importtime`.
+
+    Args:
+        module (str): Dotted module name, e.g. 'md2splunk.md2app'.
+        repeat (int): Interpreters to start; the fastest import is reported.
+
+    Returns:
+        dict: 'seconds' to import the module and everything it imports, the
+              'slowest' modules it imported by their own import time, and the
+              DEFERRED_IMPORTS packages that were 'loaded' on the way.
+    """
+    best = None
+    for _ in range(repeat):
+        stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                                capture_output=True, text=True, check=True).stderr
+        own_times = {}
+        total = None
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            own, cumulative, name = line[len('import time:'):].split('|')
+            name = name.strip()
+            own_times[name] = int(own) / 1e6
+            if name == module:
+                total = int(cumulative) / 1e6
+        if best is None or total < best[0]:
+            best = (total, own_times)
+
+    total, own_times = best
+    loaded = sorted({package for package in DEFERRED_IMPORTS for name in own_times
+                     if name == package or name.startswith(f"{package}.")})
+    return {
+        'seconds': round(total, 6),
+        'slowest': {name: round(seconds, 6) for name, seconds in sorted(own_times.items(), key=lambda item: -item[1])[:10]},
+        'loaded': loaded,
+    }
+
+
+def check_imports(max_import_ms=None, repeat=5):
+    """
+    Measures the startup imports of every command line tool.
+
+    Args:
+        max_import_ms (float): Optional budget for each tool's import time, in milliseconds.
+        repeat (int): Interpreters started per tool.
+
+    Returns:
+        tuple: (results keyed by module, list of problems found).
+    """
+    results = {}
+    problems = []
+    for module in STARTUP_MODULES:
+        results[module] = measure_import_time(module, repeat)
+        milliseconds = results[module]['seconds'] * 1000
+        if results[module]['loaded']:
+            problems.append(f"{module} imports {', '.join(results[module]['loaded'])} at startup")
+        if max_import_ms is not None and milliseconds > max_import_ms:
+            problems.append(f"{module} takes {milliseconds:.0f} ms to import (budget: {max_import_ms:g} ms)")
+    return results, problems
+
+
+def run_benchmarks(course_path, repeat=5, build_args=()):
+    """
+    Times each build step over every guide of the course, then the full build.
+
+    Args:
+        course_path (str): A course written by generate_course.
+        repeat (int): Runs per benchmark.
+        build_args (list): Extra md2app command line arguments for the full build.
+
+    Returns:
+        dict: Timings keyed by benchmark name.
+    """
+    catalog = SourceCatalog(course_path)
+    guide_names = [name for name in catalog.markdown_files if name != 'downloads.md']
+    texts = []
+    for name in guide_names:
+        with open(os.path.join(course_path, name), 'r', encoding="utf-8") as f:
+            texts.append(f.read())
+    with open(os.path.join(course_path, 'downloads.md'), 'r', encoding="utf-8") as f:
+        downloads_html = render_markdown(f.read(), extensions, extension_configs)
+
+    output_path = tempfile.mkdtemp(prefix='md2splunk-bench-app-')
+    app_dict = {
+        'source_path': course_path,
+        'md_files_path': course_path,
+        'default_path': os.path.join(output_path, 'default'),
+        'command': 'md2app-xml',
+        'app_dir': 'benchmark_course_app',
+        'guide_name_pattern': GUIDE_NAME_PATTERN,
+        'catalog': catalog,
+        'static_path': os.path.join(output_path, 'appserver', 'static'),
+        'img_tag_regex': r'src=["\'](images/[^"\']+|./images/[^"\']+)["\']',
+        # Enabled so add_responsive_attributes does the work it does in a --responsive-images build
+        'responsive_images': {'widths': list(DEFAULT_SRCSET_WIDTHS), 'max_width': 0},
+    }
+    converted = [convert_colons_to_blocks(text) for text in texts]
+    rendered = [render_markdown(text, extensions, extension_configs) for text in converted]
+    # The same per-panel contexts render_guide passes to panel_pipeline
+    documents = [(html, {'app_dict': app_dict, 'file_name': name}) for name, html in zip(guide_names, rendered)]
+    documents.append((downloads_html, {'app_dict': app_dict, 'file_name': 'downloads.md'}))
+
+    results = {}
+    try:
+        results['convert_colons_to_blocks'] = time_repeated(lambda: [convert_colons_to_blocks(text) for text in texts], repeat)
+        results['render_markdown'] = time_repeated(lambda: [render_markdown(text, extensions, extension_configs) for text in converted], repeat)
+        pipeline_results = time_pipeline(panel_pipeline, documents, repeat)
+        results['panel_pipeline'] = pipeline_results.pop('pipeline')
+        for name, timings in pipeline_results.items():
+            results[f"panel_pipeline.{name}"] = timings
+        results['generate_nav'] = time_repeated(lambda: generate_nav(app_dict), repeat)
+
+        # Full builds, without the render cache so every run renders every guide
+        config = BuildConfig.from_args(parse_args([course_path, '--no-cache', *build_args]))
+        results['build'] = time_repeated(lambda: build_app(config), repeat)
+        incremental_config = BuildConfig.from_args(parse_args([course_path, '--no-cache', '--incremental', *build_args]))
+        build_app(incremental_config)
+        results['build_incremental_noop'] = time_repeated(lambda: build_app(incremental_config), repeat)
+    finally:
+        shutil.rmtree(output_path, ignore_errors=True)
+    return results
+
+
+def _git_commit():
+    """Returns the commit of the md2splunk checkout, or None if it is not a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark md2app on a synthetic course")
+    parser.add_argument('--guides', type=int, default=10, help="Number of guides (default: 10)")
+    parser.add_argument('--sections', type=int, default=20, help="Task sections per guide, which sets the Markdown size (default: 20)")
+    parser.add_argument('--admonitions', type=float, default=0.2, help="Probability of an admonition per section (default: 0.2)")
+    parser.add_argument('--answers', type=float, default=0.2, help="Probability of an answers block per list step (default: 0.2)")
+    parser.add_argument('--images', type=int, default=20, help="Number of images (default: 20)")
+    parser.add_argument('--image-size', type=str, default='1600x900', help="Image size as WIDTHxHEIGHT (default: 1600x900)")
+    parser.add_argument('--downloads', type=int, default=5, help="Number of download files (default: 5)")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed of the generated course (default: 0)")
+    parser.add_argument('--repeat', type=int, default=5, help="Runs per benchmark (default: 5)")
+    parser.add_argument('--output', type=str, default=None, help="Write the results as JSON to this path (default: stdout)")
+    parser.add_argument('--keep', action='store_true', help="Keep the generated course and app and print their location")
+    parser.add_argument('--check-imports', action='store_true',
+                        help="Only measure the startup imports of the command line tools, and exit with status 1 if one "
+                             "of them loads a package that only a build phase needs")
+    parser.add_argument('--max-import-ms', type=float, default=None,
+                        help="With --check-imports, also fail if a tool takes longer than this to import")
+    parser.add_argument('build_args', nargs=argparse.REMAINDER,
+                        help="Extra md2app arguments for the full builds, after --, e.g. -- --jobs 4 --optimize-images")
+    args = parser.parse_args(argv)
+
+    if args.check_imports:
+        results, problems = check_imports(args.max_import_ms, max(1, args.repeat))
+        _write_results({'benchmark_version': BENCHMARK_VERSION, 'python': platform.python_version(), 'import_time': results},
+                       args.output)
+        for problem in problems:
+            logging.error(problem)
+        sys.exit(1 if problems else 0)
+
+    build_args = args.build_args[1:] if args.build_args[:1] == ['--'] else args.build_args
+    width, height = (int(value) for value in args.image_size.lower().split('x'))
+
+    # Only warnings and errors from the build itself
+    logging.getLogger().setLevel(logging.WARNING)
+
+    work_dir = tempfile.mkdtemp(prefix='md2splunk-bench-')
+    course_path = os.path.join(work_dir, 'course')
+    try:
+        start = time.perf_counter()
+        course = generate_course(course_path, args.guides, args.sections, args.admonitions, args.answers,
+                                 args.images, (width, height), args.downloads, args.seed)
+        generate_seconds = time.perf_counter() - start
+
+        results = {
+            'benchmark_version': BENCHMARK_VERSION,
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'course': course,
+            'build_args': build_args,
+            'generate_seconds': round(generate_seconds, 6),
+        }
+        results['import_time'] = {module: measure_import_time(module, max(1, args.repeat)) for module in STARTUP_MODULES}
+        # generate_nav prints progress; keep stdout for the results
+        with contextlib.redirect_stdout(sys.stderr):
+            results['results'] = run_benchmarks(course_path, max(1, args.repeat), build_args)
+    finally:
+        if args.keep:
+            print(f"Synthetic course kept in {work_dir}", file=sys.stderr)
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    _write_results(results, args.output)
+
+
+def _write_results(results, output_path=None):
+    """Writes the results as JSON to output_path, or to stdout."""
+    output = json.dumps(results, indent=2)
+    if output_path:
+        with open(output_path, 'w', encoding="utf-8") as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
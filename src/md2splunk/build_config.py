@@ -0,0 +1,97 @@
+import os
+import pathlib
+import dataclasses
+from typing import Dict, List, Optional, Tuple
+
+from md2splunk.errors import ConfigError
+from md2splunk.packager import ARCHIVE_FORMATS
+from md2splunk.file_handler import COPY_MODES, COPY_COMPARE_MODES
+from md2splunk.render_cache import DEFAULT_CACHE_SIZE_MB
+from md2splunk.image_optimizer import DEFAULT_MAX_WIDTH, DEFAULT_SRCSET_WIDTHS
+
+
+@dataclasses.dataclass
+class BuildConfig:
+    """
+    Settings of one app build, as accepted by md2app.build_app.
+
+    Every field matches the md2app-xml command line option of the same name (with
+    dashes as underscores); see `md2app-xml --help` for what each does.
+    """
+    source_path: str
+    incremental: bool = False
+    jobs: int = dataclasses.field(default_factory=lambda: os.cpu_count() or 1)
+    no_package: bool = False
+    archive_only: bool = False
+    archive_format: str = 'tar'
+    compress_level: Optional[int] = None
+    no_reproducible: bool = False
+    copy_mode: str = 'auto'
+    copy_compare: str = 'mtime'
+    image_mode: str = 'all'
+    optimize_images: bool = False
+    max_image_width: int = DEFAULT_MAX_WIDTH
+    jpeg_quality: Optional[int] = None
+    image_cache_dir: Optional[str] = None
+    responsive_images: bool = False
+    srcset_widths: Tuple[int, ...] = DEFAULT_SRCSET_WIDTHS
+    fingerprint_assets: bool = False
+    dedup_assets: bool = False
+    cache_dir: Optional[str] = None
+    cache_size: int = DEFAULT_CACHE_SIZE_MB
+    no_cache: bool = False
+    report: Optional[str] = None
+    profile: Optional[str] = None
+    # Name of the calling tool; image URLs point into the app when it contains 'app'
+    command: str = 'md2app-xml'
+
+    @classmethod
+    def from_args(cls, args, **overrides):
+        """Creates a config from the argparse.Namespace returned by md2app.parse_args."""
+        values = {field.name: getattr(args, field.name) for field in dataclasses.fields(cls) if hasattr(args, field.name)}
+        if isinstance(values.get('srcset_widths'), str):
+            values['srcset_widths'] = tuple(int(width) for width in values['srcset_widths'].split(',') if width.strip())
+        values.update(overrides)
+        return cls(**values)
+
+    def validate(self):
+        """Raises ConfigError if the settings cannot be used together."""
+        choices = {
+            'archive_format': ARCHIVE_FORMATS,
+            'copy_mode': COPY_MODES,
+            'copy_compare': COPY_COMPARE_MODES,
+            'image_mode': ('all', 'referenced'),
+        }
+        for name, allowed in choices.items():
+            if getattr(self, name) not in allowed:
+                raise ConfigError(f"Invalid {name} {getattr(self, name)!r}; expected one of {', '.join(allowed)}")
+        if self.archive_only and (self.incremental or self.no_package):
+            raise ConfigError("archive_only cannot be combined with incremental or no_package")
+
+
+@dataclasses.dataclass
+class BuildResult:
+    """
+    What a successful build produced.
+
+    Attributes:
+        app_dir (str): Name of the app.
+        output_path (pathlib.Path): The app directory (not created with archive_only).
+        archive_path (pathlib.Path): The app archive, or None with no_package.
+        source_path (str): The course source directory.
+        md_files_path (str): The directory the guides were read from.
+        artifacts (dict): Size in bytes of every file of the app, keyed by its path
+                          relative to the app directory.
+        timings (dict): Seconds spent in each build phase.
+        warnings (list): Warning messages logged during the build.
+        report (dict): The full build report (see build_report.BuildReport.to_dict).
+    """
+    app_dir: str
+    output_path: pathlib.Path
+    archive_path: Optional[pathlib.Path]
+    source_path: str
+    md_files_path: str
+    artifacts: Dict[str, int]
+    timings: Dict[str, float]
+    warnings: List[str]
+    report: dict
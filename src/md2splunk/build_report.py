@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import logging
+import datetime
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from md2splunk.file_handler import format_bytes
+
+# Categories of the files in a built app, by path prefix relative to the app directory.
+# The first matching prefix wins; files matching none are 'config'.
+FILE_CATEGORIES = (
+    ('default/data/ui/views/', 'views'),
+    ('default/data/ui/panels/', 'panels'),
+    ('default/data/ui/nav/', 'navigation'),
+    ('appserver/static/images/', 'images'),
+    ('appserver/static/downloads/', 'downloads'),
+    ('appserver/static/', 'static'),
+    ('static/', 'icons'),
+)
+
+
+def categorize(relative_path):
+    """Returns the FILE_CATEGORIES category of a path relative to the app directory."""
+    for prefix, category in FILE_CATEGORIES:
+        if relative_path.startswith(prefix):
+            return category
+    return 'config'
+
+
+def resource_usage():
+    """
+    Returns the resources this process has used so far.
+
+    Returns:
+        dict: 'read_bytes' and 'written_bytes' through read/write system calls (from
+              /proc/self/io, None elsewhere) and 'peak_rss' in bytes (None without the
+              resource module).
+    """
+    usage = {'read_bytes': None, 'written_bytes': None, 'peak_rss': None}
+    try:
+        with open('/proc/self/io', 'r') as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+        usage['read_bytes'] = int(counters['rchar'])
+        usage['written_bytes'] = int(counters['wchar'])
+    except (OSError, KeyError, ValueError):
+        pass
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage['peak_rss'] = peak_rss if sys.platform == 'darwin' else peak_rss * 1024
+    return usage
+
+
+def usage_delta(before, after):
+    """Returns the bytes read and written between two resource_usage() results, and the peak RSS at the end."""
+    delta = {'peak_rss': after['peak_rss']}
+    for counter in ('read_bytes', 'written_bytes'):
+        delta[counter] = after[counter] - before[counter] if after[counter] is not None and before[counter] is not None else None
+    return delta
+
+
+def _walk_files(directory, prefix=''):
+    """Yields (path relative to directory, size) for every file under directory."""
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _walk_files(entry.path, f"{prefix}{entry.name}/")
+            elif entry.is_file():
+                yield f"{prefix}{entry.name}", entry.stat().st_size
+
+
+class BuildReport:
+    """
+    Collects what a build produced and what each of its phases cost.
+
+    The build marks the start of each phase with start_phase(); a phase ends when the
+    next one starts or when finish() is called. Each phase records its wall time, the
+    bytes this process read and wrote during it and the peak RSS at its end; guides
+    rendered in worker processes are recorded with add_guide(). The app's files are
+    counted per FILE_CATEGORIES category. log_summary() logs the result in a few lines,
+    write_json() saves it for CI dashboards and write_trace() saves the phases and
+    guides as a Chrome trace (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self):
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self.phases = {}
+        self.guides = {}
+        self.files = {}
+        self.artifacts = {}
+        self.details = {}
+        self.trace_events = []
+        self._phase = None
+        self._phase_start = None
+        self._phase_usage = None
+        self._start = time.perf_counter()
+        self.total_seconds = None
+
+    def start_phase(self, name):
+        """Ends the current phase, if any, and starts measuring name."""
+        now = time.perf_counter()
+        usage = resource_usage()
+        if self._phase is not None:
+            seconds = now - self._phase_start
+            self.phases[self._phase] = {'seconds': seconds, **usage_delta(self._phase_usage, usage)}
+            self.trace_events.append({
+                'name': self._phase, 'cat': 'phase', 'ph': 'X', 'pid': os.getpid(), 'tid': 0,
+                'ts': round((time.time() - seconds) * 1e6), 'dur': round(seconds * 1e6),
+            })
+        self._phase = name
+        self._phase_start = now
+        self._phase_usage = usage
+
+    def add_guide(self, file_name, stats):
+        """
+        Records the rendering of one guide.
+
+        Args:
+            file_name (str): The guide's file name.
+            stats (dict): 'started' (epoch seconds), 'seconds', 'pid' and the
+                          usage_delta() of the process that rendered it.
+        """
+        self.guides[file_name] = {key: value for key, value in stats.items() if key not in ('started', 'pid')}
+        self.trace_events.append({
+            'name': file_name, 'cat': 'guide', 'ph': 'X', 'pid': stats['pid'], 'tid': 0,
+            'ts': round(stats['started'] * 1e6), 'dur': round(stats['seconds'] * 1e6),
+        })
+
+    def finish(self):
+        """Ends the current phase and records the total build time."""
+        self.start_phase(None)
+        self._phase = None
+        self.total_seconds = time.perf_counter() - self._start
+
+    def add_file(self, relative_path, size):
+        """Counts one file of the app, given by its path relative to the app directory."""
+        logging.debug(f"Created: {relative_path} (size: {size} bytes)")
+        self.artifacts[relative_path] = size
+        counts = self.files.setdefault(categorize(relative_path), {'files': 0, 'bytes': 0})
+        counts['files'] += 1
+        counts['bytes'] += size
+
+    def add_files(self, files):
+        """Counts (relative path, size) pairs, e.g. from packager.ArchiveSink.files()."""
+        for relative_path, size in files:
+            self.add_file(relative_path, size)
+
+    def scan_app(self, output_path):
+        """Counts every file in the app directory."""
+        self.add_files(_walk_files(output_path))
+
+    def to_dict(self):
+        """Returns the report as JSON-serializable data."""
+        return {
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'total_seconds': round(self.total_seconds, 4) if self.total_seconds is not None else None,
+            'phases': {name: dict(phase, seconds=round(phase['seconds'], 4)) for name, phase in self.phases.items()},
+            'guides': {name: dict(guide, seconds=round(guide['seconds'], 4)) for name, guide in sorted(self.guides.items())},
+            'files': dict(sorted(self.files.items())),
+            'total_files': sum(counts['files'] for counts in self.files.values()),
+            'total_bytes': sum(counts['bytes'] for counts in self.files.values()),
+            **self.details,
+        }
+
+    def log_summary(self):
+        """Logs the files per category and the time per phase."""
+        report = self.to_dict()
+        categories = ', '.join(f"{counts['files']} {category} ({format_bytes(counts['bytes'])})"
+                               for category, counts in report['files'].items())
+        logging.info(f"Build summary: {report['total_files']} files, {format_bytes(report['total_bytes'])}: {categories}")
+        phases = ', '.join(f"{name} {phase['seconds']:.2f}s" for name, phase in report['phases'].items())
+        if report['total_seconds'] is not None:
+            logging.info(f"Build time: {report['total_seconds']:.2f}s ({phases})")
+        peak_rss = max((phase['peak_rss'] or 0 for phase in report['phases'].values()), default=0)
+        if peak_rss:
+            logging.info(f"Peak memory (RSS) of the build process: {format_bytes(peak_rss)}")
+
+    def write_json(self, report_path):
+        """Writes the report to report_path as JSON. Failures are logged and otherwise ignored."""
+        try:
+            with open(report_path, 'w', encoding="utf-8") as f:
+                json.dump(self.to_dict(), f, indent=2)
+                f.write('\n')
+            logging.info(f"Wrote build report to {report_path}")
+        except OSError as e:
+            logging.error(f"Could not write build report {report_path}: {e}")
+
+    def write_trace(self, trace_path):
+        """Writes the phases and guides as a Chrome trace-event JSON file."""
+        try:
+            with open(trace_path, 'w', encoding="utf-8") as f:
+                json.dump({'traceEvents': self.trace_events, 'displayTimeUnit': 'ms'}, f)
+            logging.info(f"Wrote build trace to {trace_path}")
+        except OSError as e:
+            logging.error(f"Could not write build trace {trace_path}: {e}")
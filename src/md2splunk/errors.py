@@ -0,0 +1,22 @@
+class BuildError(Exception):
+    """Base class of the errors that stop a build. The message says what went wrong."""
+
+
+class ConfigError(BuildError):
+    """The build settings are invalid or need a package that is not installed."""
+
+
+class SourceError(BuildError):
+    """The course sources are missing or unusable (no guides, unreadable files)."""
+
+
+class MetadataError(SourceError):
+    """metadata.yml is missing or cannot be parsed."""
+
+
+class OutputError(BuildError):
+    """A file of the app could not be written or copied."""
+
+
+class PackagingError(OutputError):
+    """The app archive could not be written."""
@@ -1,19 +1,75 @@
 import os
 import sys
-import yaml
-import ntpath
+import signal
 import importlib.resources
 import logging
 import shutil # <--- ADD THIS IMPORT
 import pathlib
+import hashlib
+import concurrent.futures
+
+from md2splunk.errors import MetadataError, OutputError, SourceError
+from md2splunk.source_catalog import SourceCatalog
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Splunk app icons live in <app>/static rather than appserver/static
+APP_ICON_NAMES = {
+    'appIcon_2x.png',
+    'appIcon.png',
+    'appIconAlt_2x.png',
+    'appIconAlt.png',
+    'appLogo.png',
+    'appLogo_2x.png'
+}
+
+# How files are placed in the app: 'auto' clones (reflink) or copies in the kernel
+# where supported and falls back to a regular copy, 'copy' always uses shutil.copy2
+# and 'hardlink' links the destination to the source (falling back to 'auto').
+COPY_MODES = ('auto', 'copy', 'hardlink')
+
+# How incremental builds (manifest.sync_tree) recognise unchanged sources: 'mtime'
+# trusts the hash recorded by the last build when size and modification time match,
+# 'hash' hashes every file again and 'none' treats every file as changed.
+COPY_COMPARE_MODES = ('mtime', 'hash', 'none')
+
+# Linux ioctl that shares the source's blocks with the destination (btrfs, XFS, ...)
+_FICLONE = 0x40049409
+
+# Number of hex digits of the content hash inserted into fingerprinted file names
+FINGERPRINT_LENGTH = 8
+
+
+def hash_file(file_path, chunk_size=1024 * 1024):
+    """Returns the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def asset_fingerprint(file_hash, salt=''):
+    """
+    Returns the short fingerprint inserted into a published file name.
+
+    Args:
+        file_hash (str): SHA-256 hex digest of the source file.
+        salt (str): Settings that change the published bytes without changing the
+                    source (e.g. image optimization), so they also change the name.
+    """
+    if salt:
+        file_hash = hashlib.sha256(f"{file_hash}:{salt}".encode('utf-8')).hexdigest()
+    return file_hash[:FINGERPRINT_LENGTH]
+
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-    ]
-)
+def fingerprint_name(path, fingerprint):
+    """Inserts a fingerprint before the extension, e.g. 'sub/foo.png' -> 'sub/foo.3f9a1c2b.png'."""
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.{fingerprint}{extension}"
 
 def get_css_file_path(stylesheet):
     try:
@@ -92,106 +148,315 @@ def read_file(file_path):
         if os.path.isfile(file_path):
             with open(file_path, "r", encoding="utf-8") as file:
                 content = file.read()
-                logging.info(f"Successfully read file: {file_path}")
+                logging.debug(f"Successfully read file: {file_path}")
                 return content
         else:
-            logging.error(f"File does not exist: {file_path}")
             raise FileNotFoundError(f"No {os.path.basename(file_path)} found at {file_path}.")
-    except FileNotFoundError as e:
-        logging.error(e)
-        sys.exit(1)
-
-def write_file(file_path, content):
-    """Helper function to write content to a file."""
+    except OSError as e:
+        raise SourceError(str(e)) from e
+
+def write_file(file_path, content, sink=None):
+    """Helper function to write content to a file, or to sink (e.g. a packager.ArchiveSink) if given."""
+    if sink is not None:
+        sink.write_file(file_path, content)
+        logging.debug(f"Added {file_path} to the archive")
+        return
     try:
         # Ensure the directory exists before writing the file
         os.makedirs(os.path.dirname(file_path), exist_ok=True)
         with open(file_path, "w", encoding="utf-8") as file:
             file.write(content)
-            logging.info(f"Successfully wrote content to file: {file_path}")
+            logging.debug(f"Successfully wrote content to file: {file_path}")
     except IOError as e:
-        logging.error(f"Error writing to file {file_path}: {e}")
-        sys.exit(1)
+        raise OutputError(f"Error writing to file {file_path}: {e}") from e
     except Exception as e:
-        logging.error(f"An unexpected error occurred while writing to the file: {e}")
-        sys.exit(1)
-
-def load_metadata(source_path):
-    metadata_files = ['metadata.yml', 'metadata.yaml']
-    for metadata_file in metadata_files:
-        if os.name == 'nt':
-            metadata_yaml = ntpath.join(source_path, metadata_file)
-        else:
-            metadata_yaml = os.path.join(source_path, metadata_file)
+        raise OutputError(f"An unexpected error occurred while writing to the file {file_path}: {e}") from e
+
+def load_metadata(source_path, metadata_path=None):
+    """
+    Loads the course metadata.
+
+    Args:
+        source_path (str): The course directory.
+        metadata_path (str): metadata.yml (or metadata.yaml) as found by SourceCatalog.metadata_path,
+                             so the directory is not searched again. Looked up in source_path if None.
+
+    Returns:
+        dict: The parsed metadata.
+    """
+    import yaml
+
+    if metadata_path is None:
+        metadata_path = SourceCatalog(source_path).metadata_path
+    if metadata_path is None:
+        raise MetadataError("No 'metadata.yaml' or 'metadata.yml' file found. It's a prerequisite 😉")
+
+    try:
+        logging.info(f"Loading metadata from {metadata_path}...")
+        with open(metadata_path, 'r', encoding="utf-8") as f:
+            metadata = yaml.safe_load(f)
+        logging.info(f"Successfully loaded metadata.")
+        return metadata
+    except Exception as e:
+        raise MetadataError(f"Error loading or parsing {metadata_path}: {e}") from e
+
+
+def iter_tree_files(source_folder, tree=None):
+    """
+    Yields (path relative to source_folder, full path, stat result or None) for every
+    file in a folder. The stat results come from tree (see SourceCatalog.tree) when
+    given; otherwise the folder is walked and the stat result is None.
+    """
+    if tree is not None:
+        for relative_file, stat in tree.items():
+            yield relative_file, os.path.join(source_folder, relative_file), stat
+        return
+    for root, _, files in os.walk(source_folder):
+        relative_root = os.path.relpath(root, source_folder)
+        for file in files:
+            relative_file = os.path.normpath(os.path.join(relative_root, file)).replace("\\", "/")
+            yield relative_file, os.path.join(root, file), None
+
 
-        if os.path.isfile(metadata_yaml):
+def _clone_file(source_file_path, destination_file_path):
+    """
+    Copies a file with a copy-on-write clone or an in-kernel copy where the platform
+    supports them, falling back to a regular copy. Metadata is copied like shutil.copy2.
+    """
+    with open(source_file_path, 'rb') as src, open(destination_file_path, 'wb') as dst:
+        copied = False
+        if fcntl is not None and sys.platform.startswith('linux'):
             try:
-                logging.info(f"Loading metadata from {metadata_yaml}...")
-                with open(metadata_yaml, 'r', encoding="utf-8") as f:
-                    metadata = yaml.safe_load(f)
-                logging.info(f"Successfully loaded metadata.")
-                return metadata
-            except Exception as e:
-                logging.error(f"Error loading or parsing {metadata_yaml}: {e}")
-                sys.exit(1)
-
-    # If we get here, no metadata file was found
-    logging.error("No 'metadata.yaml' or 'metadata.yml' file found. It's a prerequisite 😉")
-    sys.exit(1)
-
-
-# NEW FUNCTION TO COPY IMAGE FILES WITH SUBFOLDERS (Corrected)
-def copy_images_with_subfolders(source_base_dir, final_images_target_dir):
+                fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+                copied = True
+            except OSError:
+                pass
+        if not copied and hasattr(os, 'copy_file_range'):
+            try:
+                remaining = os.fstat(src.fileno()).st_size
+                while remaining > 0:
+                    sent = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if sent == 0:
+                        break
+                    remaining -= sent
+                copied = remaining == 0
+            except OSError:
+                pass
+        if not copied:
+            src.seek(0)
+            dst.seek(0)
+            dst.truncate()
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+    shutil.copystat(source_file_path, destination_file_path)
+
+
+def copy_file(source_file_path, destination_file_path, mode='auto'):
+    """
+    Places one file in the app. Callers decide which files need placing; full builds
+    start from an empty app and incremental builds compare sources with the manifest.
+
+    An existing destination is removed before it is replaced, so writing into it can
+    never change a source it was hardlinked to.
+
+    Args:
+        source_file_path (str): File to copy.
+        destination_file_path (pathlib.Path or str): Where the file goes. Parent folders are created.
+        mode (str): One of COPY_MODES.
+
+    Returns:
+        tuple: ('copied' or 'linked', size of the file in bytes)
+    """
+    source_stat = os.stat(source_file_path)
+
+    destination_dir = os.path.dirname(destination_file_path)
+    if destination_dir:
+        os.makedirs(destination_dir, exist_ok=True)
+    if os.path.lexists(destination_file_path):
+        os.remove(destination_file_path)
+
+    if mode == 'hardlink':
+        try:
+            os.link(source_file_path, destination_file_path)
+            return 'linked', source_stat.st_size
+        except OSError as e:
+            logging.debug(f"Cannot hardlink {source_file_path} ({e}); copying instead.")
+
+    if mode == 'copy':
+        shutil.copy2(source_file_path, destination_file_path)
+    else:
+        _clone_file(source_file_path, destination_file_path)
+    return 'copied', source_stat.st_size
+
+
+def copy_files(file_pairs, mode='auto', max_workers=None, sink=None):
+    """
+    Copies files in a thread pool with copy_file.
+
+    Args:
+        file_pairs (list): (source, destination) path tuples.
+        mode (str): One of COPY_MODES.
+        max_workers (int): Number of copy threads. Defaults to ThreadPoolExecutor's default.
+        sink (packager.ArchiveSink): Adds the files to the archive instead of copying them.
+
+    Returns:
+        dict: Number of files and bytes per outcome ('copied', 'linked'), plus the number
+              of 'failed' copies. 'skipped' is left at 0 for callers that skip unchanged files.
+    """
+    stats = {'copied': 0, 'linked': 0, 'skipped': 0, 'failed': 0,
+             'copied_bytes': 0, 'linked_bytes': 0, 'skipped_bytes': 0}
+
+    def copy_pair(pair):
+        source_file_path, destination_file_path = pair
+        try:
+            return copy_file(source_file_path, destination_file_path, mode)
+        except Exception as e:
+            logging.error(f"Failed to copy {source_file_path} to {destination_file_path}: {e}")
+            return 'failed', 0
+
+    if sink is not None:
+        for source_file_path, destination_file_path in file_pairs:
+            sink.copy_file(source_file_path, destination_file_path)
+            stats['copied'] += 1
+            stats['copied_bytes'] += os.path.getsize(source_file_path)
+        return stats
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for (source_file_path, destination_file_path), (outcome, size) in zip(file_pairs, executor.map(copy_pair, file_pairs)):
+            stats[outcome] += 1
+            if outcome != 'failed':
+                stats[f"{outcome}_bytes"] += size
+                logging.debug(f"{outcome.capitalize()}: {source_file_path} to {destination_file_path}")
+    return stats
+
+
+def _init_worker(log_level, log_format, log_to_stdout, ignore_interrupts):
+    """Worker initializer: logs like the process that started the pool and optionally ignores Ctrl+C."""
+    if ignore_interrupts:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if log_format is not None:
+        logging.basicConfig(level=log_level, format=log_format, stream=sys.stdout if log_to_stdout else sys.stderr)
+    else:
+        logging.getLogger().setLevel(log_level)
+
+
+def new_process_pool(max_workers, ignore_interrupts=False):
+    """
+    Returns a ProcessPoolExecutor whose workers start from a forkserver where available.
+
+    Pools may be started from a process that already runs other threads (builder and
+    HTTP threads, copy threads), and a worker forked while one of them holds a lock,
+    e.g. a logging handler's, deadlocks. Workers started from a forkserver inherit no
+    logging configuration, so they are set up to log at the level and in the format of
+    this process's root logger.
+
+    Args:
+        max_workers (int): Number of worker processes.
+        ignore_interrupts (bool): Let only the main process handle Ctrl+C, so idle workers exit quietly.
+    """
+    import multiprocessing
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else None
+    root = logging.getLogger()
+    handler = next((handler for handler in root.handlers if isinstance(handler, logging.StreamHandler)), None)
+    log_format = handler.formatter._fmt if handler is not None and handler.formatter is not None else None
+    log_to_stdout = handler is not None and handler.stream is sys.stdout
+    return concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context(method),
+        initializer=_init_worker,
+        initargs=(root.level, log_format, log_to_stdout, ignore_interrupts),
+    )
+
+
+def format_bytes(size):
+    """Formats a byte count for log messages, e.g. '1.5 MB'."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+def format_copy_stats(stats):
+    """Summarises the stats returned by copy_files for log messages."""
+    summary = f"{stats['copied']} copied ({format_bytes(stats['copied_bytes'])})"
+    if stats['linked']:
+        summary += f", {stats['linked']} hardlinked ({format_bytes(stats['linked_bytes'])})"
+    summary += f", {stats['skipped']} unchanged ({format_bytes(stats['skipped_bytes'])} skipped)"
+    if stats['failed']:
+        summary += f", {stats['failed']} failed"
+    return summary
+
+
+def copy_images_with_subfolders(source_base_dir, final_images_target_dir, mode='auto', only=None, optimizer=None, rename=None,
+                                sink=None, tree=None):
     """
     Copies image files from the source 'images' directory to the specified
     final target directory, preserving subfolder structure.
 
+    The copies run in a thread pool.
+
     Args:
         source_base_dir (str): The root directory where the source 'images' folder is located.
                                 E.g., '/path/to/your/project'
         final_images_target_dir (pathlib.Path or str): The absolute path to the directory where images
                                        (including their subfolders) should be copied.
                                        E.g., '/path/to/your/output_app/appserver/static/images'
+        mode (str): One of COPY_MODES.
+        only (set): Paths relative to the 'images' folder (e.g. 'sub/shot.png') to copy.
+                    Every file is copied if None.
+        optimizer (ImageOptimizer): Optional optimizer that places web-ready versions of
+                                    PNG and JPEG images instead of copying them.
+        rename (dict): Published paths keyed by source path relative to the 'images' folder,
+                       e.g. fingerprinted names. Files not in it keep their path.
+        sink (packager.ArchiveSink): Adds the images to the archive instead of copying them.
+        tree (dict): The 'images' folder as listed by SourceCatalog.tree, so it is not walked again.
+
+    Returns:
+        dict: The stats returned by copy_files, or None if there are no images.
     """
     source_images_folder = os.path.join(source_base_dir, 'images')
+    target_images_folder = final_images_target_dir
 
-    if not os.path.isdir(source_images_folder):
-        logging.warning(f"Source images folder not found: {source_images_folder}. No images to copy.")
+    file_pairs = []
+    found = False
+    for relative_file, source_file_path, _ in iter_tree_files(source_images_folder, tree):
+        found = True
+        if only is not None and relative_file not in only:
+            continue
+        published_file = (rename or {}).get(relative_file, relative_file)
+        file_pairs.append((source_file_path, os.path.join(target_images_folder, published_file)))
+
+    if not found:
+        logging.warning(f"No images found in {source_images_folder}. No images to copy.")
         return
 
-    # The target_images_folder is now directly provided as final_images_target_dir
-    target_images_folder = final_images_target_dir
-
     logging.info(f"Starting image copy from '{source_images_folder}' to '{target_images_folder}'")
+    if sink is None:
+        os.makedirs(target_images_folder, exist_ok=True)
 
-    # Ensure the base target directory exists before walking
-    os.makedirs(target_images_folder, exist_ok=True)
+    if optimizer is not None:
+        _, file_pairs = optimizer.run(file_pairs, mode, sink=sink)
 
-    for root, _, files in os.walk(source_images_folder):
-        relative_path = os.path.relpath(root, source_images_folder)
-        destination_dir = os.path.join(target_images_folder, relative_path)
-
-        # Create destination directory if it doesn't exist
-        os.makedirs(destination_dir, exist_ok=True)
-        logging.debug(f"Ensured directory exists: {destination_dir}")
-
-        for file in files:
-            source_file_path = os.path.join(root, file)
-            destination_file_path = os.path.join(destination_dir, file)
+    stats = copy_files(file_pairs, mode, sink=sink)
+    logging.info(f"Image copying process completed: {format_copy_stats(stats)}.")
+    return stats
 
-            try:
-                # You might want to filter by image extensions here if not all files in 'images'
-                # are actually images (e.g., .png, .jpg, .gif, .svg).
-                # For now, it copies all files found.
-                shutil.copy2(source_file_path, destination_file_path)
-                logging.debug(f"Copied: {source_file_path} to {destination_file_path}")
-            except Exception as e:
-                logging.error(f"Failed to copy {source_file_path} to {destination_file_path}: {e}")
 
-    logging.info("Image copying process completed.")
+def _copy_asset(source_file_path, destination_file_path, sink=None):
+    """Copies one static asset or app icon, creating its folder. Returns False if the copy failed."""
+    try:
+        if sink is not None:
+            sink.copy_file(source_file_path, destination_file_path)
+        else:
+            os.makedirs(os.path.dirname(destination_file_path), exist_ok=True)
+            shutil.copy2(source_file_path, destination_file_path)
+        logging.debug(f"Copied {source_file_path} to {destination_file_path}")
+        return True
+    except Exception as e:
+        logging.error(f"Failed to copy {source_file_path} to {destination_file_path}: {e}")
+        return False
 
 
-def copy_static_assets(source_base_dir, static_path):
+def copy_static_assets(source_base_dir, static_path, sink=None, tree=None):
     """
     Copies all assets from a 'static' folder in the source directory to the static_path folder.
     
@@ -201,66 +466,27 @@ def copy_static_assets(source_base_dir, static_path):
         static_path (pathlib.Path or str): The absolute path to the static directory where assets
                                            should be copied.
                                            E.g., '/path/to/your/output_app/appserver/static'
+        sink (packager.ArchiveSink): Adds the assets to the archive instead of copying them.
+        tree (dict): The 'static' folder as listed by SourceCatalog.tree, so it is not walked again.
     """
     source_static_folder = os.path.join(source_base_dir, 'static')
-    
-    if not os.path.isdir(source_static_folder):
-        logging.info(f"No 'static' folder found in source directory: {source_base_dir}. Skipping static asset copy.")
-        return
-    
-    # Convert to string if it's a Path object
     target_static_folder = str(static_path)
-    
-    logging.info(f"Found 'static' folder in source directory. Copying assets from '{source_static_folder}' to '{target_static_folder}'")
-    
-    # Ensure the target directory exists
-    os.makedirs(target_static_folder, exist_ok=True)
-    
-    try:
-        # Walk through all files and subdirectories in the source static folder
-        for root, dirs, files in os.walk(source_static_folder):
-            # Calculate the relative path from the source static folder
-            relative_path = os.path.relpath(root, source_static_folder)
-            
-            # Create the corresponding directory in the target
-            if relative_path == '.':
-                # We're in the root of the static folder
-                destination_dir = target_static_folder
-            else:
-                destination_dir = os.path.join(target_static_folder, relative_path)
-            
-            # Ensure destination directory exists
-            os.makedirs(destination_dir, exist_ok=True)
-            logging.debug(f"Ensured directory exists: {destination_dir}")
-            
-            # Copy all files in this directory (excluding app icons which are handled separately)
-            app_icon_names = {
-                'appIcon_2x.png', 'appIcon.png', 'appIconAlt_2x.png',
-                'appIconAlt.png', 'appLogo.png', 'appLogo_2x.png'
-            }
-            
-            for file in files:
-                # Skip app icons as they're copied to a different location
-                if file in app_icon_names:
-                    logging.debug(f"Skipping app icon {file} (handled separately)")
-                    continue
-                    
-                source_file_path = os.path.join(root, file)
-                destination_file_path = os.path.join(destination_dir, file)
-                
-                try:
-                    shutil.copy2(source_file_path, destination_file_path)
-                    logging.info(f"Copied static asset: {file} to {destination_file_path}")
-                except Exception as e:
-                    logging.error(f"Failed to copy static asset {source_file_path} to {destination_file_path}: {e}")
-    
-    except Exception as e:
-        logging.error(f"Error walking through static folder {source_static_folder}: {e}")
-    
-    logging.info("Static asset copying process completed.")
 
+    copied = 0
+    for relative_file, source_file_path, _ in iter_tree_files(source_static_folder, tree):
+        # Skip app icons as they're copied to a different location
+        if os.path.basename(relative_file) in APP_ICON_NAMES:
+            logging.debug(f"Skipping app icon {relative_file} (handled separately)")
+            continue
+        copied += _copy_asset(source_file_path, os.path.join(target_static_folder, relative_file), sink)
+
+    if copied:
+        logging.info(f"Copied {copied} static assets from '{source_static_folder}' to '{target_static_folder}'.")
+    else:
+        logging.info(f"No static assets found in {source_static_folder}. Skipping static asset copy.")
 
-def copy_app_icons(source_base_dir, app_static_path):
+
+def copy_app_icons(source_base_dir, app_static_path, sink=None, tree=None):
     """
     Copies Splunk app icons from the 'static' folder in the source directory to the app's static directory.
     
@@ -269,180 +495,177 @@ def copy_app_icons(source_base_dir, app_static_path):
                                 E.g., '/path/to/your/project'
         app_static_path (pathlib.Path or str): The absolute path to the app's static directory.
                                                 E.g., '/path/to/your/output_app/static'
+        sink (packager.ArchiveSink): Adds the icons to the archive instead of copying them.
+        tree (dict): The 'static' folder as listed by SourceCatalog.tree, so it is not walked again.
     """
     source_static_folder = os.path.join(source_base_dir, 'static')
-    
-    if not os.path.isdir(source_static_folder):
-        logging.info(f"No 'static' folder found in source directory: {source_base_dir}. Skipping app icon copy.")
-        return
-    
-    # Define the predefined Splunk app icon names
-    app_icon_names = {
-        'appIcon_2x.png',
-        'appIcon.png',
-        'appIconAlt_2x.png',
-        'appIconAlt.png',
-        'appLogo.png',
-        'appLogo_2x.png'
-    }
-    
-    # Convert to string if it's a Path object
     target_app_static_folder = str(app_static_path)
-    
-    # Ensure the target directory exists
-    os.makedirs(target_app_static_folder, exist_ok=True)
-    
+
     icons_found = []
-    
-    try:
-        # Walk through the source static folder looking for app icons
-        for root, dirs, files in os.walk(source_static_folder):
-            for file in files:
-                if file in app_icon_names:
-                    source_file_path = os.path.join(root, file)
-                    destination_file_path = os.path.join(target_app_static_folder, file)
-                    
-                    try:
-                        shutil.copy2(source_file_path, destination_file_path)
-                        logging.info(f"Copied app icon: {file} to {destination_file_path}")
-                        icons_found.append(file)
-                    except Exception as e:
-                        logging.error(f"Failed to copy app icon {source_file_path} to {destination_file_path}: {e}")
-    
-    except Exception as e:
-        logging.error(f"Error searching for app icons in {source_static_folder}: {e}")
-    
+    for relative_file, source_file_path, _ in iter_tree_files(source_static_folder, tree):
+        file = os.path.basename(relative_file)
+        if file in APP_ICON_NAMES and _copy_asset(source_file_path, os.path.join(target_app_static_folder, file), sink):
+            icons_found.append(file)
+
     if icons_found:
         logging.info(f"App icon copying process completed. Found and copied {len(icons_found)} icons: {icons_found}")
     else:
         logging.info("No app icons found in static folder.")
 
 
-def process_download_links(html_content, md_files_path, static_path, app_dir, course_title=None):
+def resolve_download_asset(original_path, md_files_path, course_title=None):
     """
-    Processes download links in HTML content to copy linked assets and update the HTML with new URLs.
-    
+    Resolves a link in a downloads page to the source file it should publish.
+
     Args:
-        html_content (str): HTML content to process
+        original_path (str): The link target as written in the guide
         md_files_path (str): Path where markdown files are located
-        static_path (pathlib.Path or str): Path to the static directory in the app
-        app_dir (str): Name of the app directory for URL generation
         course_title (str): Course title for template variable replacement (legacy support)
-        
+
     Returns:
-        str: Updated HTML content with processed download links
+        pathlib.Path: The source file, or None if the link is external, already
+                      processed, or does not match an existing file
     """
-    import re
     import glob
-    from urllib.parse import unquote
-    
-    if not html_content:
-        return html_content
-    
-    logging.info(f"Processing download links...")
+
+    logging.debug(f"Processing link: {original_path}")
     
-    # Create downloads directory in static folder
-    downloads_dir = pathlib.Path(static_path) / 'downloads'
-    downloads_dir.mkdir(parents=True, exist_ok=True)
-    logging.info(f"Created downloads directory: {downloads_dir}")
+    # Skip if it's already a URL (http, https, etc.)
+    if original_path.startswith(('http://', 'https://', 'mailto:', '#', '/static/')):
+        logging.debug(f"Skipping external/processed link: {original_path}")
+        return None  # Leave the link unchanged
     
-    # Regex to find HTML links: <a href="path">text</a>
-    link_pattern = r'<a\s+[^>]*href=["\'](([^"\']+))["\']\s*[^>]*>([^<]+)</a>'
+    # Handle legacy template variables like {course_title}
+    processed_path = original_path
+    if course_title and '{course_title}' in processed_path:
+        processed_path = processed_path.replace('{course_title}', course_title)
+        logging.debug(f"Replaced template variable: {original_path} -> {processed_path}")
     
-    # Find all links first for debugging
-    all_links = re.findall(link_pattern, html_content)
-    logging.info(f"Found {len(all_links)} links to process: {[link[0] for link in all_links]}")
+    md_files_path_obj = pathlib.Path(md_files_path)
     
-    def replace_link(match):
-        full_tag = match.group(0)
-        original_path = match.group(1)
-        link_text = match.group(3)
+    # Check if this is a wildcard pattern (contains *)
+    if '*' in processed_path:
+        logging.debug(f"Processing wildcard pattern: {processed_path}")
         
-        logging.info(f"Processing link: {original_path}")
+        # For wildcard patterns, resolve relative to the md_files_path directory
+        # where the downloads.md file is located
+        if processed_path.startswith('./'):
+            # ./ means same directory as the downloads.md file
+            search_pattern = processed_path[2:]  # Remove ./
+            search_path = md_files_path_obj / search_pattern
+        elif processed_path.startswith('../'):
+            # ../ means parent directory relative to downloads.md file location
+            search_path = md_files_path_obj.parent / processed_path[3:]  # Remove ../
+        else:
+            # Absolute or relative path from md_files_path
+            search_path = md_files_path_obj / processed_path
         
-        # Skip if it's already a URL (http, https, etc.)
-        if original_path.startswith(('http://', 'https://', 'mailto:', '#', '/static/')):
-            logging.info(f"Skipping external/processed link: {original_path}")
-            return full_tag  # Return unchanged
+        logging.debug(f"Searching for files with pattern: {search_path}")
         
-        # Handle legacy template variables like {course_title}
-        processed_path = original_path
-        if course_title and '{course_title}' in processed_path:
-            processed_path = processed_path.replace('{course_title}', course_title)
-            logging.info(f"Replaced template variable: {original_path} -> {processed_path}")
+        # Use glob to find matching files
+        matching_files = glob.glob(str(search_path))
+        logging.debug(f"glob.glob('{search_path}') returned: {matching_files}")
         
-        md_files_path_obj = pathlib.Path(md_files_path)
+        if not matching_files:
+            logging.warning(f"No files found matching pattern: {search_path}")
+            return None  # Leave the link unchanged if no matches
         
-        # Check if this is a wildcard pattern (contains *)
-        if '*' in processed_path:
-            logging.info(f"Processing wildcard pattern: {processed_path}")
-            
-            # For wildcard patterns, resolve relative to the md_files_path directory
-            # where the downloads.md file is located
-            if processed_path.startswith('./'):
-                # ./ means same directory as the downloads.md file
-                search_pattern = processed_path[2:]  # Remove ./
-                search_path = md_files_path_obj / search_pattern
-            elif processed_path.startswith('../'):
-                # ../ means parent directory relative to downloads.md file location
-                search_path = md_files_path_obj.parent / processed_path[3:]  # Remove ../
-            else:
-                # Absolute or relative path from md_files_path
-                search_path = md_files_path_obj / processed_path
-            
-            logging.info(f"Searching for files with pattern: {search_path}")
-            
-            # Use glob to find matching files
-            matching_files = glob.glob(str(search_path))
-            logging.info(f"glob.glob('{search_path}') returned: {matching_files}")
-            
-            if not matching_files:
-                logging.warning(f"No files found matching pattern: {search_path}")
-                return full_tag  # Return unchanged if no matches
-            
-            if len(matching_files) > 1:
-                logging.warning(f"Multiple files match pattern {search_path}: {matching_files}. Using first match.")
-            
-            # Use the first matching file
-            source_file_path = pathlib.Path(matching_files[0])
-            logging.info(f"Using matched file: {source_file_path}")
-            
-        else:
-            # Handle regular file path (non-wildcard)
-            source_file_path = (md_files_path_obj / processed_path).resolve()
-            logging.info(f"Looking for file at: {source_file_path}")
-            
-            if not source_file_path.exists():
-                logging.warning(f"Download asset not found: {source_file_path} (referenced as {original_path})")
-                return full_tag  # Return unchanged if file doesn't exist
+        if len(matching_files) > 1:
+            logging.warning(f"Multiple files match pattern {search_path}: {matching_files}. Using first match.")
         
-        # Get the filename
-        filename = source_file_path.name
+        # Use the first matching file
+        source_file_path = pathlib.Path(matching_files[0])
+        logging.debug(f"Using matched file: {source_file_path}")
         
-        # Check if file already exists in downloads directory to avoid duplicate copying
-        destination_path = downloads_dir / filename
+    else:
+        # Handle regular file path (non-wildcard)
+        source_file_path = (md_files_path_obj / processed_path).resolve()
+        logging.debug(f"Looking for file at: {source_file_path}")
         
-        if not destination_path.exists():
-            try:
-                # Copy the file to the downloads directory
+        if not source_file_path.exists():
+            logging.warning(f"Download asset not found: {source_file_path} (referenced as {original_path})")
+            return None  # Leave the link unchanged if file doesn't exist
+
+    return source_file_path
+
+
+def process_download_links(html_content, md_files_path, static_path, app_dir, course_title=None, copied_files=None, defer_copy=False,
+                           fingerprint=False):
+    """
+    Copies the files linked from a downloads page and points the links at the app's downloads folder.
+
+    Kept for callers outside the build; generate_guides rewrites download links with
+    html_pipeline.rewrite_download_links as part of panel_pipeline.
+
+    Args:
+        html_content (str): HTML content to process
+        md_files_path (str): Path where markdown files are located
+        static_path (pathlib.Path or str): Path to the static directory in the app
+        app_dir (str): Name of the app directory for URL generation
+        course_title (str): Course title for template variable replacement (legacy support)
+        copied_files (list): Optional list that receives a (source, destination) tuple for
+                             every linked asset published to the downloads directory
+        defer_copy (bool): Only resolve links and record them in copied_files; the caller
+                           publishes them later with copy_download_assets.
+        fingerprint (bool): Publish assets under content-hashed names (e.g. 'lab.3f9a1c2b.zip')
+                            so they can be cached indefinitely.
+
+    Returns:
+        str: Updated HTML content, serialized as XML
+    """
+    from md2splunk.html_pipeline import HtmlPipeline, rewrite_download_links
+
+    if not html_content:
+        return html_content
+
+    pipeline = HtmlPipeline()
+    pipeline.register('download_links', rewrite_download_links)
+    app_dict = {'md_files_path': md_files_path, 'static_path': static_path, 'app_dir': app_dir,
+                'course_title': course_title, 'fingerprint_assets': fingerprint}
+    # The transform only rewrites links on downloads pages
+    context = {'app_dict': app_dict, 'file_name': 'downloads.md'}
+    html_content = pipeline.run(html_content, context)
+
+    download_assets = context.get('download_assets', [])
+    if not defer_copy:
+        copy_download_assets(download_assets)
+    if copied_files is not None:
+        copied_files.extend(download_assets)
+    return html_content
+
+
+def copy_download_assets(download_assets, sink=None):
+    """
+    Copies linked download assets into the app's downloads directory.
+
+    Assets are copied in the given order and an existing destination is never
+    overwritten, so the first guide that links a file name wins.
+
+    Args:
+        download_assets (list): (source, destination) path tuples recorded by
+                                html_pipeline.rewrite_download_links
+        sink (packager.ArchiveSink): Adds the assets to the archive instead of copying them.
+
+    Returns:
+        bool: False if any copy failed, True otherwise
+    """
+    succeeded = True
+    for source_file_path, destination_path in download_assets:
+        source_file_path = pathlib.Path(source_file_path)
+        destination_path = pathlib.Path(destination_path)
+        already_published = sink.exists(destination_path) if sink is not None else destination_path.exists()
+        if already_published:
+            logging.debug(f"Download asset already exists: downloads/{destination_path.name}")
+            continue
+        try:
+            # Copy the file to the downloads directory
+            if sink is not None:
+                sink.copy_file(source_file_path, destination_path)
+            else:
+                destination_path.parent.mkdir(parents=True, exist_ok=True)
                 shutil.copy2(source_file_path, destination_path)
-                logging.info(f"Copied download asset: {source_file_path.name} -> downloads/{filename}")
-            except Exception as e:
-                logging.error(f"Failed to copy download asset {source_file_path}: {e}")
-                return full_tag  # Return unchanged if copy fails
-        else:
-            logging.debug(f"Download asset already exists: downloads/{filename}")
-        
-        # Generate the new URL for the Splunk app
-        new_url = f"/static/app/{app_dir}/downloads/{filename}"
-        
-        # Replace the href in the original tag
-        updated_tag = re.sub(r'href=["\'][^"\']*["\']', f'href="{new_url}"', full_tag)
-        
-        logging.info(f"Updated link: {original_path} -> {new_url}")
-        return updated_tag
-    
-    # Replace all HTML links in the content
-    updated_html = re.sub(link_pattern, replace_link, html_content)
-    
-    return updated_html
\ No newline at end of file
+            logging.debug(f"Copied download asset: {source_file_path.name} -> downloads/{destination_path.name}")
+        except Exception as e:
+            logging.error(f"Failed to copy download asset {source_file_path}: {e}")
+            succeeded = False
+    return succeeded
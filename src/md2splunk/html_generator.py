@@ -1,11 +1,9 @@
-import os
-import re
-import markdown
 from datetime import datetime
 import logging # Ensure logging is imported here if not already
 
 # Assuming update_img_src is in md2splunk.image_handler
 from md2splunk.image_handler import update_img_src
+from md2splunk.renderer import render_markdown
 
 
 def generate_html(pdf_dict, md):
@@ -65,7 +63,7 @@ def generate_html(pdf_dict, md):
 
     # See: https://python-markdown.github.io/extensions/fenced_code_blocks/
     # See: https://python-markdown.github.io/extensions/tables/
-    html = markdown.markdown(md, extensions=extensions)
+    html = render_markdown(md, extensions)
     html = f"{opening_tags}{html}{closing_tags}"
 
     # --- FIX: Uncomment this line and pass the correct dictionary ---
@@ -0,0 +1,230 @@
+import os
+import time
+import pathlib
+import logging
+from xml.sax.saxutils import escape
+
+from md2splunk.image_handler import resolve_img_src, image_reference_from_src, get_image_size, displayed_size, variant_widths, variant_path
+from md2splunk.file_handler import resolve_download_asset, hash_file, asset_fingerprint, fingerprint_name
+
+# HTML elements that have no closing tag; every other element keeps an explicit
+# closing tag when the tree is serialized as XML (e.g. <span></span>, not <span/>)
+void_elements = {
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+    'link', 'meta', 'param', 'source', 'track', 'wbr',
+}
+
+# Inline styles added to headings: (heading tag, text the heading must contain,
+# CSS declarations). All rules are applied in the same pass over the document.
+heading_style_rules = [
+    ('h3', 'Task', 'border-bottom: 1px solid black; padding: 5px;'),
+]
+
+
+class HtmlPipeline:
+    """
+    Post-processes HTML by running registered transforms over one parsed tree.
+
+    The HTML is parsed once with lxml, every transform edits the tree in place,
+    and the tree is serialized once. Transforms are called as transform(root, context)
+    where root is a <div> wrapping the document and context is a dict shared by all
+    transforms for this document.
+    """
+
+    def __init__(self):
+        self.transforms = []
+
+    def register(self, name, transform):
+        """Appends a transform to the pipeline. Transforms run in registration order."""
+        self.transforms.append((name, transform))
+        return transform
+
+    def run(self, html, context, timings=None):
+        """
+        Runs every transform over the HTML.
+
+        Args:
+            html (str): HTML fragment to process.
+            context (dict): Per-document data shared with the transforms.
+            timings (dict): Optional dict that accumulates seconds spent per transform,
+                            plus 'parse' and 'serialize'.
+
+        Returns:
+            str: The processed HTML, serialized as XML so it can be embedded in Splunk XML.
+        """
+        if timings is None:
+            timings = {}
+        if not html.strip():
+            return html
+        from lxml import etree
+        from lxml import html as lxml_html
+
+        start = time.perf_counter()
+        root = lxml_html.fragment_fromstring(html, create_parent='div')
+        timings['parse'] = timings.get('parse', 0.0) + time.perf_counter() - start
+
+        for name, transform in self.transforms:
+            start = time.perf_counter()
+            transform(root, context)
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+        start = time.perf_counter()
+        for element in root.iter():
+            if isinstance(element.tag, str) and element.text is None and len(element) == 0 and element.tag not in void_elements:
+                element.text = ''
+        # Text before the first element is not part of any serialized child
+        serialized = escape(root.text or '') + ''.join(
+            etree.tostring(child, encoding='unicode', method='xml') for child in root
+        )
+        timings['serialize'] = timings.get('serialize', 0.0) + time.perf_counter() - start
+        return serialized
+
+
+def add_responsive_attributes(root, context):
+    """
+    Lets browsers load images lazily and pick a downscaled variant.
+
+    Every <img> gets loading="lazy" and decoding="async". Images from the 'images'
+    folder also get their intrinsic width and height and, for the widths in
+    app_dict['responsive_images']['widths'] below the published width, a srcset of
+    the variants ImageOptimizer generates. Runs before rewrite_images, while srcs
+    are still relative to the guide.
+    """
+    app_dict = context['app_dict']
+    settings = app_dict.get('responsive_images')
+    if not settings:
+        return
+
+    images_folder = os.path.join(app_dict['md_files_path'], 'images')
+    for image in root.iter('img'):
+        if image.get('loading') is None:
+            image.set('loading', 'lazy')
+        if image.get('decoding') is None:
+            image.set('decoding', 'async')
+
+        src = image.get('src')
+        reference = image_reference_from_src(src) if src else None
+        size = get_image_size(os.path.join(images_folder, reference)) if reference else None
+        if size is None:
+            continue
+
+        width, height = displayed_size(size, settings.get('max_width', 0))
+        if image.get('width') is None and image.get('height') is None:
+            image.set('width', str(width))
+            image.set('height', str(height))
+
+        widths = variant_widths(size, settings.get('widths', ()), settings.get('max_width', 0))
+        if widths and image.get('srcset') is None:
+            # Variants sit next to the published (possibly fingerprinted) image. Spaces
+            # separate srcset candidates, so they must be encoded in the URLs.
+            url = resolve_img_src(app_dict, src).replace(' ', '%20')
+            candidates = [f"{variant_path(url, variant_width)} {variant_width}w" for variant_width in widths]
+            candidates.append(f"{url} {width}w")
+            image.set('srcset', ', '.join(candidates))
+            image.set('sizes', f"(max-width: {width}px) 100vw, {width}px")
+
+
+def rewrite_images(root, context):
+    """Points every src relative to the 'images' folder at the app's static images."""
+    app_dict = context['app_dict']
+    src_map = context.setdefault('img_src_map', {})
+    for element in root.iter():
+        src = element.get('src')
+        if src is None:
+            continue
+        if src not in src_map:
+            src_map[src] = resolve_img_src(app_dict, src)
+        if src_map[src] is not None:
+            element.set('src', src_map[src])
+
+
+def rewrite_download_links(root, context):
+    """
+    Points links in downloads pages at the app's downloads folder.
+
+    Linked files are recorded in context['download_assets'] as (source, destination)
+    tuples; generate_guides copies them once the panel is written.
+    """
+    if 'downloads' not in context.get('file_name', '').lower():
+        return
+
+    app_dict = context['app_dict']
+    downloads_dir = pathlib.Path(app_dict['static_path']) / 'downloads'
+    download_assets = context.setdefault('download_assets', [])
+    # Downloads are only deduplicated within a page, so serial and parallel builds agree
+    dedup_targets = app_dict.get('dedup_targets')
+    if dedup_targets is not None:
+        dedup_targets = dict(dedup_targets)
+
+    for link in root.iter('a'):
+        original_path = link.get('href')
+        if not original_path:
+            continue
+
+        source_file_path = resolve_download_asset(original_path, app_dict['md_files_path'], app_dict.get('course_title'))
+        if source_file_path is None:
+            continue
+
+        filename = source_file_path.name
+        file_hash = hash_file(source_file_path) if dedup_targets is not None or app_dict.get('fingerprint_assets') else None
+        if dedup_targets is not None and file_hash in dedup_targets:
+            # An identical file is already published; link to it instead of adding a copy
+            published_path, canonical_source = dedup_targets[file_hash]
+            if link.get('download') is None:
+                link.set('download', filename)
+            # The canonical source may be relative to the working directory
+            if pathlib.Path(canonical_source).resolve() != source_file_path.resolve():
+                context.setdefault('deduplicated', []).append((str(source_file_path), source_file_path.stat().st_size))
+            context.setdefault('dependencies', []).append(str(canonical_source))
+            new_url = f"/static/app/{app_dict['app_dir']}/{published_path}"
+            link.set('href', new_url)
+            logging.debug(f"Updated link: {original_path} -> {new_url} (identical to a published file)")
+            continue
+
+        if app_dict.get('fingerprint_assets'):
+            # Keep the original name for the saved file
+            if link.get('download') is None:
+                link.set('download', filename)
+            filename = fingerprint_name(filename, asset_fingerprint(file_hash))
+        download_assets.append((source_file_path, downloads_dir / filename))
+        if dedup_targets is not None:
+            # Later links to the same content on this page reuse this file
+            dedup_targets[file_hash] = (f"downloads/{filename}", str(source_file_path))
+
+        # Generate the new URL for the Splunk app
+        new_url = f"/static/app/{app_dict['app_dir']}/downloads/{filename}"
+        link.set('href', new_url)
+        logging.debug(f"Updated link: {original_path} -> {new_url}")
+
+
+def style_headings(root, context):
+    """Adds the declarations of every matching heading_style_rules entry to each heading."""
+    rules = context.get('heading_style_rules', heading_style_rules)
+    tags = {tag.lower() for tag, _, _ in rules}
+    if not tags:
+        return
+
+    for heading in root.iter(*tags):
+        text = heading.text_content()
+        styles = [style for tag, keyword, style in rules if tag.lower() == heading.tag and keyword in text]
+        if not styles:
+            continue
+
+        existing = (heading.get('style') or '').strip()
+        if existing and not existing.endswith(';'):
+            existing += ';'
+        heading.set('style', ' '.join([existing] + styles if existing else styles))
+
+
+def build_panel_pipeline():
+    """Returns the pipeline used to post-process guide panels."""
+    pipeline = HtmlPipeline()
+    pipeline.register('responsive_images', add_responsive_attributes)
+    pipeline.register('images', rewrite_images)
+    pipeline.register('download_links', rewrite_download_links)
+    pipeline.register('heading_styles', style_headings)
+    return pipeline
+
+
+# The pipeline generate_guides runs over every panel. Register additional transforms here.
+panel_pipeline = build_panel_pipeline()
@@ -1,74 +1,124 @@
-import ntpath
 import os
 import re
 import logging
+import posixpath
+import urllib.parse
 
-logging.basicConfig(
-    level=logging.INFO,  
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler() 
-    ]
+from md2splunk.file_handler import format_bytes, fingerprint_name
+
+# Compiled img_tag_regex patterns, shared by every call in this process
+_img_tag_patterns = {}
+
+# Image dimensions keyed by (path, mtime_ns, size), so a changed file is read again
+_image_sizes = {}
+
+
+# References to files in an 'images' folder as written in Markdown, HTML or CSS:
+# <images/with space.png>, ![alt](images/Screen Shot.png "title"), src="./images/b c.png",
+# url(/static/app/x/images/c.png). Markdown link destinations run to the closing paren or
+# an optional title, as Python-Markdown parses them, so they may contain spaces and
+# balanced parentheses; quoted attributes run to the closing quote.
+image_reference_regex = re.compile(
+    r'<(?:\./)?images/(?P<angle>[^<>\n]+)>'
+    r'|\]\(\s*(?:\./)?images/(?P<link>(?:[^()\n]|\([^()\n]*\))*?)(?:\s+(?:"[^"\n]*"|\'[^\'\n]*\'))?\s*\)'
+    r'|(?P<quote>["\'])(?:\./)?images/(?P<quoted>[^"\'\n]+)(?P=quote)'
+    r'|(?<![\w.-])(?:\./)?images/(?P<bare>[^\s"\'()<>\[\]]+)'
 )
 
-def update_img_src(dict, html_relative_src):
-    """Updates the 'src' attribute in image tags within HTML content."""
+
+def _img_tag_pattern(img_tag_regex):
+    pattern = _img_tag_patterns.get(img_tag_regex)
+    if pattern is None:
+        pattern = re.compile(img_tag_regex)
+        _img_tag_patterns[img_tag_regex] = pattern
+    return pattern
+
+
+def resolve_img_src(dict, src):
+    """Returns the web path for an image src relative to the 'images' folder, or None if it is not one."""
+    relative_path_after_images = None
+
+    # This part extracts the path relative to the 'images' directory, preserving subfolders.
+    # This is the critical logic for nested folders.
+    if src.startswith('images/'):
+        relative_path_after_images = src[len('images/'):]
+    elif src.startswith('./images/'):
+        relative_path_after_images = src[len('./images/'):]
+    elif src == 'images' or src == './images': # Handle cases where src is just 'images'
+        relative_path_after_images = ''
+    else:
+        # If src doesn't start with 'images/' or './images/', it's not handled by this logic
+        logging.debug(f"Image src '{src}' does not start with 'images/' or './images/'. Skipping.")
+        return None
+
+    # Duplicate images point at their canonical copy, and images may be published
+    # under fingerprinted names (e.g. foo.3f9a1c2b.png)
+    aliases = dict.get('image_aliases')
+    fingerprints = dict.get('asset_fingerprints')
+    if aliases or fingerprints:
+        path, query, suffix = relative_path_after_images.partition('?') if '?' in relative_path_after_images \
+            else relative_path_after_images.partition('#')
+        reference = normalize_image_reference(path)
+        if aliases and reference in aliases:
+            path = reference = aliases[reference]
+        if fingerprints and reference in fingerprints:
+            path = fingerprint_name(path, fingerprints[reference])
+        relative_path_after_images = path + query + suffix
+
+    # This block is for generating the correct Splunk web path
+    # It *must* include "/static/app/<app_dir>/images/"
+    if 'app' in dict.get('command', ''): # Assuming 'command' indicates app generation
+        app_dir = dict.get('app_dir')
+        new_src = os.path.join("/static", "app", app_dir, "images", relative_path_after_images)
+        logging.debug(f"Constructed new_src for app: {new_src} from original src: {src}")
+    else:
+        # This 'else' branch would be for non-Splunk app contexts if your tool supports them.
+        # If not, you might simplify this logic.
+        new_src = os.path.join("/static", "images", relative_path_after_images) # Fallback or non-app static path
+        logging.debug(f"Constructed new_src for static files (non-app context): {new_src} from original src: {src}")
+
+    return new_src.replace("\\", "/") # Ensure forward slashes for web paths
+
+
+def update_img_src(dict, html_relative_src, src_map=None):
+    """
+    Updates the 'src' attribute in image tags within HTML content.
+
+    Every image reference is rewritten in a single pass over the HTML.
+
+    Args:
+        dict (dict): Build settings, including 'img_tag_regex', 'command' and 'app_dir'.
+        html_relative_src (str): HTML with image srcs relative to the guide.
+        src_map (dict): Optional src -> URL map. Srcs already in the map are not resolved
+                        again and new ones are added, so callers can share it across guides.
+
+    Returns:
+        str: HTML with absolute image srcs.
+    """
     try:
         img_tag_regex = dict.get('img_tag_regex')
         if not img_tag_regex:
             logging.error("img_tag_regex not found in dictionary. Cannot process image tags.")
             return html_relative_src
 
-        # source_path is used for 'else' branch, but not for 'app' command in this revised logic
-        source_path = dict.get('source_path')
+        if src_map is None:
+            src_map = {}
+
+        def replace_src(match):
+            src = match.group(1)
+            if src not in src_map:
+                src_map[src] = resolve_img_src(dict, src)
+            new_src = src_map[src]
+            if new_src is None:
+                return match.group(0)
+            return f'src="{new_src}"'
 
-        matches = re.findall(img_tag_regex, html_relative_src)
-        html_absolute_src = html_relative_src
+        html_absolute_src, count = _img_tag_pattern(img_tag_regex).subn(replace_src, html_relative_src)
 
-        if not matches:
+        if not count:
             logging.debug("No image tags found to update.")
-            return html_absolute_src
-
-        for src in matches:
-            relative_path_after_images = None
-
-            # This part extracts the path relative to the 'images' directory, preserving subfolders.
-            # This is the critical logic for nested folders.
-            if src.startswith('images/'):
-                relative_path_after_images = src[len('images/'):]
-            elif src.startswith('./images/'):
-                relative_path_after_images = src[len('./images/'):]
-            elif src == 'images' or src == './images': # Handle cases where src is just 'images'
-                relative_path_after_images = ''
-            else:
-                # If src doesn't start with 'images/' or './images/', it's not handled by this logic
-                # and we should skip it or log a warning.
-                logging.debug(f"Image src '{src}' does not start with 'images/' or './images/'. Skipping.")
-                continue # Skip to the next src in the loop
-
-            if relative_path_after_images is not None:
-                new_src = None
-
-                # This block is for generating the correct Splunk web path
-                # It *must* include "/static/app/<app_dir>/images/"
-                if 'app' in dict.get('command', ''): # Assuming 'command' indicates app generation
-                    app_dir = dict.get('app_dir')
-                    new_src = os.path.join("/static", "app", app_dir, "images", relative_path_after_images)
-                    logging.debug(f"Constructed new_src for app: {new_src} from original src: {src}")
-                else:
-                    # This 'else' branch would be for non-Splunk app contexts if your tool supports them.
-                    # If not, you might simplify this logic.
-                    new_src = os.path.join("/static", "images", relative_path_after_images) # Fallback or non-app static path
-                    logging.debug(f"Constructed new_src for static files (non-app context): {new_src} from original src: {src}")
-
-                new_src = new_src.replace("\\", "/") # Ensure forward slashes for web paths
-                # Replace the original src with the new_src in the HTML
-                # Use re.escape for src to handle special characters correctly in the regex pattern
-                html_absolute_src = re.sub(r'src=["\']' + re.escape(src) + '["\']', f'src="{new_src}"', html_absolute_src)
-            else:
-                logging.debug(f"Skipping src not recognized as being within 'images' folder: {src}")
-
-        logging.debug("Image tags updated.")
+        else:
+            logging.debug("Image tags updated.")
         return html_absolute_src
 
     except ValueError as e:
@@ -77,3 +127,138 @@ def update_img_src(dict, html_relative_src):
     except Exception as e:
         logging.error(f"An unexpected error occurred in update_img_src: {e}", exc_info=True) # Add exc_info for traceback
         return html_relative_src
+
+
+def find_image_references(text):
+    """
+    Returns the paths relative to the 'images' folder that a document references.
+
+    Query strings and fragments are dropped and percent-encoding is decoded, since
+    the browser requests the decoded path. References escaping the folder are ignored.
+    """
+    references = set()
+    for match in image_reference_regex.finditer(text):
+        reference = normalize_image_reference(match['angle'] or match['link'] or match['quoted'] or match['bare'])
+        if reference:
+            references.add(reference)
+    return references
+
+
+def normalize_image_reference(reference):
+    """Returns a path inside the 'images' folder as a normalized relative path, or None if it escapes the folder."""
+    reference = reference.split('#', 1)[0].split('?', 1)[0]
+    reference = posixpath.normpath(urllib.parse.unquote(reference.strip()))
+    if reference and reference != '.' and not reference.startswith('..'):
+        return reference
+    return None
+
+
+def image_reference_from_src(src):
+    """Returns the path relative to the 'images' folder for an img src like 'images/a.png', or None."""
+    for prefix in ('images/', './images/'):
+        if src.startswith(prefix):
+            return normalize_image_reference(src[len(prefix):])
+    return None
+
+
+def scan_image_references(images_folder, source_files, available=None):
+    """
+    Matches the files in the 'images' folder against the references found in the sources.
+
+    This is a plain text scan of the Markdown (and CSS) rather than a render, so it
+    can run before any guide is rendered and covers guides that an incremental build
+    or the render cache skips.
+
+    Args:
+        images_folder (str): The source 'images' folder.
+        source_files (list): Guides and stylesheets that may reference images.
+        available (iterable): Paths relative to images_folder of the images that exist,
+                              e.g. from SourceCatalog.tree. The folder is walked if None.
+
+    Returns:
+        dict: 'referenced' (set of existing paths relative to images_folder),
+              'unreferenced' (sorted paths nothing references),
+              'missing' (referenced paths that do not exist, mapped to the files referencing them) and
+              'referenced_by' (the names of the files referencing each path).
+    """
+    if available is not None:
+        available = set(available)
+    else:
+        available = set()
+        if os.path.isdir(images_folder):
+            for root, _, files in os.walk(images_folder):
+                relative_root = os.path.relpath(root, images_folder)
+                for file in files:
+                    available.add(posixpath.normpath(os.path.join(relative_root, file).replace("\\", "/")))
+
+    referenced_by = {}
+    for source_file in source_files:
+        try:
+            with open(source_file, 'r', encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError) as e:
+            logging.warning(f"Could not scan {source_file} for image references: {e}")
+            continue
+        for reference in find_image_references(text):
+            referenced_by.setdefault(reference, []).append(os.path.basename(source_file))
+
+    missing = {reference: sorted(files) for reference, files in referenced_by.items() if reference not in available}
+    return {
+        'referenced': available & referenced_by.keys(),
+        'unreferenced': sorted(available - referenced_by.keys()),
+        'missing': dict(sorted(missing.items())),
+        'referenced_by': referenced_by,
+    }
+
+
+def report_image_references(images_folder, scan, copy_referenced_only):
+    """Logs missing image references as warnings and summarises unreferenced images."""
+    for reference, files in scan['missing'].items():
+        logging.warning(f"Missing image: images/{reference} (referenced by {', '.join(files)})")
+
+    if scan['unreferenced']:
+        size = sum(os.path.getsize(os.path.join(images_folder, reference)) for reference in scan['unreferenced'])
+        action = "not copied" if copy_referenced_only else "copied anyway; use --image-mode referenced to leave them out"
+        logging.info(f"{len(scan['unreferenced'])} images ({format_bytes(size)}) are not referenced by any guide ({action}).")
+        for reference in scan['unreferenced']:
+            logging.debug(f"Unreferenced image: images/{reference}")
+
+    logging.info(f"Image references: {len(scan['referenced'])} referenced, "
+                 f"{len(scan['unreferenced'])} unreferenced, {len(scan['missing'])} missing.")
+
+
+def get_image_size(image_path):
+    """Returns (width, height) of an image, read from its header, or None if it is not a readable raster image."""
+    try:
+        stat = os.stat(image_path)
+    except OSError:
+        return None
+    key = (str(image_path), stat.st_mtime_ns, stat.st_size)
+    if key not in _image_sizes:
+        from PIL import Image
+        try:
+            with Image.open(image_path) as image:
+                _image_sizes[key] = image.size
+        except Exception:
+            _image_sizes[key] = None
+    return _image_sizes[key]
+
+
+def variant_path(path, width):
+    """Returns the path of the downscaled variant of an image, e.g. 'sub/shot.png' -> 'sub/shot-480w.png'."""
+    stem, extension = os.path.splitext(path)
+    return f"{stem}-{width}w{extension}"
+
+
+def displayed_size(size, max_width=0):
+    """Returns the size an image is published at once it is downscaled to max_width (0 keeps it)."""
+    width, height = size
+    if max_width and width > max_width:
+        return max_width, max(1, round(height * max_width / width))
+    return width, height
+
+
+def variant_widths(size, widths, max_width=0):
+    """Returns the srcset widths that are smaller than the published image, in ascending order."""
+    published_width = displayed_size(size, max_width)[0]
+    return sorted({width for width in widths if 0 < width < published_width})
@@ -0,0 +1,247 @@
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+import pathlib
+import concurrent.futures
+
+import PIL
+
+from md2splunk.manifest import hash_file
+from md2splunk.file_handler import copy_file, format_bytes, new_process_pool
+from md2splunk.render_cache import get_default_cache_dir
+from md2splunk.image_handler import get_image_size, variant_path, variant_widths
+
+# Bump this whenever optimize_image produces different files for the same settings
+IMAGE_OPTIMIZER_VERSION = 1
+
+DEFAULT_MAX_WIDTH = 1920
+
+# Widths of the downscaled variants offered in srcset attributes
+DEFAULT_SRCSET_WIDTHS = (480, 960, 1440)
+
+# Extensions the optimizer re-encodes; every other file is copied as-is
+optimizable_extensions = {'.png', '.jpg', '.jpeg'}
+
+
+def optimize_image(source_file_path, destination_file_path, max_width=DEFAULT_MAX_WIDTH, jpeg_quality=None):
+    """
+    Writes a web-ready version of a PNG or JPEG image.
+
+    The image is rotated according to its EXIF orientation, downscaled to max_width
+    if it is wider, and saved without EXIF or text metadata (the ICC profile is kept
+    so colours do not shift). PNGs are recompressed losslessly. JPEGs are saved at
+    jpeg_quality, or with their original quantization tables when jpeg_quality is None
+    and the image was not resized. If the result is not smaller than the source and
+    nothing was resized, the source is copied unchanged.
+
+    Args:
+        source_file_path (str): PNG or JPEG image.
+        destination_file_path (str): Where the optimized image is written.
+        max_width (int): Maximum width in pixels. 0 disables resizing.
+        jpeg_quality (int): JPEG quality (1-95), or None to keep the source's quality.
+
+    Returns:
+        tuple: (width, height) of the written image.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source_file_path) as original:
+        image_format = original.format
+        if image_format not in ('PNG', 'JPEG') or getattr(original, 'is_animated', False):
+            shutil.copyfile(source_file_path, destination_file_path)
+            return original.size
+
+        icc_profile = original.info.get('icc_profile')
+        # exif_transpose returns a copy even when there is nothing to rotate, and
+        # quality='keep' needs the JPEG itself, so only use it for tagged images
+        transposed = original.getexif().get(0x0112, 1) != 1
+        image = ImageOps.exif_transpose(original) if transposed else original
+        resized = False
+        if max_width and image.width > max_width:
+            height = max(1, round(image.height * max_width / image.width))
+            image = image.resize((max_width, height), Image.LANCZOS)
+            resized = True
+
+        save_options = {'icc_profile': icc_profile} if icc_profile else {}
+        if image_format == 'PNG':
+            save_options['optimize'] = True
+        else:
+            if jpeg_quality is None and not (resized or transposed):
+                save_options['quality'] = 'keep'
+            else:
+                save_options['quality'] = jpeg_quality or 90
+            save_options['optimize'] = True
+            save_options['progressive'] = True
+            if image.mode not in ('RGB', 'L', 'CMYK'):
+                image = image.convert('RGB')
+
+        image.save(destination_file_path, format=image_format, **save_options)
+        size = image.size
+
+    if not (resized or transposed) and os.path.getsize(destination_file_path) >= os.path.getsize(source_file_path):
+        shutil.copyfile(source_file_path, destination_file_path)
+    return size
+
+
+def _optimize_to_cache(source_file_path, cache_file_path, max_width, jpeg_quality):
+    """Worker entry point: optimizes one image into the cache, writing it atomically."""
+    tmp_path = f"{cache_file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(os.path.dirname(cache_file_path), exist_ok=True)
+    try:
+        optimize_image(source_file_path, tmp_path, max_width, jpeg_quality)
+        os.replace(tmp_path, cache_file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+class ImageOptimizer:
+    """
+    Optimizes PNG and JPEG images on their way into the app and generates the
+    downscaled variants used in srcset attributes.
+
+    Every output is cached by the hash of its source and the settings it was made
+    with, so an unchanged image is never re-encoded, in this build or any later one.
+    Outputs that are not in the cache yet are encoded across a process pool.
+
+    With optimize=False the images themselves are copied unchanged and only the
+    variants are generated.
+    """
+
+    def __init__(self, max_width=DEFAULT_MAX_WIDTH, jpeg_quality=None, cache_dir=None, jobs=None,
+                 optimize=True, variant_widths=()):
+        self.max_width = max_width
+        self.jpeg_quality = jpeg_quality
+        self.cache_dir = pathlib.Path(cache_dir or get_default_cache_dir('images'))
+        self.jobs = jobs or os.cpu_count() or 1
+        self.optimize = optimize
+        self.variant_widths = sorted(set(variant_widths))
+
+    def settings(self):
+        """Returns the settings that determine the optimized images and their variants."""
+        return {
+            'version': IMAGE_OPTIMIZER_VERSION,
+            'pillow': PIL.__version__,
+            'optimize': self.optimize,
+            'max_width': self.max_width,
+            'jpeg_quality': self.jpeg_quality,
+            'variant_widths': self.variant_widths,
+        }
+
+    @property
+    def published_max_width(self):
+        """The width images are capped at in the app, 0 if they keep their size."""
+        return self.max_width if self.optimize else 0
+
+    def _cache_file_path(self, source_file_path, source_hash, width):
+        settings = json.dumps({
+            'version': IMAGE_OPTIMIZER_VERSION,
+            'pillow': PIL.__version__,
+            'max_width': width,
+            'jpeg_quality': self.jpeg_quality,
+        }, sort_keys=True)
+        key = hashlib.sha256(f"{source_hash}:{settings}".encode('utf-8')).hexdigest()
+        extension = os.path.splitext(source_file_path)[1].lower()
+        return self.cache_dir / key[:2] / f"{key}{extension}"
+
+    def run(self, file_pairs, mode='auto', hashes=None, sink=None):
+        """
+        Places optimized versions of the images in file_pairs, and their variants, at their destinations.
+
+        Args:
+            file_pairs (list): (source, destination) path tuples.
+            mode (str): Copy mode used to place cached images, one of file_handler.COPY_MODES.
+            hashes (dict): Known source hashes keyed by source path, to avoid hashing again.
+            sink (packager.ArchiveSink): Adds the cached images to the archive instead of copying them.
+
+        Returns:
+            tuple: (stats dict, the pairs that still need copying). stats['variants'] maps
+                   each destination to the variant files generated next to it.
+        """
+        hashes = hashes or {}
+        remaining = []
+        # (source, destination, cache file, width to encode at, whether it is a srcset variant)
+        planned = []
+        variants = {}
+        for source_file_path, destination_file_path in file_pairs:
+            size = None
+            if os.path.splitext(source_file_path)[1].lower() in optimizable_extensions:
+                size = get_image_size(source_file_path)
+            if size is None:
+                remaining.append((source_file_path, destination_file_path))
+                continue
+
+            source_hash = hashes.get(source_file_path) or hash_file(source_file_path)
+            if self.optimize:
+                planned.append((source_file_path, destination_file_path,
+                                self._cache_file_path(source_file_path, source_hash, self.max_width), self.max_width, False))
+            else:
+                remaining.append((source_file_path, destination_file_path))
+
+            for width in variant_widths(size, self.variant_widths, self.published_max_width):
+                variant_file_path = variant_path(str(destination_file_path), width)
+                planned.append((source_file_path, variant_file_path,
+                                self._cache_file_path(source_file_path, source_hash, width), width, True))
+                variants.setdefault(str(destination_file_path), []).append(variant_file_path)
+
+        stats = {'optimized': 0, 'cached': 0, 'failed': 0, 'source_bytes': 0, 'optimized_bytes': 0, 'variants': variants}
+        to_encode = {}
+        for source_file_path, _, cache_file_path, width, _ in planned:
+            if cache_file_path.is_file():
+                stats['cached'] += 1
+            else:
+                to_encode.setdefault(cache_file_path, (source_file_path, width))
+
+        workers = min(self.jobs, len(to_encode))
+        if workers == 1:
+            for cache_file_path, (source_file_path, width) in to_encode.items():
+                try:
+                    _optimize_to_cache(source_file_path, str(cache_file_path), width, self.jpeg_quality)
+                    stats['optimized'] += 1
+                except Exception as e:
+                    logging.error(f"Failed to optimize {source_file_path}: {e}")
+        elif workers > 1:
+            logging.info(f"Optimizing {len(to_encode)} images with {workers} worker processes")
+            with new_process_pool(workers) as executor:
+                futures = {
+                    executor.submit(_optimize_to_cache, source_file_path, str(cache_file_path), width, self.jpeg_quality): source_file_path
+                    for cache_file_path, (source_file_path, width) in to_encode.items()
+                }
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        future.result()
+                        stats['optimized'] += 1
+                    except Exception as e:
+                        logging.error(f"Failed to optimize {futures[future]}: {e}")
+
+        for source_file_path, destination_file_path, cache_file_path, _, is_variant in planned:
+            if not cache_file_path.is_file():
+                stats['failed'] += 1
+                if not is_variant:
+                    # Fall back to publishing the original image
+                    remaining.append((source_file_path, destination_file_path))
+                continue
+            try:
+                if sink is not None:
+                    sink.copy_file(cache_file_path, destination_file_path)
+                else:
+                    copy_file(cache_file_path, destination_file_path, mode)
+            except Exception as e:
+                logging.error(f"Failed to copy optimized image {cache_file_path} to {destination_file_path}: {e}")
+                stats['failed'] += 1
+                continue
+            if not is_variant:
+                stats['source_bytes'] += os.path.getsize(source_file_path)
+                stats['optimized_bytes'] += cache_file_path.stat().st_size
+
+        if planned:
+            variant_count = sum(len(paths) for paths in variants.values())
+            summary = (f"Image optimization: {stats['optimized']} encoded, {stats['cached']} from cache, "
+                       f"{stats['failed']} failed, {variant_count} srcset variants")
+            if self.optimize:
+                summary += f"; {format_bytes(stats['source_bytes'])} -> {format_bytes(stats['optimized_bytes'])}"
+            logging.info(f"{summary}.")
+        return stats, remaining
@@ -0,0 +1,252 @@
+import os
+import json
+import hashlib
+import logging
+import pathlib
+
+from md2splunk.file_handler import copy_files, format_copy_stats, hash_file, iter_tree_files
+
+# Bump this whenever the manifest layout or the generated output changes in a way
+# that makes previously recorded artifacts unusable.
+MANIFEST_VERSION = 2
+
+
+def get_manifest_path(output_path):
+    """Returns the path of the build manifest kept next to the app directory."""
+    output_path = pathlib.Path(output_path)
+    return output_path.parent / f".{output_path.name}.manifest.json"
+
+
+def load_manifest(manifest_path):
+    """
+    Loads a build manifest written by a previous incremental build.
+
+    Args:
+        manifest_path (pathlib.Path or str): Path to the manifest file.
+
+    Returns:
+        dict: The manifest, or an empty dict if it is missing, unreadable or
+              was written by an incompatible version.
+    """
+    if not os.path.isfile(manifest_path):
+        logging.info(f"No build manifest found at {manifest_path}. A full build will be performed.")
+        return {}
+
+    try:
+        with open(manifest_path, 'r', encoding="utf-8") as f:
+            manifest = json.load(f)
+    except Exception as e:
+        logging.warning(f"Ignoring unreadable build manifest {manifest_path}: {e}")
+        return {}
+
+    if manifest.get('version') != MANIFEST_VERSION:
+        logging.info(f"Build manifest {manifest_path} is from an older version. A full build will be performed.")
+        return {}
+
+    return manifest
+
+
+def save_manifest(manifest_path, manifest):
+    """Writes the build manifest atomically so an interrupted build never leaves a partial file."""
+    manifest = dict(manifest, version=MANIFEST_VERSION)
+    tmp_path = f"{manifest_path}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+        logging.info(f"Saved build manifest to {manifest_path}")
+    except Exception as e:
+        logging.error(f"Failed to save build manifest {manifest_path}: {e}")
+
+
+def remove_manifest(manifest_path):
+    """Removes a stale manifest so a later incremental build cannot trust outdated records."""
+    if os.path.isfile(manifest_path):
+        os.remove(manifest_path)
+        logging.info(f"Removed stale build manifest: {manifest_path}")
+
+
+def settings_fingerprint(settings):
+    """Returns a stable hash of the build settings that affect every generated file."""
+    encoded = json.dumps(settings, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def prune_artifacts(output_path, artifacts):
+    """
+    Deletes previously generated artifacts that no longer have a source.
+
+    Args:
+        output_path (pathlib.Path or str): Root of the generated app.
+        artifacts (iterable): Paths relative to output_path.
+    """
+    for artifact in sorted(artifacts):
+        artifact_path = pathlib.Path(output_path, artifact)
+        if artifact_path.is_file():
+            artifact_path.unlink()
+            logging.debug(f"Pruned stale artifact: {artifact}")
+
+
+def sync_tree(source_folder, target_folder, output_path, previous=None, exclude=(), mode='auto', compare='mtime', include=None, optimizer=None, rename=None, hashes=None, tree=None):
+    """
+    Mirrors a source folder into the app, copying only files whose content changed
+    since the last build and pruning files whose source was deleted.
+
+    Files whose size and modification time match the previous build are not hashed
+    again unless compare is 'hash'; with compare 'none' every file is copied again.
+    Copies run in a thread pool.
+
+    Args:
+        source_folder (str): Folder to mirror, e.g. '<md_files_path>/images'.
+        target_folder (pathlib.Path or str): Destination inside the app.
+        output_path (pathlib.Path or str): Root of the generated app, used to record
+                                           artifacts relative to the app.
+        previous (dict): Records returned by the previous build for this folder.
+        exclude (iterable): File names that must not be mirrored.
+        include (set): Paths relative to source_folder to mirror. Every file is mirrored if None;
+                       previously mirrored files left out are pruned.
+        optimizer (ImageOptimizer): Optional optimizer that places web-ready versions of
+                                    changed PNG and JPEG images instead of copying them.
+        rename (dict): Published paths keyed by source path relative to source_folder,
+                       e.g. fingerprinted names. Files not in it keep their path.
+        hashes (dict): Content hashes keyed by source path relative to source_folder, as
+                       returned by hash_tree, so files are not hashed twice.
+        mode (str): One of file_handler.COPY_MODES.
+        compare (str): One of file_handler.COPY_COMPARE_MODES.
+        tree (dict): The folder's files as listed by SourceCatalog.tree, so it is not walked again.
+
+    Returns:
+        dict: Records keyed by source path relative to source_folder, each holding
+              the content hash, size, modification time and the generated artifact.
+    """
+    previous = previous or {}
+    records = {}
+    file_pairs = []
+
+    if os.path.isdir(source_folder):
+        for relative_file, source_file_path, stat in iter_tree_files(source_folder, tree):
+            if os.path.basename(relative_file) in exclude:
+                continue
+
+            if include is not None and relative_file not in include:
+                continue
+            destination_file_path = pathlib.Path(target_folder, (rename or {}).get(relative_file, relative_file))
+            artifact = destination_file_path.relative_to(output_path).as_posix()
+
+            try:
+                stat = stat or os.stat(source_file_path)
+                record = previous.get(relative_file) or {}
+                if hashes and relative_file in hashes:
+                    file_hash = hashes[relative_file]
+                elif (compare != 'hash' and record.get('size') == stat.st_size
+                        and record.get('mtime_ns') == stat.st_mtime_ns and record.get('hash')):
+                    file_hash = record['hash']
+                else:
+                    file_hash = hash_file(source_file_path)
+                if (compare == 'none' or record.get('hash') != file_hash or record.get('artifact') != artifact
+                        or not destination_file_path.is_file()):
+                    file_pairs.append((source_file_path, destination_file_path))
+                records[relative_file] = {'hash': file_hash, 'size': stat.st_size,
+                                          'mtime_ns': stat.st_mtime_ns, 'artifact': artifact}
+            except Exception as e:
+                logging.error(f"Failed to sync {source_file_path} to {destination_file_path}: {e}")
+    else:
+        logging.info(f"Source folder not found: {source_folder}. Nothing to sync.")
+
+    changed = {str(destination_file_path) for _, destination_file_path in file_pairs}
+
+    # The records already hold the source hashes, so the optimizer does not hash again
+    if optimizer is not None:
+        hashes = {os.path.join(source_folder, key): record['hash'] for key, record in records.items()}
+        optimizer_stats, file_pairs_to_copy = optimizer.run(file_pairs, mode, hashes=hashes)
+        for key, record in records.items():
+            destination_file_path = str(pathlib.Path(output_path, record['artifact']))
+            if destination_file_path in optimizer_stats['variants']:
+                record['variants'] = [pathlib.Path(path).relative_to(output_path).as_posix()
+                                      for path in optimizer_stats['variants'][destination_file_path]]
+            elif destination_file_path not in changed:
+                # Unchanged images keep the variants generated by an earlier build
+                record['variants'] = (previous.get(key) or {}).get('variants', [])
+    else:
+        file_pairs_to_copy = file_pairs
+    stats = copy_files(file_pairs_to_copy, mode)
+
+    current_artifacts = {artifact for record in records.values() for artifact in [record['artifact'], *record.get('variants', [])]}
+    previous_artifacts = {artifact for record in previous.values() for artifact in [record['artifact'], *record.get('variants', [])]}
+    stale = previous_artifacts - current_artifacts
+    prune_artifacts(output_path, stale)
+
+    unchanged = [record for record in records.values() if str(pathlib.Path(output_path, record['artifact'])) not in changed]
+    stats['skipped'] = len(unchanged)
+    stats['skipped_bytes'] = sum(record['size'] for record in unchanged)
+    logging.info(f"Synced '{source_folder}': {format_copy_stats(stats)}, {len(stale)} pruned.")
+    return records
+
+
+def hash_tree(source_folder, previous=None, tree=None):
+    """
+    Returns the content hash of every file in a folder, keyed by path relative to it.
+
+    Hashes recorded by the previous build (sync_tree records) are reused for files
+    whose size and modification time did not change. With tree (see SourceCatalog.tree)
+    the folder is not walked again.
+    """
+    previous = previous or {}
+    hashes = {}
+    if tree is None and not os.path.isdir(source_folder):
+        return hashes
+
+    for relative_file, source_file_path, stat in iter_tree_files(source_folder, tree):
+        stat = stat or os.stat(source_file_path)
+        record = previous.get(relative_file) or {}
+        if record.get('size') == stat.st_size and record.get('mtime_ns') == stat.st_mtime_ns and record.get('hash'):
+            hashes[relative_file] = record['hash']
+        else:
+            hashes[relative_file] = hash_file(source_file_path)
+    return hashes
+
+
+def plan_guides(md_files_path, file_names, previous, output_path, force=False):
+    """
+    Decides which guides must be rendered again.
+
+    A guide is dirty when its own content changed, when one of its recorded
+    dependencies (e.g. files linked from downloads.md) changed, or when one of
+    its generated artifacts is missing from the app.
+
+    Args:
+        md_files_path (str): Directory containing the Markdown guides.
+        file_names (list): Guide file names found in md_files_path.
+        previous (dict): Guide records from the previous build manifest.
+        output_path (pathlib.Path or str): Root of the generated app.
+        force (bool): Render every guide again, e.g. because a setting shared by all guides changed.
+
+    Returns:
+        tuple: (dirty file names, content hashes keyed by file name, stale artifacts to prune)
+    """
+    previous = previous or {}
+    dirty = []
+    hashes = {}
+
+    for file_name in file_names:
+        hashes[file_name] = hash_file(os.path.join(md_files_path, file_name))
+        record = previous.get(file_name)
+        if force or record is None or record.get('hash') != hashes[file_name]:
+            dirty.append(file_name)
+        elif any(not pathlib.Path(output_path, artifact).is_file() for artifact in record.get('artifacts', [])):
+            dirty.append(file_name)
+        elif any(not os.path.isfile(dependency) or hash_file(dependency) != dependency_hash
+                 for dependency, dependency_hash in record.get('dependencies', {}).items()):
+            dirty.append(file_name)
+
+    # Artifacts of dirty or deleted guides are pruned unless a clean guide still claims them
+    # (e.g. two download pages sharing a file in downloads/).
+    kept = set()
+    stale = set()
+    for file_name, record in previous.items():
+        if file_name in hashes and file_name not in dirty:
+            kept.update(record.get('artifacts', []))
+        else:
+            stale.update(record.get('artifacts', []))
+
+    return dirty, hashes, stale - kept
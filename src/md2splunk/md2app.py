@@ -1,30 +1,35 @@
 import argparse
+import json
 import shutil
 import os
-import re
-import yaml
 import sys
 import pathlib
-import ntpath
 import logging
+import threading
+import cProfile
+import datetime
+import dataclasses
 import importlib.resources # <--- THIS IS THE FIX: Ensure importlib is imported here
 
 # Import necessary functions from your other modules
-from md2splunk.xml_generator import generate_nav, generate_guides
-# Ensure copy_images_with_subfolders, copy_static_assets, copy_app_icons, and process_download_links are imported from file_handler
-from md2splunk.file_handler import read_file, write_file, load_metadata, copy_images_with_subfolders, copy_static_assets, copy_app_icons, process_download_links
-
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-    ]
-)
+from md2splunk.xml_generator import generate_nav, generate_guides, list_guides
+# Ensure copy_images_with_subfolders, copy_static_assets, and copy_app_icons are imported from file_handler
+from md2splunk.file_handler import write_file, load_metadata, copy_images_with_subfolders, copy_static_assets, copy_app_icons, APP_ICON_NAMES, COPY_MODES, COPY_COMPARE_MODES, asset_fingerprint, fingerprint_name, new_process_pool
+from md2splunk.image_handler import scan_image_references, report_image_references
+from md2splunk.image_optimizer import ImageOptimizer, DEFAULT_MAX_WIDTH, DEFAULT_SRCSET_WIDTHS
+from md2splunk.asset_store import plan_image_dedup, image_aliases, log_dedup_summary
+from md2splunk.build_report import BuildReport
+from md2splunk.build_config import BuildConfig, BuildResult
+from md2splunk.errors import BuildError, ConfigError, SourceError, MetadataError, OutputError, PackagingError
+from md2splunk.packager import AppArchive, ArchiveSink, ARCHIVE_FORMATS, archive_format_available, get_archive_path
+from md2splunk.render_cache import RenderCache, DEFAULT_CACHE_SIZE_MB
+from md2splunk.watcher import watch, get_watch_paths
+from md2splunk.source_catalog import SourceCatalog, GUIDE_NAME_PATTERN
+from md2splunk.manifest import get_manifest_path, load_manifest, save_manifest, remove_manifest, hash_file, settings_fingerprint, prune_artifacts, sync_tree, plan_guides, hash_tree
 
 # --- Functions defined directly in md2app.py ---
 
-def generate_app_dot_conf(default_path, course_title, version, description):
+def generate_app_dot_conf(default_path, course_title, version, description, sink=None):
     """Generates the app.conf file for the Splunk app."""
     app_dot_conf = f'''[install]
 is_configured = false
@@ -51,11 +56,11 @@ roles = admin,ess_admin,ess_user
         
         '''
     app_dot_conf_path = pathlib.Path(default_path, 'app.conf')
-    write_file(app_dot_conf_path, app_dot_conf)
+    write_file(app_dot_conf_path, app_dot_conf, sink)
     logging.info(f"Generated app.conf at {app_dot_conf_path}")
 
 
-def generate_metadata(metadata_path):
+def generate_metadata(metadata_path, sink=None):
     """Generates the default.meta file for the Splunk app."""
     file_content = '''[]
 access = read : [ * ], write : [ supportUser ]
@@ -65,58 +70,75 @@ export = system
 owner = supportUser
         '''
     default_meta_path = pathlib.Path(metadata_path, 'default.meta')
-    write_file(default_meta_path, file_content)
+    write_file(default_meta_path, file_content, sink)
     logging.info(f"Generated default.meta at {default_meta_path}")
 
 
-def copy_styles(static_path: str):
-    """Copy the default dashboard.css to the static_path."""
+def copy_styles(static_path: str, stylesheet: str = 'dashboard.css', sink=None):
+    """Copy the default dashboard.css to the static_path, published as stylesheet."""
     try:
         static_path = pathlib.Path(static_path)
+        if sink is not None:
+            # The resource may only exist on disk while it is open, so store its content
+            sink.write_file(static_path / stylesheet, importlib.resources.files('md2splunk.static').joinpath('dashboard.css').read_bytes())
+            logging.info(f"Added dashboard.css from package resources to the archive as {static_path / stylesheet}")
+            return
         static_path.mkdir(parents=True, exist_ok=True)
 
         # Use importlib.resources to reliably get the path to dashboard.css within the package
         with importlib.resources.path('md2splunk.static', 'dashboard.css') as dashboard_css_src_path:
-            shutil.copy(dashboard_css_src_path, static_path / 'dashboard.css')
-            logging.info(f"Copied dashboard.css from package resources to {static_path / 'dashboard.css'}")
+            shutil.copy(dashboard_css_src_path, static_path / stylesheet)
+            logging.info(f"Copied dashboard.css from package resources to {static_path / stylesheet}")
 
     except Exception as e:
-        logging.exception("Failed to copy dashboard.css.")
-        sys.exit(1)
+        raise OutputError(f"Failed to copy dashboard.css: {e}") from e
 
 
-def copy_custom_css_to_static(source_path: str, static_path: str):
-    """Copies custom.css if present, overwriting dashboard.css."""
+def copy_custom_css_to_static(source_path: str, static_path: str, stylesheet: str = 'dashboard.css', sink=None):
+    """Copies custom.css if present, overwriting dashboard.css (published as stylesheet)."""
     try:
         source_path = pathlib.Path(source_path)
         static_path = pathlib.Path(static_path)
 
         custom_css = source_path / 'custom.css'
         if custom_css.exists():
-            shutil.copy(custom_css, static_path / 'dashboard.css')
-            logging.info(f"custom.css found and used to overwrite dashboard.css in {static_path}")
+            if sink is not None:
+                sink.copy_file(custom_css, static_path / stylesheet)
+            else:
+                shutil.copy(custom_css, static_path / stylesheet)
+            logging.info(f"custom.css found and used to overwrite {stylesheet} in {static_path}")
         else:
             logging.info(f"No custom.css found in {source_path}; default dashboard.css remains")
 
     except Exception as e:
-        logging.exception("Error copying custom.css")
-        sys.exit(1)
-
-
-def package_app(output_path, app_dir):
-    """Packages the generated Splunk app into a .tar file."""
+        raise OutputError(f"Error copying custom.css: {e}") from e
+
+
+def package_app(output_path, app_dir, archive_format='tar', compress_level=None, reproducible=True, archive=None):
+    """
+    Packages the generated Splunk app into an archive next to the app directory.
+
+    Args:
+        output_path (pathlib.Path or str): The app directory.
+        app_dir (str): Name of the app, used as the top-level folder and archive name.
+        archive_format (str): One of packager.ARCHIVE_FORMATS ('tar', 'tgz', 'spl', ...).
+        compress_level (int): Compression level, or None for the format's default.
+        reproducible (bool): Normalize timestamps, owners and permissions so identical
+                             inputs give byte-identical archives.
+        archive (packager.AppArchive): An archive the build already added its files to
+                                       (--archive-only). It is written as is; the app
+                                       directory is not read.
+    """
     try:
-        format = 'tar'
         output_path = pathlib.Path(output_path)
-        
-        # Create the archive in the parent directory of the app
-        parent_dir = output_path.parent
-        archive_name = parent_dir / app_dir
+        if archive is not None:
+            archive_file = archive.close()
+            logging.info(f"App packaged successfully as {archive_file} (size: {archive_file.stat().st_size} bytes)")
+            return
         
         # Ensure the app directory exists before trying to package it
         if not output_path.exists():
-            logging.error(f"App directory does not exist: {output_path}")
-            sys.exit(1)
+            raise PackagingError(f"App directory does not exist: {output_path}")
         
         # List contents to verify what we're packaging
         app_contents = list(output_path.iterdir())
@@ -125,138 +147,290 @@ def package_app(output_path, app_dir):
         else:
             logging.info(f"Packaging app with {len(app_contents)} items: {[item.name for item in app_contents]}")
 
-        # Create the tar archive with proper Splunk app structure
-        # We need to archive from the parent directory and include the app directory
-        parent_dir = output_path.parent
-        app_dir_name = output_path.name
-        shutil.make_archive(str(archive_name), format, str(parent_dir), app_dir_name)
+        # Create the archive with proper Splunk app structure: every entry lives under
+        # the app directory name
+        archive_file = get_archive_path(output_path, app_dir, archive_format)
+        archive = AppArchive(archive_file, archive_format, compress_level, reproducible)
+        archive.add_tree(output_path, output_path.name)
+        archive.close()
         
         # Verify the archive was created
-        archive_file = pathlib.Path(f"{archive_name}.{format}")
         if archive_file.exists():
             archive_size = archive_file.stat().st_size
             logging.info(f"App packaged successfully as {archive_file} (size: {archive_size} bytes)")
         else:
-            logging.error(f"Archive was not created: {archive_file}")
-            sys.exit(1)
+            raise PackagingError(f"Archive was not created: {archive_file}")
 
+    except BuildError:
+        raise
     except Exception as e:
-        logging.error(f"Error packaging the app: {e}")
-        logging.exception("Full traceback:")
-        sys.exit(1)
+        raise PackagingError(f"Error packaging the app: {e}") from e
+
+
+def parse_args(argv=None):
+    """Parses the command line arguments."""
+    parser = argparse.ArgumentParser(description="App Builder")
+    parser.add_argument('source_path', type=str, help="Path to the source directory")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Reuse the previous build and regenerate only guides and assets whose sources changed")
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                        help="Number of worker processes used to render guides (default: number of CPUs, 1 renders serially)")
+    parser.add_argument('--no-package', action='store_true',
+                        help="Build the app directory without packaging it into an archive")
+    parser.add_argument('--copy-mode', choices=COPY_MODES, default='auto',
+                        help="How images and static assets are placed in the app: 'auto' clones or copies in the kernel where supported, "
+                             "'copy' always copies, 'hardlink' links to the source files (default: auto)")
+    parser.add_argument('--copy-compare', choices=COPY_COMPARE_MODES, default='mtime',
+                        help="With --incremental, how unchanged images and static assets are detected: size and modification time, "
+                             "content hash, or never, which copies them all again. Full builds always copy every file (default: mtime)")
+    parser.add_argument('--image-mode', choices=('all', 'referenced'), default='all',
+                        help="Copy every file in images/ or only the images the guides reference (default: all)")
+    parser.add_argument('--optimize-images', action='store_true',
+                        help="Downscale, recompress and strip metadata from PNG and JPEG images before adding them to the app")
+    parser.add_argument('--max-image-width', type=int, default=DEFAULT_MAX_WIDTH,
+                        help=f"With --optimize-images, downscale wider images to this width in pixels, 0 to keep sizes (default: {DEFAULT_MAX_WIDTH})")
+    parser.add_argument('--jpeg-quality', type=int, default=None,
+                        help="With --optimize-images, re-encode JPEGs at this quality (1-95); by default the original quality is kept")
+    parser.add_argument('--image-cache-dir', type=str, default=None,
+                        help="Directory of the optimized image cache (default: ~/.cache/md2splunk/images)")
+    parser.add_argument('--responsive-images', action='store_true',
+                        help="Add lazy loading, intrinsic width/height and a srcset of downscaled variants to panel images")
+    parser.add_argument('--srcset-widths', type=str, default=','.join(str(width) for width in DEFAULT_SRCSET_WIDTHS),
+                        help="With --responsive-images, comma-separated variant widths in pixels, empty for no srcset "
+                             f"(default: {','.join(str(width) for width in DEFAULT_SRCSET_WIDTHS)})")
+    parser.add_argument('--fingerprint-assets', action='store_true',
+                        help="Publish images, downloads and the dashboard stylesheet under content-hashed names "
+                             "(e.g. foo.3f9a1c2b.png) so browsers can cache them indefinitely. Images referenced from "
+                             "stylesheets keep their names, since stylesheets are published as-is")
+    parser.add_argument('--dedup-assets', action='store_true',
+                        help="Publish identical images and downloads once and point every reference at the one copy")
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help="Directory of the render cache shared between builds and courses (default: ~/.cache/md2splunk/render)")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE_MB,
+                        help=f"Size cap of the render cache in megabytes; least recently used entries are evicted (default: {DEFAULT_CACHE_SIZE_MB})")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="Render every guide from scratch without reading or writing the render cache")
+    parser.add_argument('--archive-format', choices=list(ARCHIVE_FORMATS), default='tar',
+                        help="Archive format: tar, tgz or spl (gzip-compressed, as Splunk installs them), tar.gz, "
+                             "or tar.zst (requires the zstandard package). The archive is written in one pass once "
+                             "the app is complete, with its entries in sorted order (default: tar)")
+    parser.add_argument('--compress-level', type=int, default=None,
+                        help="Compression level for compressed archive formats (default: 9 for gzip, 19 for zstd)")
+    parser.add_argument('--no-reproducible', action='store_true',
+                        help="Keep file timestamps, owners and permissions in the archive instead of normalizing them "
+                             "(reproducible archives use SOURCE_DATE_EPOCH, or 0, as every timestamp)")
+    parser.add_argument('--archive-only', action='store_true',
+                        help="Write the app straight into the archive without creating the app directory "
+                             "(cannot be combined with --incremental, --watch or --no-package)")
+    parser.add_argument('--report', type=str, default=None,
+                        help="Write a JSON build report (files and bytes per category, time per phase) to this path")
+    parser.add_argument('--profile', type=str, default=None,
+                        help="Profile the build: a path ending in .json receives a Chrome trace of the build phases and "
+                             "of every guide rendered (chrome://tracing, Perfetto); any other path receives cProfile "
+                             "statistics of the main process (python -m pstats PATH)")
+    parser.add_argument('--watch', action='store_true',
+                        help="Keep running and rebuild incrementally whenever guides, images, static assets, custom.css or metadata change")
+    parser.add_argument('--poll-interval', type=float, default=1.0,
+                        help="Seconds between checks for changes in --watch mode (default: 1.0)")
+    args = parser.parse_args(argv)
+    if args.archive_only and (args.incremental or args.watch or args.no_package):
+        parser.error("--archive-only cannot be combined with --incremental, --watch or --no-package")
+    return args
+
+
+def get_app_dir(metadata):
+    """Returns the name of the app directory, derived from the course title in the metadata."""
+    course_title = metadata.get("course_title", "Untitled App")
+    return course_title.lower().replace(" ", "_").replace("-", "_") + "_app" # Ensure valid app_dir
 
 
-def main():
+def get_output_path(source_path, md_files_path, app_dir):
+    """
+    Returns the app directory of a course: inside the 'lab-guides' folder when the
+    guides are read from there, otherwise next to the course directory.
+    """
+    if md_files_path != source_path:
+        return pathlib.Path(md_files_path, app_dir)
+    return pathlib.Path(pathlib.Path(source_path).parent, app_dir)
+
+
+def locate_app(source_path):
+    """
+    Returns the app directory a build of source_path writes, reading only the course metadata.
+
+    Raises:
+        BuildError: If the metadata is missing or cannot be parsed.
+    """
+    catalog = SourceCatalog(source_path)
+    metadata = load_metadata(source_path, catalog.metadata_path)
+    if not isinstance(metadata, dict):
+        raise MetadataError(f"{catalog.metadata_path} does not contain a mapping of course settings.")
+    return get_output_path(source_path, catalog.md_files_path, get_app_dir(metadata))
+
+
+def _build(config, executor=None):
+    """
+    Builds the Splunk app described by config. See build_app.
+
+    Args:
+        config (BuildConfig): The build settings.
+        executor (concurrent.futures.Executor): Optional worker pool reused across builds
+                                                for rendering guides.
+
+    Returns:
+        tuple: (app_dict describing the generated app, its BuildReport)
+    """
+    report = BuildReport()
+    report.start_phase('setup')
+
     # --- FIX: Initialize source_path here to prevent NameError ---
     source_path = None
 
     try:
-        parser = argparse.ArgumentParser(description="App Builder")
-        parser.add_argument('source_path', type=str, help="Path to the source directory")
-        args = parser.parse_args()
-
         # Check if the provided source path is valid
-        if not os.path.isdir(args.source_path):
-            logging.error(f"{args.source_path} is not a valid directory.")
-            sys.exit(1)
+        if not os.path.isdir(config.source_path):
+            raise SourceError(f"{config.source_path} is not a valid directory.")
+
+        if not config.no_package and not archive_format_available(config.archive_format):
+            raise ConfigError(f"The {config.archive_format} archive format requires the 'zstandard' package (pip install zstandard).")
 
-        logging.info(f"Source directory provided: {args.source_path}")
+        logging.info(f"Source directory provided: {config.source_path}")
 
         # Keep the original source path for metadata and asset loading
-        source_path = args.source_path
+        source_path = config.source_path
         
-        # Determine where the markdown files are located (lab-guides subfolder or root)
-        lab_guides_path = pathlib.Path(args.source_path, "lab-guides")
-        if lab_guides_path.is_dir() and any(f.endswith('.md') for f in os.listdir(lab_guides_path) if os.path.isfile(os.path.join(lab_guides_path, f))):
-            logging.info(f"'lab-guides' folder found with .md files. Processing guides from: {lab_guides_path}")
-            md_files_path = str(lab_guides_path)
+        # List the sources once; the catalog also determines where the markdown files
+        # are located (lab-guides subfolder or root)
+        catalog = SourceCatalog(source_path)
+        md_files_path = catalog.md_files_path
+        if md_files_path != source_path:
+            logging.info(f"'lab-guides' folder found with .md files. Processing guides from: {md_files_path}")
         else:
             logging.info(f"'lab-guides' folder not found or contains no .md files. Processing guides from root: {source_path}")
-            md_files_path = source_path
 
-    except argparse.ArgumentError as e:
-        logging.error(f"Argument parsing error: {e}")
-        sys.exit(1)
+    except BuildError:
+        raise
     except Exception as e:
-        logging.error(f"An unexpected error occurred while parsing arguments: {e}")
-        sys.exit(1)
+        raise SourceError(f"An unexpected error occurred while locating the source files: {e}") from e
 
     # --- Added check after the try-except block for robustness ---
     if source_path is None:
-        logging.error("Source path could not be determined after argument parsing. Exiting.")
-        sys.exit(1)
+        raise SourceError("Source path could not be determined. Exiting.")
 
     logging.info(f"Metadata will be loaded from: {source_path}")
     logging.info(f"Markdown files will be processed from: {md_files_path}")
 
-    command = os.path.basename(sys.argv[0])
-    guide_name_pattern = re.compile(r'^\d{2}-(?!.*answers).*\.md$')
-
-    try:
-        # Ensure the markdown files path contains .md files
-        md_files = [f for f in os.listdir(md_files_path) if f.endswith('.md')]
-        if not md_files:
-            logging.error(f"No .md files found in {md_files_path}")
-            logging.error("Are you in the right directory?")
-            sys.exit(1)
+    command = config.command
+    guide_name_pattern = GUIDE_NAME_PATTERN
 
-        if not any(re.search(guide_name_pattern, s) for s in md_files):
-            logging.error("No guide files found matching the pattern.")
-            sys.exit(1)
+    # Ensure the markdown files path contains .md files
+    if not catalog.markdown_files:
+        raise SourceError(f"No .md files found in {md_files_path}. Are you in the right directory?")
 
-    except Exception as e:
-        logging.error(f"Error processing markdown files path {md_files_path}: {e}")
-        sys.exit(1)
+    if not catalog.guides:
+        raise SourceError("No guide files found matching the pattern.")
 
     # Load metadata from the source path
-    metadata = load_metadata(source_path)
+    metadata = load_metadata(source_path, catalog.metadata_path)
 
     # Read metadata and set up app variables
     course_title = metadata.get("course_title", "Untitled App")
     version = metadata.get("version", "1.0.0")
-    app_dir = course_title.lower().replace(" ", "_").replace("-", "_") + "_app" # Ensure valid app_dir
+    app_dir = get_app_dir(metadata)
     description = metadata.get("description", "A Splunk App generated from Markdown guides.")
 
     # Set up directory paths for the app structure
     # output_path is the root of the new Splunk app (e.g., 'my_course_app')
-    # If we're processing from lab-guides, put the app inside lab-guides directory
-    # Otherwise, place it next to the source directory
-    if md_files_path != source_path:  # We're using lab-guides
-        output_path = pathlib.Path(md_files_path, app_dir)  # Place app inside lab-guides
-        logging.info(f"Placing app inside lab-guides directory: {output_path}")
-    else:  # We're processing from root
-        output_path = pathlib.Path(pathlib.Path(source_path).parent, app_dir)  # Place app next to source
-        logging.info(f"Placing app next to source directory: {output_path}")
+    output_path = get_output_path(source_path, md_files_path, app_dir)
+    logging.info(f"Placing app at {output_path}")
     
+    # In incremental mode the previous build is kept and the manifest next to the app
+    # tells us which outputs are still up to date. Any change to the settings that
+    # affect every generated file invalidates the whole manifest.
+    manifest_path = get_manifest_path(output_path)
+    srcset_widths = list(config.srcset_widths) if config.responsive_images else []
+    optimizer = None
+    if config.optimize_images or srcset_widths:
+        optimizer = ImageOptimizer(max(0, config.max_image_width), config.jpeg_quality, config.image_cache_dir, max(1, config.jobs),
+                                   optimize=config.optimize_images, variant_widths=srcset_widths)
+    responsive_images = None
+    if config.responsive_images:
+        responsive_images = {'widths': srcset_widths, 'max_width': optimizer.published_max_width if optimizer else 0}
+
+    # The dashboard stylesheet is custom.css if the course has one, else the packaged dashboard.css
+    stylesheet = 'dashboard.css'
+    if config.fingerprint_assets:
+        custom_css_source = pathlib.Path(source_path) / 'custom.css'
+        if 'custom.css' in catalog.source_files:
+            stylesheet_hash = hash_file(custom_css_source)
+        else:
+            with importlib.resources.path('md2splunk.static', 'dashboard.css') as dashboard_css_src_path:
+                stylesheet_hash = hash_file(dashboard_css_src_path)
+        stylesheet = fingerprint_name(stylesheet, asset_fingerprint(stylesheet_hash))
+
+    fingerprint = settings_fingerprint({
+        'source_path': os.path.abspath(source_path),
+        'md_files_path': os.path.abspath(md_files_path),
+        'command': command,
+        'app_dir': app_dir,
+        'course_title': course_title,
+        'version': version,
+        'description': description,
+        'year': datetime.datetime.now().year,
+        'image_optimizer': optimizer.settings() if optimizer else None,
+        'stylesheet': stylesheet,
+        'responsive_images': responsive_images,
+        'dedup_assets': config.dedup_assets,
+    })
+    previous_manifest = {}
+    if config.incremental:
+        previous_manifest = load_manifest(manifest_path)
+        if previous_manifest and previous_manifest.get('settings') != fingerprint:
+            logging.info("Build settings changed since the last build. A full build will be performed.")
+            previous_manifest = {}
+    else:
+        remove_manifest(manifest_path)
+
+    # With --archive-only every file goes straight into the archive through the sink
+    # and nothing is written to (or removed from) the app directory
+    sink = None
+    archive = None
+    if config.archive_only:
+        archive = AppArchive(get_archive_path(output_path, app_dir, config.archive_format), config.archive_format,
+                             config.compress_level, not config.no_reproducible)
+        sink = ArchiveSink(archive, output_path)
+        logging.info(f"Building the app straight into {archive.archive_path}")
+
     # Clean up existing output directory to ensure fresh build
-    if output_path.exists():
+    elif output_path.exists() and not previous_manifest:
         logging.info(f"Removing existing output directory: {output_path}")
         shutil.rmtree(output_path)
-    
-    os.makedirs(output_path, exist_ok=True)
-    logging.info(f"App output directory: {output_path}")
 
     appserver_path = pathlib.Path(output_path, 'appserver')
-    os.makedirs(appserver_path, exist_ok=True)
-
     default_path = pathlib.Path(output_path, 'default')
-    os.makedirs(default_path, exist_ok=True)
-
     static_path = pathlib.Path(appserver_path, 'static')
-    os.makedirs(static_path, exist_ok=True)
-
     # This images_path is the correct, final physical destination for your images
     images_path = pathlib.Path(static_path, 'images')
-    os.makedirs(images_path, exist_ok=True) # Ensure this base directory exists
-
     panels_path = pathlib.Path(output_path, 'default/data/ui/panels/')
-    os.makedirs(panels_path, exist_ok=True)
-
     views_path = pathlib.Path(output_path, 'default/data/ui/views')
-    os.makedirs(views_path, exist_ok=True)
-
     metadata_path = pathlib.Path(output_path, 'metadata')
-    os.makedirs(metadata_path, exist_ok=True)
+
+    if sink is None:
+        for path in (output_path, appserver_path, default_path, static_path, images_path, panels_path, views_path, metadata_path):
+            os.makedirs(path, exist_ok=True)
+        logging.info(f"App output directory: {output_path}")
+
+    # Fingerprinted images are published as <name>.<hash><ext>. The hash covers the
+    # optimizer settings too, since they change the published bytes.
+    image_hashes = None
+    image_renames = None
+    asset_fingerprints = None
+    if config.fingerprint_assets or config.dedup_assets:
+        image_hashes = hash_tree(os.path.join(md_files_path, 'images'), previous_manifest.get('images'), catalog.tree('images'))
+    if config.fingerprint_assets:
+        salt = json.dumps(optimizer.settings(), sort_keys=True) if optimizer else ''
+        asset_fingerprints = {reference: asset_fingerprint(file_hash, salt) for reference, file_hash in image_hashes.items()}
+        image_renames = {reference: fingerprint_name(reference, fingerprint) for reference, fingerprint in asset_fingerprints.items()}
 
     app_dict = {
         'source_path': source_path,
@@ -273,73 +447,349 @@ def main():
         'app_dir': app_dir,
         'course_title': course_title,
         'guide_name_pattern': guide_name_pattern,
+        'catalog': catalog,  # One listing of the sources, shared by every step
         'img_tag_regex': r'src=["\'](images/[^"\']+|./images/[^"\']+)["\']',
+        'jobs': max(1, config.jobs),
+        'executor': executor,
+        'responsive_images': responsive_images,
+        'stylesheet': stylesheet,
+        'fingerprint_assets': config.fingerprint_assets,
+        'asset_fingerprints': asset_fingerprints,
+        'render_cache': None if config.no_cache else RenderCache(config.cache_dir, max(0, config.cache_size) * 1024 * 1024),
+        'sink': sink,
     }
 
     # Generate app components and package the app
     logging.info("=== Starting app component generation ===")
     
+    report.start_phase('metadata')
     logging.info("Generating metadata...")
-    generate_metadata(metadata_path)
+    generate_metadata(metadata_path, sink)
     
     logging.info("Generating app.conf...")
-    generate_app_dot_conf(default_path, course_title, version, description)
+    generate_app_dot_conf(default_path, course_title, version, description, sink)
+
+    # Find which images the guides (and stylesheets) reference before copying them
+    report.start_phase('images')
+    source_images_path = os.path.join(md_files_path, 'images')
+    scanned_files = [os.path.join(md_files_path, file_name) for file_name in list_guides(app_dict)]
+    if 'custom.css' in catalog.source_files:
+        scanned_files.append(os.path.join(source_path, 'custom.css'))
+    scanned_files += [os.path.join(md_files_path, 'static', path) for path in catalog.tree('static') if path.endswith('.css')]
+    image_scan = scan_image_references(source_images_path, scanned_files, catalog.tree('images'))
+    report_image_references(source_images_path, image_scan, config.image_mode == 'referenced')
+    referenced_images = image_scan['referenced'] if config.image_mode == 'referenced' else None
+    css_images = {reference for reference, files in image_scan['referenced_by'].items()
+                  if any(file.lower().endswith('.css') for file in files)}
+
+    # Stylesheets are published as-is, so the images they reference keep their names
+    if image_renames:
+        for reference in css_images:
+            image_renames.pop(reference, None)
+            asset_fingerprints.pop(reference, None)
+
+    # Identical images are published once and references point at the canonical copy.
+    # Downloads identical to a published static file or image link to that file.
+    image_store = None
+    if config.dedup_assets:
+        candidate_hashes = image_hashes if referenced_images is None else \
+            {reference: file_hash for reference, file_hash in image_hashes.items() if reference in referenced_images}
+        image_store = plan_image_dedup(source_images_path, candidate_hashes, always_published=css_images)
+        app_dict['image_aliases'] = image_aliases(image_store)
+        published_images = set(candidate_hashes) - set(app_dict['image_aliases'])
+        referenced_images = published_images
+
+        dedup_targets = {}
+        static_hashes = hash_tree(os.path.join(md_files_path, 'static'), previous_manifest.get('static'), catalog.tree('static'))
+        for reference, file_hash in sorted(static_hashes.items()):
+            if os.path.basename(reference) not in APP_ICON_NAMES:
+                dedup_targets.setdefault(file_hash, (reference, os.path.join(md_files_path, 'static', reference)))
+        if optimizer is None or not optimizer.optimize:
+            # Published images are byte-identical to their source only when they are not optimized
+            for reference in sorted(published_images):
+                published_path = f"images/{(image_renames or {}).get(reference, reference)}"
+                dedup_targets.setdefault(image_hashes[reference], (published_path, os.path.join(source_images_path, reference)))
+        app_dict['dedup_targets'] = dedup_targets
 
     # --- Call the new, robust image copying function ---
     logging.info("Copying images...")
-    copy_images_with_subfolders(
-        source_base_dir=md_files_path,  # Look for images where the markdown files are
-        final_images_target_dir=images_path # Pass the already calculated correct target
-    )
+    if config.incremental:
+        image_records = sync_tree(
+            source_images_path,
+            images_path,
+            output_path,
+            previous=previous_manifest.get('images'),
+            mode=config.copy_mode,
+            compare=config.copy_compare,
+            include=referenced_images,
+            optimizer=optimizer,
+            rename=image_renames,
+            hashes=image_hashes,
+            tree=catalog.tree('images')
+        )
+    else:
+        copy_images_with_subfolders(
+            source_base_dir=md_files_path,  # Look for images where the markdown files are
+            final_images_target_dir=images_path, # Pass the already calculated correct target
+            mode=config.copy_mode,
+            only=referenced_images,
+            optimizer=optimizer,
+            rename=image_renames,
+            sink=sink,
+            tree=catalog.tree('images')
+        )
     # --- END IMAGE COPYING CALL ---
 
     # Copy static assets from static folder if it exists (in md_files_path)
+    report.start_phase('static')
     logging.info("Checking for and copying static assets...")
-    copy_static_assets(
-        source_base_dir=md_files_path,
-        static_path=static_path
-    )
+    if config.incremental:
+        static_records = sync_tree(
+            os.path.join(md_files_path, 'static'),
+            static_path,
+            output_path,
+            previous=previous_manifest.get('static'),
+            exclude=APP_ICON_NAMES,
+            mode=config.copy_mode,
+            compare=config.copy_compare,
+            tree=catalog.tree('static')
+        )
+    else:
+        copy_static_assets(
+            source_base_dir=md_files_path,
+            static_path=static_path,
+            sink=sink,
+            tree=catalog.tree('static')
+        )
     
     # Copy app icons to the app's static directory (output/static)
     logging.info("Checking for and copying app icons...")
     app_static_path = pathlib.Path(output_path, 'static')
-    os.makedirs(app_static_path, exist_ok=True)
+    if sink is None:
+        os.makedirs(app_static_path, exist_ok=True)
     copy_app_icons(
         source_base_dir=md_files_path,
-        app_static_path=app_static_path
+        app_static_path=app_static_path,
+        sink=sink,
+        tree=catalog.tree('static')
     )
 
     logging.info("Copying styles...")
-    copy_styles(static_path)
+    copy_styles(static_path, stylesheet, sink)
 
     # Check for custom.css in the source_path and copy it
-    custom_css_source = pathlib.Path(source_path) / 'custom.css'
-    if custom_css_source.exists():
+    if 'custom.css' in catalog.source_files:
         logging.info("Copying custom CSS...")
-        copy_custom_css_to_static(source_path, static_path)
+        copy_custom_css_to_static(source_path, static_path, stylesheet, sink)
     else:
         logging.info(f"No custom.css found in {source_path}. Using default styles.")
 
+    report.start_phase('navigation')
     logging.info("Generating navigation...")
     generate_nav(app_dict)
     
+    report.start_phase('guides')
     logging.info("Generating guides...")
-    generate_guides(app_dict) # This is where update_img_src will be called internally
+    if config.incremental:
+        guide_files = list_guides(app_dict)
+        # Guides are only re-rendered when their own sources change, so a different choice
+        # of canonical images (e.g. a new duplicate) must re-render all of them
+        aliases_changed = previous_manifest.get('image_aliases', {}) != app_dict.get('image_aliases', {})
+        dirty_guides, guide_hashes, stale_artifacts = plan_guides(
+            md_files_path, guide_files, previous_manifest.get('guides'), output_path, force=aliases_changed
+        )
+        prune_artifacts(output_path, stale_artifacts)
+        logging.info(f"Rendering {len(dirty_guides)} of {len(guide_files)} guides; the rest are unchanged.")
+
+        guide_results = generate_guides(app_dict, dirty_guides) # This is where update_img_src will be called internally
+
+        guide_records = {}
+        for file_name in guide_files:
+            if file_name in guide_results:
+                result = guide_results[file_name]
+                guide_records[file_name] = {
+                    'hash': guide_hashes[file_name],
+                    'artifacts': result['artifacts'],
+                    'dependencies': {dependency: hash_file(dependency) for dependency in result['dependencies']},
+                }
+            else:
+                guide_records[file_name] = previous_manifest['guides'][file_name]
+
+        save_manifest(manifest_path, {
+            'settings': fingerprint,
+            'guides': guide_records,
+            'images': image_records,
+            'static': static_records,
+            'image_aliases': app_dict.get('image_aliases', {}),
+        })
+    else:
+        guide_results = generate_guides(app_dict) # This is where update_img_src will be called internally
+
+    if image_store is not None:
+        deduplicated_downloads = {source: size for result in guide_results.values() for source, size in result['deduplicated']}
+        log_dedup_summary(image_store, len(deduplicated_downloads), sum(deduplicated_downloads.values()))
     
     # Verify app contents before packaging
+    report.start_phase('summary')
     logging.info(f"=== App generation complete. Verifying contents of {output_path} ===")
-    if output_path.exists():
-        for item in output_path.rglob('*'):
-            if item.is_file():
-                logging.info(f"Created: {item.relative_to(output_path)} (size: {item.stat().st_size} bytes)")
+    if sink is not None:
+        report.add_files(sink.files())
+    elif output_path.exists():
+        report.scan_app(output_path)
     else:
-        logging.error(f"App directory was not created: {output_path}")
-        sys.exit(1)
+        raise OutputError(f"App directory was not created: {output_path}")
     
-    logging.info("Packaging app...")
-    package_app(output_path, app_dir)
+    if config.no_package:
+        logging.info("Skipping packaging (--no-package).")
+    else:
+        report.start_phase('package')
+        logging.info("Packaging app...")
+        package_app(output_path, app_dir, config.archive_format, config.compress_level, not config.no_reproducible, archive)
+
+    report.finish()
+    for file_name, result in guide_results.items():
+        report.add_guide(file_name, result['profile'])
+    report.details.update({
+        'app_dir': app_dir,
+        'output_path': str(output_path),
+        'archive': None if config.no_package else str(get_archive_path(output_path, app_dir, config.archive_format)),
+        'guides_rendered': len(guide_results),
+    })
+    report.log_summary()
+    if config.report:
+        report.write_json(config.report)
+    if config.profile and config.profile.endswith('.json'):
+        report.write_trace(config.profile)
+
+    logging.info(f"App '{app_dir}' successfully built at {archive.archive_path if archive is not None else output_path}")
+    return app_dict, report
+
+
+class _WarningCollector(logging.Handler):
+    """Keeps the messages of the warnings and errors a build logs from the thread running it."""
+
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.thread = threading.get_ident()
+        self.messages = []
+
+    def emit(self, record):
+        if record.thread == self.thread:
+            self.messages.append(record.getMessage())
+
+
+def build_app(config, executor=None):
+    """
+    Builds a Splunk app from a course.
+
+    The build runs in the calling process and never exits it, so tools can run many
+    builds in one warm process. Guides are rendered in a process pool when config.jobs
+    is greater than one; pass executor to reuse one pool across builds.
+
+    Args:
+        config (BuildConfig): The build settings.
+        executor (concurrent.futures.Executor): Optional worker pool reused across builds
+                                                for rendering guides.
+
+    Returns:
+        BuildResult: The files, timings and warnings of the build. Warnings logged in
+                     worker processes are not included.
+
+    Raises:
+        BuildError: If the build fails. The subclass tells which part failed
+                    (ConfigError, SourceError, MetadataError, OutputError, PackagingError).
+    """
+    config.validate()
+    collector = _WarningCollector()
+    root_logger = logging.getLogger()
+    root_logger.addHandler(collector)
+    try:
+        app_dict, report = _build(config, executor)
+    except BuildError:
+        raise
+    except Exception as e:
+        raise BuildError(f"An unexpected error occurred during app generation: {e}") from e
+    finally:
+        root_logger.removeHandler(collector)
+
+    output_path = app_dict['output_path']
+    return BuildResult(
+        app_dir=app_dict['app_dir'],
+        output_path=output_path,
+        archive_path=None if config.no_package else get_archive_path(output_path, app_dict['app_dir'], config.archive_format),
+        source_path=app_dict['source_path'],
+        md_files_path=app_dict['md_files_path'],
+        artifacts=dict(report.artifacts),
+        timings={name: phase['seconds'] for name, phase in report.phases.items()},
+        warnings=collector.messages,
+        report=report.to_dict(),
+    )
+
+
+def watch_app(config, poll_interval=1.0):
+    """Builds the app, then rebuilds it incrementally whenever one of its sources changes."""
+    # Watch builds always reuse the previous output, and one worker pool is kept warm
+    # for the whole session so workers keep their configured Markdown renderers.
+    config = dataclasses.replace(config, incremental=True)
+    jobs = max(1, config.jobs)
+    executor = new_process_pool(jobs, ignore_interrupts=True) if jobs > 1 else None
+
+    def rebuild(changed_paths=None):
+        try:
+            return build_app(config, executor)
+        except BuildError as e:
+            logging.error(e)
+            logging.error("Build failed. Waiting for further changes...")
+        return None
+
+    try:
+        result = rebuild()
+        if result is None:
+            sys.exit(1)
+        watch(get_watch_paths(result.source_path, result.md_files_path), rebuild, interval=poll_interval)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+def configure_logging():
+    """
+    Logs INFO and above to stdout. Only the command line entry points call this, so
+    importing md2splunk never configures the logging of the application using it.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.StreamHandler(sys.stdout),
+        ]
+    )
+
+
+def main():
+    configure_logging()
+    args = parse_args()
+    config = BuildConfig.from_args(args, command=os.path.basename(sys.argv[0]))
 
-    logging.info(f"App '{app_dir}' successfully built at {output_path}")
+    # Trace files are written by the build; any other --profile path gets cProfile statistics
+    profiler = None
+    if args.profile and not args.profile.endswith('.json'):
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        if args.watch:
+            watch_app(config, args.poll_interval)
+        else:
+            build_app(config)
+    except BuildError as e:
+        logging.error(e)
+        sys.exit(1)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            logging.info(f"Wrote cProfile statistics to {args.profile}")
 
 
 # --- The try-except block for the entire script execution must wrap the main() call ---
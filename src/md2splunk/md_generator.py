@@ -1,8 +1,9 @@
 import os
-import re
 import sys
 import logging
 
+from md2splunk.source_catalog import SourceCatalog, NUMBERED_NAME_PATTERN
+
 
 def merge_source_files(pdf_dict):
     """
@@ -17,39 +18,22 @@ def merge_source_files(pdf_dict):
 
     source_path = pdf_dict.get('source_path')
     logging.debug(f"merge_source_files: Source path: {source_path}")
-    logging.debug(f"Contents of source path: {os.listdir(source_path)}")
-
-    introduction_file = None
-    for filename in os.listdir(source_path):
-        if "introduction.md" in filename:  # Match introduction.md with or without "00-" prepended
-            introduction_file = os.path.join(source_path, filename)
-            logging.debug(f"Introduction file found: {introduction_file}")
-            break
+    catalog = SourceCatalog(source_path, md_files_path=source_path)
+    logging.debug(f"Contents of source path: {list(catalog.files)}")
 
-    if not introduction_file:
+    # Match introduction.md with or without "00-" prepended
+    introduction_file = os.path.join(source_path, catalog.introduction) if catalog.introduction else None
+    if introduction_file:
+        logging.debug(f"Introduction file found: {introduction_file}")
+    else:
         logging.error("No 'introduction.md' file found (with or without '00-').")
         sys.exit(1)
 
-    numbered_files = []
-    resources_file = None
-
-    for filename in os.listdir(source_path):
-        file_path = os.path.join(source_path, filename)
-
-        if "introduction.md" in filename:
-            introduction_file = file_path
+    # Match resources.md with or without a number
+    resources_file = os.path.join(source_path, catalog.resources) if catalog.resources else None
 
-        elif "resources.md" in filename:  # Match resources.md with or without a number
-            resources_file = file_path
-
-        else:
-            # Check for numbered lab files (e.g., 01-lab.md)
-            file_pattern = re.compile(r'^\d{2}-.+\.md$')
-            if file_pattern.match(filename):
-                numbered_files.append(file_path)
-
-    # Sort numbered files to determine sequence order
-    numbered_files.sort()
+    # Numbered lab files (e.g., 01-lab.md), sorted to determine sequence order
+    numbered_files = [os.path.join(source_path, filename) for filename in catalog.numbered_files]
 
     # Prepare the list of files to process
     files_to_process = []
@@ -61,20 +45,16 @@ def merge_source_files(pdf_dict):
     # Add numbered files to the processing list
     files_to_process.extend(numbered_files)
 
-    # Function to check if a file is already numbered
-    def is_numbered_file(file_name):
-        return bool(re.match(r"^\d{2}-", file_name))
-
     # Handle the resources file
     if resources_file:
         resources_file_basename = os.path.basename(resources_file)
 
-        if is_numbered_file(resources_file_basename):
+        if NUMBERED_NAME_PATTERN.match(resources_file_basename):
             # If already numbered, use it directly
             numbered_resources_file = resources_file
         else:
             # Determine the last number in the list of files
-            last_number = int(numbered_files[-1].split('-')[0]) if numbered_files else 0
+            last_number = int(catalog.numbered_files[-1].split('-')[0]) if numbered_files else 0
             new_resources_file_name = f"{last_number + 1:02d}-resources.md"
             numbered_resources_file = os.path.join(source_path, new_resources_file_name)
             logging.debug(f"Resources file will be treated as: {numbered_resources_file}")
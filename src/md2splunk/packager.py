@@ -0,0 +1,191 @@
+import io
+import os
+import time
+import gzip
+import stat
+import logging
+import pathlib
+import tarfile
+
+try:
+    import zstandard
+except ImportError:  # zstd packaging is optional
+    zstandard = None
+
+# Archive formats: file extension and compression. Splunk installs .tgz and .spl
+# (both gzip-compressed tars); .tar.zst needs the optional zstandard package.
+ARCHIVE_FORMATS = {
+    'tar': ('.tar', None),
+    'tgz': ('.tgz', 'gz'),
+    'spl': ('.spl', 'gz'),
+    'tar.gz': ('.tar.gz', 'gz'),
+    'tar.zst': ('.tar.zst', 'zst'),
+}
+
+DEFAULT_COMPRESS_LEVEL = {'gz': 9, 'zst': 19}
+
+
+def get_archive_path(output_path, app_dir, archive_format='tar'):
+    """Returns the path of the archive created next to the app directory."""
+    extension, _ = ARCHIVE_FORMATS[archive_format]
+    return pathlib.Path(output_path).parent / f"{app_dir}{extension}"
+
+
+def archive_format_available(archive_format):
+    """Returns whether the packages needed to write archive_format are installed."""
+    return ARCHIVE_FORMATS[archive_format][1] != 'zst' or zstandard is not None
+
+
+def get_source_date_epoch():
+    """Returns the timestamp recorded for every entry: SOURCE_DATE_EPOCH if set, else 0."""
+    try:
+        return int(os.environ.get('SOURCE_DATE_EPOCH', 0))
+    except ValueError:
+        logging.warning("Ignoring invalid SOURCE_DATE_EPOCH; using 0.")
+        return 0
+
+
+class AppArchive:
+    """
+    Writes a Splunk app archive, optionally compressed.
+
+    Entries are collected first: files on disk (add_file, add_tree) are only recorded
+    by path, files generated in memory (add_bytes) are kept in memory. close() then
+    writes the whole archive in one pass, in sorted order, piping the tar data through
+    the compressor into the archive file without an intermediate uncompressed archive.
+    When reproducible, entries get a fixed mtime, uid/gid 0, no user or group names
+    and normalized permissions, so identical inputs give byte-identical archives.
+
+    The archive is written to a temporary file and moved into place by close().
+    """
+
+    def __init__(self, archive_path, archive_format='tar', compress_level=None, reproducible=True, mtime=None):
+        if archive_format not in ARCHIVE_FORMATS:
+            raise ValueError(f"Unknown archive format: {archive_format}")
+        _, self.compression = ARCHIVE_FORMATS[archive_format]
+        if not archive_format_available(archive_format):
+            raise RuntimeError("The tar.zst format requires the 'zstandard' package (pip install zstandard).")
+
+        self.archive_path = pathlib.Path(archive_path)
+        self.compress_level = compress_level if compress_level is not None else DEFAULT_COMPRESS_LEVEL.get(self.compression)
+        self.reproducible = reproducible
+        self.mtime = get_source_date_epoch() if mtime is None else mtime
+        # Archive name -> path on disk or bytes
+        self.entries = {}
+
+    def add_bytes(self, arcname, data):
+        """Adds a file whose content is held in memory."""
+        self.entries[arcname] = data.encode('utf-8') if isinstance(data, str) else bytes(data)
+
+    def add_file(self, arcname, path):
+        """Adds a file read from disk when the archive is written."""
+        self.entries[arcname] = pathlib.Path(path)
+
+    def add_tree(self, directory, arcname_prefix):
+        """Adds every file under directory that is not in the archive yet, as <arcname_prefix>/<relative path>."""
+        directory = pathlib.Path(directory)
+        for root, _, files in os.walk(directory):
+            for file in files:
+                path = pathlib.Path(root, file)
+                arcname = f"{arcname_prefix}/{path.relative_to(directory).as_posix()}"
+                self.entries.setdefault(arcname, path)
+
+    def _tarinfo(self, arcname, size, mode, mtime, entry_type=tarfile.REGTYPE):
+        info = tarfile.TarInfo(arcname)
+        info.type = entry_type
+        info.size = size
+        if self.reproducible:
+            info.mtime = self.mtime
+            info.uid = info.gid = 0
+            info.uname = info.gname = ''
+            executable = mode & stat.S_IXUSR or entry_type == tarfile.DIRTYPE
+            info.mode = 0o755 if executable else 0o644
+        else:
+            info.mtime = mtime
+            info.uid = os.getuid() if hasattr(os, 'getuid') else 0
+            info.gid = os.getgid() if hasattr(os, 'getgid') else 0
+            info.mode = stat.S_IMODE(mode)
+        return info
+
+    def _open_stream(self, raw):
+        """Wraps the archive file in the compressor. Returns (stream, finish callable)."""
+        if self.compression == 'gz':
+            # No file name and a fixed timestamp in the gzip header
+            stream = gzip.GzipFile(filename='', mode='wb', fileobj=raw, compresslevel=self.compress_level,
+                                   mtime=self.mtime if self.reproducible else None)
+            return stream, stream.close
+        if self.compression == 'zst':
+            stream = zstandard.ZstdCompressor(level=self.compress_level).stream_writer(raw, closefd=False)
+            return stream, stream.close
+        return raw, lambda: None
+
+    def close(self):
+        """
+        Writes the archive.
+
+        Returns:
+            pathlib.Path: The archive path.
+        """
+        tmp_path = self.archive_path.with_name(f".{self.archive_path.name}.{os.getpid()}.tmp")
+        # Directories and in-memory files have no timestamp of their own
+        mtime = self.mtime if self.reproducible else int(time.time())
+        directories = set()
+        for arcname in self.entries:
+            parts = arcname.split('/')[:-1]
+            directories.update('/'.join(parts[:index]) for index in range(1, len(parts) + 1))
+
+        try:
+            with open(tmp_path, 'wb') as raw:
+                stream, finish = self._open_stream(raw)
+                with tarfile.open(fileobj=stream, mode='w|', format=tarfile.PAX_FORMAT) as tar:
+                    for directory in sorted(directories):
+                        tar.addfile(self._tarinfo(directory, 0, 0o755, mtime, tarfile.DIRTYPE))
+                    for arcname in sorted(self.entries):
+                        entry = self.entries[arcname]
+                        if isinstance(entry, bytes):
+                            tar.addfile(self._tarinfo(arcname, len(entry), 0o644, mtime), io.BytesIO(entry))
+                        else:
+                            file_stat = entry.stat()
+                            with open(entry, 'rb') as f:
+                                tar.addfile(self._tarinfo(arcname, file_stat.st_size, file_stat.st_mode, int(file_stat.st_mtime)), f)
+                finish()
+            os.replace(tmp_path, self.archive_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return self.archive_path
+
+
+class ArchiveSink:
+    """
+    Receives the files of a build that goes straight into an archive (--archive-only).
+
+    Paths are the ones the build would write on disk under output_path; they become
+    archive entries under the app directory name instead. Generated files are kept
+    in memory and copied files are read from their source when the archive is written,
+    so nothing is written under output_path.
+    """
+
+    def __init__(self, archive, output_path):
+        self.archive = archive
+        self.output_path = pathlib.Path(output_path)
+
+    def _arcname(self, path):
+        return f"{self.output_path.name}/{pathlib.Path(path).relative_to(self.output_path).as_posix()}"
+
+    def write_file(self, path, content):
+        """Adds a generated file (str or bytes) at path, replacing any previous content."""
+        self.archive.add_bytes(self._arcname(path), content)
+
+    def copy_file(self, source_file_path, path):
+        """Adds source_file_path to the archive at path, replacing any previous content."""
+        self.archive.add_file(self._arcname(path), source_file_path)
+
+    def exists(self, path):
+        return self._arcname(path) in self.archive.entries
+
+    def files(self):
+        """Returns (path relative to output_path, size) for every file added so far, sorted."""
+        prefix = f"{self.output_path.name}/"
+        return [(arcname[len(prefix):], len(entry) if isinstance(entry, bytes) else entry.stat().st_size)
+                for arcname, entry in sorted(self.archive.entries.items())]
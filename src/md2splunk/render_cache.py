@@ -0,0 +1,148 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+import pathlib
+
+# Bump this whenever a change to the converters or the panel pipeline changes
+# the HTML produced for the same Markdown input.
+RENDER_CACHE_VERSION = 1
+
+# Default size cap for the cache directory, in megabytes
+DEFAULT_CACHE_SIZE_MB = 256
+
+_package_versions = None
+
+
+def get_default_cache_dir(name='render'):
+    """Returns the per-user cache directory for name ('render', 'images'), honouring XDG_CACHE_HOME."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'md2splunk', name)
+
+
+def _get_package_versions():
+    """Returns the versions of the packages whose output ends up in a cached panel."""
+    global _package_versions
+    if _package_versions is None:
+        from importlib import metadata
+
+        _package_versions = {}
+        for package in ('md2app-xml', 'Markdown', 'pymdown-extensions', 'lxml'):
+            try:
+                _package_versions[package] = metadata.version(package)
+            except metadata.PackageNotFoundError:
+                _package_versions[package] = None
+    return _package_versions
+
+
+class RenderCache:
+    """
+    An on-disk cache of rendered panel HTML, keyed by the content of everything that
+    affects it (the Markdown text, the extension setup, the app_dir and the settings
+    used by the panel transforms). Because the key does not include any path, courses
+    sharing a guide share the cache entry.
+
+    Entries are plain files named after their key, written atomically, so several
+    worker processes and concurrent builds can use the same directory. Reading an
+    entry refreshes its modification time; prune() evicts the least recently used
+    entries once the directory grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_CACHE_SIZE_MB * 1024 * 1024):
+        self.cache_dir = pathlib.Path(cache_dir or get_default_cache_dir())
+        self.max_bytes = max_bytes
+
+    def make_key(self, text, extensions, extension_configs, settings):
+        """
+        Returns the cache key for a guide.
+
+        Args:
+            text (str): The Markdown source of the guide.
+            extensions (list): Markdown extensions used to render it.
+            extension_configs (dict): Configuration of those extensions.
+            settings (dict): Any other build setting the rendered HTML depends on.
+
+        Returns:
+            str: A SHA-256 hex digest.
+        """
+        fingerprint = json.dumps({
+            'version': RENDER_CACHE_VERSION,
+            'packages': _get_package_versions(),
+            'extensions': list(extensions),
+            'extension_configs': extension_configs or {},
+            'settings': settings,
+        }, sort_keys=True, default=str)
+        digest = hashlib.sha256(fingerprint.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _entry_path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.html"
+
+    def get(self, key):
+        """Returns the cached HTML for key, or None on a miss."""
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path, 'r', encoding="utf-8") as f:
+                html = f.read()
+        except OSError:
+            return None
+
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
+        return html
+
+    def put(self, key, html):
+        """Stores the HTML for key. Failures are logged and otherwise ignored."""
+        entry_path = self._entry_path(key)
+        tmp_path = entry_path.with_name(f"{entry_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            entry_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_path, 'w', encoding="utf-8") as f:
+                f.write(html)
+            os.replace(tmp_path, entry_path)
+        except OSError as e:
+            logging.warning(f"Could not write render cache entry {entry_path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def prune(self):
+        """
+        Evicts the least recently used entries until the cache fits in max_bytes.
+
+        Returns:
+            int: The number of evicted entries.
+        """
+        if not self.cache_dir.is_dir():
+            return 0
+
+        entries = []
+        total = 0
+        for entry_path in self.cache_dir.glob('*/*.html'):
+            try:
+                stat = entry_path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, entry_path))
+            total += stat.st_size
+
+        evicted = 0
+        for _, size, entry_path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                entry_path.unlink()
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+
+        if evicted:
+            logging.info(f"Evicted {evicted} least recently used render cache entries from {self.cache_dir}")
+        return evicted
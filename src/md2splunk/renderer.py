@@ -0,0 +1,46 @@
+import json
+import logging
+import threading
+
+# One configured Markdown instance per extension setup and thread, built lazily in
+# each process (including every worker of a parallel build) and reused for all
+# documents. Markdown instances keep per-document state, so threads cannot share them.
+_renderers = {}
+
+
+class MarkdownRenderer:
+    """
+    A configured Markdown engine that is built once and reused between documents.
+
+    Building markdown.Markdown loads and configures every extension (superfences,
+    the emoji index, pymdownx.blocks, ...). Reusing one instance and calling
+    Markdown.reset() between documents pays that cost once per process.
+    """
+
+    def __init__(self, extensions, extension_configs=None):
+        import markdown
+
+        self.extensions = list(extensions)
+        self.extension_configs = extension_configs or {}
+        self.md = markdown.Markdown(extensions=self.extensions, extension_configs=self.extension_configs)
+        logging.debug(f"Built Markdown renderer with extensions: {self.extensions}")
+
+    def render(self, text):
+        """Converts Markdown text to HTML, clearing any state left by the previous document."""
+        self.md.reset()
+        return self.md.convert(text)
+
+
+def get_renderer(extensions, extension_configs=None):
+    """Returns the renderer for this extension setup, building it on first use in this thread."""
+    key = (threading.get_ident(), tuple(extensions), json.dumps(extension_configs or {}, sort_keys=True))
+    renderer = _renderers.get(key)
+    if renderer is None:
+        renderer = MarkdownRenderer(extensions, extension_configs)
+        _renderers[key] = renderer
+    return renderer
+
+
+def render_markdown(text, extensions, extension_configs=None):
+    """Converts Markdown text to HTML with the shared renderer for the given extensions."""
+    return get_renderer(extensions, extension_configs).render(text)
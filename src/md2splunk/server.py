@@ -0,0 +1,394 @@
+"""
+A local build server that keeps the build process warm between builds.
+
+Jobs are submitted over HTTP, on a local TCP port or a Unix socket, and built with
+md2app.build_app in a fixed number of builder threads. The threads share the
+process's caches (Markdown renderers, image sizes, the render and image caches) and
+one pool of worker processes for rendering guides. An app directory is never written
+by two jobs at once, and a job identical to one still waiting in the queue is not queued again.
+
+    POST /builds        {"source_path": "...", <any BuildConfig field>, "wait": false}
+    GET  /builds/<id>   Status and result of a job
+    GET  /metrics       Queue depth, job counts and queue/build latencies
+    GET  /health
+"""
+import os
+import json
+import time
+import uuid
+import typing
+import signal
+import logging
+import argparse
+import threading
+import statistics
+import dataclasses
+import socketserver
+import collections
+import http.server
+from concurrent.futures.process import BrokenProcessPool
+
+from md2splunk.md2app import build_app, locate_app, configure_logging
+from md2splunk.errors import BuildError
+from md2splunk.build_config import BuildConfig
+from md2splunk.file_handler import new_process_pool
+
+# Finished jobs kept for GET /builds/<id> and used for latency metrics
+DEFAULT_HISTORY = 1000
+
+DEFAULT_PORT = 8765
+
+# Inclusive (minimum, maximum) of the integer settings accepted by POST /builds; None is unbounded
+REQUEST_RANGES = {
+    'jobs': (1, None),
+    'compress_level': (0, 22),
+    'max_image_width': (0, None),
+    'jpeg_quality': (1, 95),
+    'cache_size': (0, None),
+}
+
+
+class BuildJob:
+    """A build request and, once it ran, its outcome."""
+
+    def __init__(self, config):
+        self.id = uuid.uuid4().hex
+        self.config = config
+        self.course = os.path.realpath(config.source_path)
+        # Courses with the same title next to each other build into the same app directory
+        self.output_path = os.path.realpath(locate_app(config.source_path))
+        self.status = 'queued'
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def to_dict(self):
+        """Returns the job as JSON-serializable data."""
+        job = {
+            'id': self.id,
+            'source_path': self.config.source_path,
+            'status': self.status,
+            'submitted_at': self.submitted_at,
+            'queued_seconds': (self.started_at or time.time()) - self.submitted_at,
+            'build_seconds': self.finished_at - self.started_at if self.finished_at and self.started_at else None,
+            'error': self.error,
+        }
+        if self.result is not None:
+            job.update({
+                'app_dir': self.result.app_dir,
+                'output_path': str(self.result.output_path),
+                'archive_path': str(self.result.archive_path) if self.result.archive_path else None,
+                'timings': self.result.timings,
+                'warnings': self.result.warnings,
+                'files': self.result.report['total_files'],
+                'bytes': self.result.report['total_bytes'],
+            })
+        return job
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        'mean': statistics.fmean(ordered),
+        'p50': ordered[len(ordered) // 2],
+        'p95': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        'max': ordered[-1],
+    }
+
+
+class BuildServer:
+    """
+    Queues build jobs and runs them in `concurrency` builder threads.
+
+    Args:
+        concurrency (int): Number of builds that run at the same time.
+        jobs (int): Worker processes shared by all builds for rendering guides, and the
+                    default `jobs` of submitted builds.
+        history (int): Number of finished jobs remembered.
+    """
+
+    def __init__(self, concurrency=1, jobs=None, history=DEFAULT_HISTORY):
+        self.jobs = max(1, jobs or os.cpu_count() or 1)
+        self.history = history
+        self.condition = threading.Condition()
+        self.queue = collections.deque()
+        self.active_outputs = set()
+        self.all_jobs = collections.OrderedDict()
+        self.finished = collections.deque(maxlen=history)
+        self.counts = {'submitted': 0, 'coalesced': 0, 'succeeded': 0, 'failed': 0}
+        self.started_at = time.time()
+        self.stopping = False
+        self.executor = self._new_executor()
+        self.threads = [threading.Thread(target=self._run_builds, name=f"builder-{index}", daemon=True)
+                        for index in range(max(1, concurrency))]
+        for thread in self.threads:
+            thread.start()
+
+    def _new_executor(self):
+        """Returns the worker pool shared by all builds, or None with a single job."""
+        if self.jobs == 1:
+            return None
+        return new_process_pool(self.jobs, ignore_interrupts=True)
+
+    def submit(self, config):
+        """
+        Queues a build.
+
+        Returns:
+            BuildJob: The new job, or the queued job with the same settings if there is one.
+        """
+        config.validate()
+        job = BuildJob(config)
+        with self.condition:
+            self.counts['submitted'] += 1
+            for queued in self.queue:
+                if queued.course == job.course and queued.config == config:
+                    self.counts['coalesced'] += 1
+                    return queued
+            self.queue.append(job)
+            self.all_jobs[job.id] = job
+            while len(self.all_jobs) > self.history and next(iter(self.all_jobs.values())).done.is_set():
+                self.all_jobs.popitem(last=False)
+            self.condition.notify()
+        logging.info(f"Queued build {job.id} for {config.source_path} ({len(self.queue)} queued)")
+        return job
+
+    def get(self, job_id):
+        with self.condition:
+            return self.all_jobs.get(job_id)
+
+    def _next_job(self):
+        """Waits for the oldest queued job whose app directory is not being written. Returns None when stopping."""
+        with self.condition:
+            while True:
+                if self.stopping:
+                    return None
+                for job in self.queue:
+                    if job.output_path not in self.active_outputs:
+                        self.queue.remove(job)
+                        self.active_outputs.add(job.output_path)
+                        job.status = 'running'
+                        job.started_at = time.time()
+                        return job
+                self.condition.wait()
+
+    def _run_builds(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            executor = self.executor
+            try:
+                job.result = build_app(job.config, executor)
+                job.status = 'succeeded'
+            except BuildError as e:
+                job.status = 'failed'
+                job.error = str(e)
+                logging.error(f"Build {job.id} for {job.config.source_path} failed: {e}")
+                if isinstance(e.__cause__, BrokenProcessPool):
+                    self._replace_executor(executor)
+            job.finished_at = time.time()
+            with self.condition:
+                self.active_outputs.discard(job.output_path)
+                self.counts[job.status] += 1
+                self.finished.append(job)
+                # A job for this app directory may have been waiting for this one
+                self.condition.notify_all()
+            job.done.set()
+
+    def _replace_executor(self, broken):
+        """Starts a new worker pool after a worker died, unless another builder already replaced it."""
+        with self.condition:
+            if self.executor is not broken:
+                return
+            self.executor = self._new_executor()
+        logging.error("Worker pool failed; started a new one for the next builds")
+        broken.shutdown(wait=False)
+
+    def metrics(self):
+        """Returns queue depth, job counts and latency statistics of the recent jobs."""
+        with self.condition:
+            finished = list(self.finished)
+            return {
+                'uptime_seconds': time.time() - self.started_at,
+                'queue_depth': len(self.queue),
+                'running': len(self.active_outputs),
+                'builders': len(self.threads),
+                'worker_processes': self.jobs if self.executor is not None else 0,
+                **self.counts,
+                'queue_seconds': _percentiles([job.started_at - job.submitted_at for job in finished]),
+                'build_seconds': _percentiles([job.finished_at - job.started_at for job in finished]),
+            }
+
+    def shutdown(self):
+        """Stops taking jobs from the queue, waits for running builds and stops the worker pool."""
+        with self.condition:
+            self.stopping = True
+            self.condition.notify_all()
+        for thread in self.threads:
+            thread.join()
+        if self.executor is not None:
+            self.executor.shutdown()
+
+
+class BuildRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the JSON API of the BuildServer in self.server.build_server."""
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix-socket'
+
+    def log_message(self, format, *args):
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        build_server = self.server.build_server
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif self.path == '/metrics':
+            self._send_json(200, build_server.metrics())
+        elif self.path.startswith('/builds/'):
+            job = build_server.get(self.path[len('/builds/'):])
+            if job is None:
+                self._send_json(404, {'error': 'Unknown build'})
+            else:
+                self._send_json(200, job.to_dict())
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path != '/builds':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError("The request must be a JSON object with a source_path")
+            wait = request.pop('wait', False)
+            if not isinstance(wait, bool):
+                raise ValueError(f"Invalid wait {wait!r}; expected true or false")
+            config = config_from_request(request, self.server.build_server.jobs)
+            job = self.server.build_server.submit(config)
+        except (ValueError, TypeError, BuildError) as e:
+            self._send_json(400, {'error': str(e)})
+            return
+
+        if wait:
+            job.done.wait()
+            self._send_json(200, job.to_dict())
+        else:
+            self._send_json(202, job.to_dict())
+
+
+def config_from_request(request, default_jobs):
+    """
+    Turns the JSON body of POST /builds into a BuildConfig.
+
+    Raises:
+        ValueError: If source_path is missing, a field is unknown, or a value has the
+                    wrong type or is out of range. The message names the field.
+    """
+    if not isinstance(request, dict) or not request.get('source_path'):
+        raise ValueError("The request must be a JSON object with a source_path")
+    fields = {field.name: field.type for field in dataclasses.fields(BuildConfig)
+              if field.name not in ('command', 'report', 'profile')}
+    unknown = set(request) - set(fields)
+    if unknown:
+        raise ValueError(f"Unknown build settings: {', '.join(sorted(unknown))}")
+    request.setdefault('jobs', default_jobs)
+    values = {name: _check_setting(name, value, fields[name]) for name, value in request.items()}
+    return BuildConfig(**values)
+
+
+def _check_setting(name, value, field_type):
+    """Returns a request value as the BuildConfig field expects it, or raises ValueError naming the field."""
+    if typing.get_origin(field_type) is typing.Union:
+        # Optional[...] fields
+        if value is None:
+            return value
+        field_type = next(arg for arg in typing.get_args(field_type) if arg is not type(None))
+
+    if typing.get_origin(field_type) is tuple:
+        if not isinstance(value, list) or not all(isinstance(item, int) and not isinstance(item, bool) and item > 0
+                                                  for item in value):
+            raise ValueError(f"Invalid {name} {value!r}; expected a list of positive integers")
+        return tuple(value)
+
+    if field_type is int:
+        minimum, maximum = REQUEST_RANGES.get(name, (None, None))
+        if (not isinstance(value, int) or isinstance(value, bool) or (minimum is not None and value < minimum)
+                or (maximum is not None and value > maximum)):
+            expected = "an integer"
+            if minimum is not None and maximum is not None:
+                expected += f" from {minimum} to {maximum}"
+            elif minimum is not None:
+                expected += f" of at least {minimum}"
+            raise ValueError(f"Invalid {name} {value!r}; expected {expected}")
+    elif not isinstance(value, field_type):
+        raise ValueError(f"Invalid {name} {value!r}; expected {'true or false' if field_type is bool else 'a string'}")
+    return value
+
+
+def _stop_on_sigterm(signum, frame):
+    raise KeyboardInterrupt
+
+
+class _ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(build_server, host='127.0.0.1', port=DEFAULT_PORT, socket_path=None):
+    """Serves build_server over HTTP on host:port, or on a Unix socket if socket_path is set, until interrupted."""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        httpd = _ThreadingUnixHTTPServer(socket_path, BuildRequestHandler)
+        address = socket_path
+    else:
+        httpd = http.server.ThreadingHTTPServer((host, port), BuildRequestHandler)
+        address = f"http://{host}:{httpd.server_address[1]}"
+    httpd.build_server = build_server
+    # Stop as gracefully on `kill` as on Ctrl+C
+    signal.signal(signal.SIGTERM, _stop_on_sigterm)
+    logging.info(f"Build server listening on {address} with {len(build_server.threads)} builders. Press Ctrl+C to stop.")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Stopping the build server...")
+    finally:
+        httpd.server_close()
+        build_server.shutdown()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+def main(argv=None):
+    configure_logging()
+    parser = argparse.ArgumentParser(description="Serve md2app builds from a warm process")
+    parser.add_argument('--host', type=str, default='127.0.0.1', help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port to listen on, 0 for any free port (default: {DEFAULT_PORT})")
+    parser.add_argument('--socket', type=str, default=None, help="Listen on this Unix socket instead of a TCP port")
+    parser.add_argument('--concurrency', type=int, default=1, help="Number of builds that run at the same time (default: 1)")
+    parser.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1,
+                        help="Worker processes shared by all builds for rendering guides (default: number of CPUs)")
+    args = parser.parse_args(argv)
+
+    serve(BuildServer(args.concurrency, args.jobs), args.host, args.port, args.socket)
+
+
+if __name__ == '__main__':
+    main()
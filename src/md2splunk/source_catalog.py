@@ -0,0 +1,133 @@
+import os
+import re
+import logging
+
+# Guides rendered into the app: two-digit prefix, not an answers file
+GUIDE_NAME_PATTERN = re.compile(r'^\d{2}-(?!.*answers).*\.md$')
+
+# Numbered source files merged into the PDF, e.g. '01-lab.md'
+NUMBERED_NAME_PATTERN = re.compile(r'^\d{2}-.+\.md$')
+
+METADATA_FILE_NAMES = ('metadata.yml', 'metadata.yaml')
+
+
+def _scan(directory):
+    """
+    Lists a directory once.
+
+    Returns:
+        tuple: (stat results of its files keyed by name, names of its subdirectories),
+               both in directory order. Both are empty if it cannot be listed.
+    """
+    files = {}
+    directories = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            directories.append(entry.name)
+                    else:
+                        files[entry.name] = entry.stat()
+                except OSError as e:
+                    logging.warning(f"Skipping unreadable source file {entry.path}: {e}")
+    except (FileNotFoundError, NotADirectoryError):
+        pass
+    return files, directories
+
+
+class SourceCatalog:
+    """
+    One scan of a course's sources, shared by every step of a build.
+
+    The source directory and the Markdown directory are listed once, when the
+    catalog is created; the 'images' and 'static' trees are walked on first use.
+    Every file's stat result is kept, so later steps do not list or stat the
+    sources again, which is slow when courses are mounted over the network.
+    A catalog describes the sources at the time of the scan; build a new one
+    for every build.
+
+    Args:
+        source_path (str): The course directory.
+        md_files_path (str): Directory holding the Markdown files. By default the
+                             'lab-guides' folder if it contains .md files, else source_path.
+    """
+
+    def __init__(self, source_path, md_files_path=None):
+        self.source_path = source_path
+        self.source_files, source_directories = _scan(source_path)
+
+        if md_files_path is None:
+            md_files_path = source_path
+            if 'lab-guides' in source_directories:
+                lab_guides_path = os.path.join(source_path, 'lab-guides')
+                lab_guides_files, _ = _scan(lab_guides_path)
+                if any(name.endswith('.md') for name in lab_guides_files):
+                    md_files_path = lab_guides_path
+        self.md_files_path = str(md_files_path)
+
+        if os.path.normpath(self.md_files_path) == os.path.normpath(source_path):
+            self.files = self.source_files
+        else:
+            self.files, _ = _scan(self.md_files_path)
+        self._trees = {}
+
+    @property
+    def markdown_files(self):
+        """Names of the .md files in the Markdown directory."""
+        return sorted(name for name in self.files if name.endswith('.md'))
+
+    @property
+    def guides(self):
+        """Names of the guides rendered into the app, in navigation order."""
+        return [name for name in self.markdown_files if GUIDE_NAME_PATTERN.match(name)]
+
+    @property
+    def downloads(self):
+        """'downloads.md' if the course has a downloads page, else None."""
+        return 'downloads.md' if 'downloads.md' in self.files else None
+
+    @property
+    def introduction(self):
+        """Name of the introduction ('introduction.md', with or without a number), or None."""
+        return next((name for name in self.files if 'introduction.md' in name), None)
+
+    @property
+    def resources(self):
+        """Name of the resources page ('resources.md', with or without a number), or None."""
+        return next((name for name in self.files if 'resources.md' in name), None)
+
+    @property
+    def numbered_files(self):
+        """Names of the numbered Markdown files other than the introduction and resources."""
+        return sorted(name for name in self.files if NUMBERED_NAME_PATTERN.match(name)
+                      and 'introduction.md' not in name and 'resources.md' not in name)
+
+    @property
+    def metadata_path(self):
+        """Path of metadata.yml (or metadata.yaml) in the source directory, or None."""
+        for name in METADATA_FILE_NAMES:
+            if name in self.source_files:
+                return os.path.join(self.source_path, name)
+        return None
+
+    def tree(self, folder):
+        """
+        Returns every file under a folder of the Markdown directory, e.g. 'images' or 'static'.
+
+        Returns:
+            dict: Stat results keyed by path relative to the folder, with '/' separators,
+                  in os.walk order. Empty if the folder does not exist.
+        """
+        if folder not in self._trees:
+            tree = {}
+            pending = ['']
+            while pending:
+                relative_dir = pending.pop(0)
+                files, directories = _scan(os.path.join(self.md_files_path, folder, relative_dir))
+                for name, stat in files.items():
+                    tree[f"{relative_dir}{name}"] = stat
+                pending[:0] = [f"{relative_dir}{name}/" for name in directories]
+            self._trees[folder] = tree
+        return self._trees[folder]
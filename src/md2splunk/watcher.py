@@ -0,0 +1,115 @@
+import os
+import time
+import logging
+
+
+def get_watch_paths(source_path, md_files_path):
+    """
+    Lists the sources a watch-mode build depends on.
+
+    Args:
+        source_path (str): The course source directory.
+        md_files_path (str): Directory containing the Markdown guides.
+
+    Returns:
+        list: (path, recursive) tuples. Non-recursive directories only contribute their
+              top-level Markdown files, so the generated app, its archive and the build
+              manifest (which live next to the guides) never trigger a rebuild.
+    """
+    return [
+        (md_files_path, False),
+        (os.path.join(md_files_path, 'images'), True),
+        (os.path.join(md_files_path, 'static'), True),
+        (os.path.join(source_path, 'custom.css'), False),
+        (os.path.join(source_path, 'metadata.yml'), False),
+        (os.path.join(source_path, 'metadata.yaml'), False),
+    ]
+
+
+def _stat_entry(path, snapshot):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return
+    snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+
+
+def snapshot(watch_paths):
+    """
+    Records the modification time and size of every watched file.
+
+    Args:
+        watch_paths (list): (path, recursive) tuples as returned by get_watch_paths.
+
+    Returns:
+        dict: (mtime_ns, size) keyed by file path.
+    """
+    result = {}
+    for path, recursive in watch_paths:
+        if os.path.isfile(path):
+            _stat_entry(path, result)
+        elif os.path.isdir(path):
+            if recursive:
+                for root, _, files in os.walk(path):
+                    for file in files:
+                        _stat_entry(os.path.join(root, file), result)
+            else:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_file() and entry.name.endswith('.md'):
+                            _stat_entry(entry.path, result)
+    return result
+
+
+def diff_snapshots(before, after):
+    """Returns the sorted paths that were added, removed or modified between two snapshots."""
+    changed = {path for path in before.keys() | after.keys() if before.get(path) != after.get(path)}
+    return sorted(changed)
+
+
+def watch(watch_paths, on_change, interval=1.0, debounce=0.5):
+    """
+    Polls the watched paths and calls on_change(changed_paths) after each burst of edits.
+
+    Editors often write a file in several steps, so a rebuild only starts once the
+    sources have been quiet for `debounce` seconds. Runs until interrupted with Ctrl+C.
+
+    Args:
+        watch_paths (list): (path, recursive) tuples as returned by get_watch_paths.
+        on_change (callable): Called with the list of changed paths.
+        interval (float): Seconds between polls.
+        debounce (float): Seconds the sources must stay unchanged before rebuilding.
+    """
+    interval = max(0.05, interval)
+    previous = snapshot(watch_paths)
+    logging.info(f"Watching {len(previous)} files for changes (polling every {interval}s). Press Ctrl+C to stop.")
+
+    try:
+        while True:
+            time.sleep(interval)
+            current = snapshot(watch_paths)
+            changed = diff_snapshots(previous, current)
+            if not changed:
+                continue
+
+            # Wait for the burst of writes to settle
+            while True:
+                time.sleep(debounce)
+                settled = snapshot(watch_paths)
+                if settled == current:
+                    break
+                current = settled
+
+            changed = diff_snapshots(previous, current)
+            previous = current
+            if not changed:
+                continue
+
+            logging.info(f"Detected {len(changed)} changed file(s): {', '.join(os.path.basename(path) for path in changed[:5])}"
+                         + (" ..." if len(changed) > 5 else ""))
+            start = time.perf_counter()
+            on_change(changed)
+            logging.info(f"Rebuild finished in {time.perf_counter() - start:.2f}s. Waiting for changes...")
+            # Changes made during the rebuild are picked up by the next poll
+    except KeyboardInterrupt:
+        logging.info("Stopped watching.")
@@ -1,13 +1,16 @@
 import os
 import re
-import markdown
+import time
+import pathlib
+import itertools
 import datetime
 import logging
-from lxml import etree
-from xml.dom import minidom
 
-from md2splunk.html_generator import update_img_src
-from md2splunk.file_handler import read_file, write_file, process_download_links
+from md2splunk.renderer import render_markdown
+from md2splunk.html_pipeline import HtmlPipeline, panel_pipeline, heading_style_rules, style_headings
+from md2splunk.image_handler import find_image_references, get_image_size
+from md2splunk.file_handler import write_file, copy_download_assets, new_process_pool
+from md2splunk.build_report import resource_usage, usage_delta
 
 # https://facelessuser.github.io/pymdown-extensions/extensions/blocks/plugins/admonition/
 extensions = [
@@ -57,106 +60,246 @@ closing_tags = f'''<div>
     '''
 
 
-def convert_colons_to_blocks(md_text):
-    # Normalize line endings
-    md_text = md_text.replace('\r\n', '\n').replace('\r', '\n')
+# Numbered list items seen just before an answers block make it part of the list
+list_item_regex = re.compile(r'^\s*\d+\.')
+# A block type after "::: ", e.g. "note" in "::: note"
+block_type_regex = re.compile(r'(\w+)\s*')
+
+
+def _is_blank(line):
+    return not line.strip()
+
+
+def _convert_answers(lines):
+    """
+    Yields lines with every ::: answers ... ::: block rewritten to /// answers ... ///.
+
+    Blank lines before an answers block, blank lines after its opening line, and
+    blank lines after its closing ::: (except the last line break) are swallowed.
+    Answers that follow a numbered list item in one of the two lines before the
+    block are re-indented by four spaces so they nest inside the list item.
+    """
+    pending = []  # Blank lines that belong to the next answers block if one starts here
+    joined = False  # A block starting on this line continues the last line of the previous one
+    held = None  # Last line of the previous block, held back in case the next block joins it
+    exhausted = False  # Set once no closing ::: is left, so later openers fail in O(1)
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        if _is_blank(line):
+            pending.append(line)
+            i += 1
+            continue
+
+        block = None
+        if line.lstrip().startswith(':::') and not exhausted:
+            block, exhausted = _find_answers_block(lines, i)
+
+        if block is None:
+            if held is not None:
+                yield held
+                held = None
+            yield from pending
+            yield line
+            pending = []
+            joined = False
+            i += 1
+            continue
+
+        content_start, content_end, closer = block
+        content = '\n'.join(lines[content_start:content_end])
+
+        # Look at the two source lines before the block (and its leading blank lines)
+        block_start = i - len(pending) - int(joined)
+        is_in_list = any(list_item_regex.match(previous) for previous in lines[max(block_start - 2, 0):block_start])
 
-    # Convert ::: answers ... ::: to /// answers format for pymdownx.blocks.details
-    def answers_replacer(match):
-        content = match.group(1)
-        
-        # Check if answers block is indented (part of a list) by looking at the text before the match
-        start_pos = match.start()
-        text_before = md_text[:start_pos]
-        
-        # Look at the last three lines before this match
-        lines_before = text_before.split('\n')[-3:] 
-        
-        # If we see numbered list items recently, treat as indented
-        is_in_list = any(re.match(r'^\s*\d+\.', line) for line in lines_before)
-        
         if is_in_list:
-            # Use exactly 4 spaces for proper list item nesting
-            indent = '    '
-            # Re-indent all content lines to be consistent with the block indentation  
-            content_lines = content.split('\n')
-            indented_content = []
-            for line in content_lines:
-                if line.strip():  # If line has content
-                    indented_content.append(indent + line.strip())
-                else:  # Empty line
-                    indented_content.append('')
-            content = '\n'.join(indented_content)
+            # Use exactly 4 spaces for proper list item nesting, with blank lines around
+            # the block so it is parsed as part of the list item
+            replacement = ['', '    /// answers']
+            for content_line in content.split('\n'):
+                replacement.append('    ' + content_line.strip() if content_line.strip() else '')
+            replacement += ['    ///', '']
         else:
             # No indentation for standalone blocks - just clean up the content
-            indent = ''
-            content = content.strip()
-            
-        # For list items, we need blank lines before and after the block for proper parsing
-        if is_in_list:
-            return f'\n{indent}/// answers\n{content}\n{indent}///\n'
-        else:
-            return f'{indent}/// answers\n{content}\n{indent}///'
-    
-    # Capture the block boundaries including any leading whitespace
-    md_text = re.sub(
-        r'^\s*:::\s*answers\s*\n(.*?)\n\s*:::\s*(?=\n|$)',
-        answers_replacer,
-        md_text,
-        flags=re.DOTALL | re.MULTILINE
-    )
-
-    # Convert ::: <type> (excluding 'answers') to /// <type>
-    md_text = re.sub(
-        r'^:::\s*(?!answers\b)(\w+)\s*$',
-        lambda m: f'/// {m.group(1)}',
-        md_text,
-        flags=re.MULTILINE
-    )
-
-    # Convert closing ::: to /// followed by a newline
-    md_text = re.sub(
-        r'^:::\s*(?:\n|\Z)',
-        r'///\n',
-        md_text,
-        flags=re.MULTILINE
-    )
-
-    return md_text
-
-
-def add_custom_styles(html):
-    print("Applying custom CSS from file provided")
-    h3_tag_regex = re.compile(r'(<h3[^>]*>)(.*?)(</h3>)', re.IGNORECASE | re.DOTALL)
-    matches = re.findall(h3_tag_regex, html)
-
-    for match in matches:
-        opening_tag = match[0]
-        content = match[1]
-        closing_tag = match[2]
-
-        if "Task" in content:
-            if 'style' not in opening_tag:
-                updated_opening_tag = f'{opening_tag.rstrip(">")}'
-                updated_opening_tag += ' style="border-bottom: 1px solid black; padding: 5px; ">'
+            replacement = ['/// answers'] + content.strip().split('\n') + ['///']
+
+        if held is not None:
+            if joined:
+                replacement[0] = held + replacement[0]
             else:
-                updated_opening_tag = opening_tag.rstrip(">") + ' border-bottom: 1px solid black; padding: 5px;"' + ">"
+                yield held
+        yield from replacement[:-1]
+        held = replacement[-1]
+        pending = []
+
+        # The closing ::: swallows the blank lines after it but leaves the last line break.
+        # If the last blank line is empty, the next block may start right there and
+        # swallow that line break too.
+        resume = _next_non_blank(lines, closer + 1)
+        if resume is None:
+            break
+        joined = resume - 1 > closer and lines[resume - 1] == ''
+        i = resume
+
+    if held is not None:
+        yield held
+    yield from pending
+
+
+def _find_answers_block(lines, i):
+    """
+    Matches a ::: answers block whose opening ::: is on lines[i].
+
+    Returns:
+        tuple: ((content_start, content_end, closer), exhausted). The block is None
+               if lines[i] does not open an answers block. exhausted is True when no
+               closing ::: is left after this point.
+    """
+    rest = lines[i].lstrip()[3:]
+    answers_line = i
+    if _is_blank(rest):
+        # "answers" may follow on a later line after blank lines
+        answers_line = i + 1
+        while answers_line < len(lines) and _is_blank(lines[answers_line]):
+            answers_line += 1
+        if answers_line == len(lines):
+            return None, False
+        rest = lines[answers_line]
+
+    rest = rest.lstrip()
+    if not rest.startswith('answers') or not _is_blank(rest[len('answers'):]):
+        return None, False
+
+    # The content starts at the first non-blank line after the opening line
+    content_start = answers_line + 1
+    while content_start < len(lines) and _is_blank(lines[content_start]):
+        content_start += 1
+    if content_start >= len(lines):
+        return None, True
+
+    # The block ends at the first bare ::: line after the content starts
+    closer = content_start + 1
+    while closer < len(lines) and lines[closer].strip() != ':::':
+        closer += 1
+    if closer == len(lines):
+        # Without a later closer, a bare ::: right after the blank lines closes the
+        # block and the content is the last of those blank lines
+        if lines[content_start].strip() == ':::' and content_start - 1 > answers_line:
+            return (content_start - 1, content_start, content_start), True
+        return None, True
+
+    # Trailing blank lines before the closing ::: are not part of the content
+    content_end = closer
+    while _is_blank(lines[content_end - 1]):
+        content_end -= 1
+
+    return (content_start, content_end, closer), False
+
+
+def _next_non_blank(lines, i):
+    """Returns the index of the first non-blank line at or after i, or None at the end of the text."""
+    while i < len(lines):
+        if not _is_blank(lines[i]):
+            return i
+        i += 1
+    return None
+
+
+def _convert_admonitions(lines):
+    """
+    Yields lines with ::: <type> openers rewritten to /// <type> and bare ::: closers to ///.
+
+    Only ::: at the start of a line is converted. A type may follow a bare ::: on the
+    next non-blank line. Blank lines after a converted line are swallowed, except that
+    a closer at the end of the text keeps its trailing line break.
+    """
+    lines = iter(lines)
+    line = next(lines, None)
+    while line is not None:
+        if not line.startswith(':::'):
+            yield line
+            line = next(lines, None)
+            continue
+
+        rest = type_line = line[3:]
+        following = None
+        if _is_blank(rest):
+            # Look past blank lines for a type on the next non-blank line
+            following = next(lines, None)
+            while following is not None and _is_blank(following):
+                following = next(lines, None)
+            type_line = following if following is not None else ''
+
+        match = block_type_regex.fullmatch(type_line.lstrip())
+        if match and match.group(1) != 'answers':
+            yield f'/// {match.group(1)}'
+            # Swallow blank lines after the opener
+            line = next(lines, None)
+            while line is not None and _is_blank(line):
+                line = next(lines, None)
+            continue
+
+        if not _is_blank(rest):
+            yield line
+            line = next(lines, None)
+            continue
+
+        # Convert closing ::: to /// followed by a newline
+        yield '///'
+        if following is None:
+            yield ''
+        line = following
+
+
+def convert_colons_to_blocks(md_text):
+    """
+    Converts ::: blocks to the /// syntax of pymdownx.blocks in a single pass over the lines.
+
+    ::: answers ... ::: becomes a /// answers details block, nested in the list when it
+    follows a numbered list item. Other ::: <type> openers and bare ::: closers at the
+    start of a line become /// <type> and ///.
+    """
+    # Normalize line endings
+    md_text = md_text.replace('\r\n', '\n').replace('\r', '\n')
 
-            updated_tag = f'{updated_opening_tag}{content}{closing_tag}'
-            html = html.replace(match[0] + match[1] + match[2], updated_tag)
+    return '\n'.join(_convert_admonitions(_convert_answers(md_text.split('\n'))))
 
-    return html
+
+def add_custom_styles(html, rules=None):
+    """
+    Adds inline styles to headings.
+
+    Kept for callers outside the build; generate_guides applies heading styles with
+    html_pipeline.style_headings as part of panel_pipeline.
+
+    Args:
+        html (str): Panel HTML.
+        rules (list): (tag, keyword, CSS declarations) rules. Defaults to heading_style_rules.
+
+    Returns:
+        str: HTML with the declarations of every matching rule added to each heading,
+             serialized as XML.
+    """
+    pipeline = HtmlPipeline()
+    pipeline.register('heading_styles', style_headings)
+    context = {} if rules is None else {'heading_style_rules': rules}
+    return pipeline.run(html, context)
 
 
 def generate_nav(app_dict):
     source_path = app_dict.get('source_path')
     md_files_path = app_dict.get('md_files_path', source_path)  # Fallback to source_path for backward compatibility
     default_path = app_dict.get('default_path')
-    guide_name_pattern = app_dict.get('guide_name_pattern')
+    catalog = app_dict['catalog']
 
     # Set the path to write the navigation XML
     nav_path = os.path.join(default_path, 'data', 'ui', 'nav')
-    os.makedirs(nav_path, exist_ok=True)
+    sink = app_dict.get('sink')
+    if sink is None:
+        os.makedirs(nav_path, exist_ok=True)
+
+    from lxml import etree
 
     # Create the root <nav> element
     nav = etree.Element('nav', color="#154e7a")
@@ -168,16 +311,14 @@ def generate_nav(app_dict):
     guides_collection = etree.SubElement(nav, 'collection', label="Lab Guides")
 
     # Add views to the collection, excluding "00-introduction"
-    sorted_path = sorted(os.listdir(md_files_path))
-    for file_name in sorted_path:
-        if guide_name_pattern.match(file_name):
-            view_name = os.path.splitext(file_name)[0]
-            if view_name != "00-introduction":  # Exclude "00-introduction" from the collection
-                etree.SubElement(guides_collection, 'view', name=view_name)
+    for file_name in catalog.guides:
+        view_name = os.path.splitext(file_name)[0]
+        if view_name != "00-introduction":  # Exclude "00-introduction" from the collection
+            etree.SubElement(guides_collection, 'view', name=view_name)
 
     # --- NEW FEATURE: Check for downloads.md and add to navigation if it exists ---
     downloads_md_path = os.path.join(md_files_path, "downloads.md")
-    if os.path.exists(downloads_md_path): # Check if downloads.md exists. [5, 7, 8, 9, 10]
+    if catalog.downloads: # Check if downloads.md exists. [5, 7, 8, 9, 10]
         print(f"Found {downloads_md_path}, adding 'Downloads' collection to navigation.")
         downloads_collection = etree.SubElement(nav, 'collection', label="Downloads") # Create new collection. [11, 12, 13, 14, 15]
         etree.SubElement(downloads_collection, 'view', name="downloads") # Add view for downloads. [11, 12, 13, 14, 15]
@@ -187,76 +328,219 @@ def generate_nav(app_dict):
 
     # Write the XML to the default.xml file
     default_xml_path = os.path.join(nav_path, "default.xml")
-    write_file(default_xml_path, xml_str)
+    write_file(default_xml_path, xml_str, sink)
 
     print(f"default.xml generated at {default_xml_path}")
 
-def generate_guides(app_dict):
+def list_guides(app_dict):
+    """Returns the file names in md_files_path that generate_guides renders."""
+    catalog = app_dict['catalog']
+    # Process files matching the guide pattern OR if it's "downloads.md"
+    return catalog.guides + ([catalog.downloads] if catalog.downloads else [])
+
+
+def render_guide(app_dict, file_name, img_src_map=None):
+    """
+    Renders one guide to its view and panel XML without writing anything to the app.
+
+    The panel HTML goes through panel_pipeline (image srcs, download links, heading
+    styles). Download links are resolved but not copied, so this is safe to run in
+    worker processes; generate_guides writes the results and copies downloads in order.
+    img_src_map is an optional src -> URL map shared across guides.
+
+    Returns:
+        dict: Paths and contents of the view and panel, plus the download assets to publish
+              and the time and resources spent rendering it ('profile').
+    """
+    started = time.time()
+    start = time.perf_counter()
+    usage = resource_usage()
     source_path = app_dict.get('source_path')
     md_files_path = app_dict.get('md_files_path', source_path)  # Fallback to source_path for backward compatibility
     views_path = app_dict.get('views_path')
     panels_path = app_dict.get('panels_path')
     app_dir = app_dict.get('app_dir')
-    guide_name_pattern = app_dict.get('guide_name_pattern')
-
-    # Iterate through all guide files in the markdown files directory
-    for file_name in os.listdir(md_files_path):
-        # --- MODIFIED CONDITION: Include downloads.md in processing ---
-        # Process files matching the guide pattern OR if it's "downloads.md"
-        if guide_name_pattern.match(file_name) or file_name == "downloads.md":
-            view_name = os.path.splitext(file_name)[0]
-            panel_name = os.path.splitext(file_name)[0] + '.xml'
-            guide_path = os.path.join(md_files_path, file_name)
-
-            # Read the guide file and process its content
-            with open(guide_path, 'r', encoding="utf-8") as file:
-                lines = file.readlines()
-
-            # Determine guide title. For downloads.md, if the file is empty, use a default title.
-            # Otherwise, extract from the first line, assuming it follows the '# Title' format.
-            if file_name == "downloads.md" and not lines:
-                guide_title = "Downloads"
-            elif lines:
-                guide_title = lines[0].strip()[2:]  # Extract the title from the first line
-            else:
-                guide_title = view_name.replace('-', ' ').title() # Fallback title if file is empty and not downloads.md
-
-            preprocessed = ''.join(lines)
-
-            # Create an individual dashboard XML for the guide
-            dashboard = etree.Element('dashboard', version="1.1", stylesheet='dashboard.css', hideEdit="true")
-            label = etree.SubElement(dashboard, 'label')
-            label.text = guide_title
-            row1 = etree.SubElement(dashboard, 'row')
-            panel = etree.SubElement(row1, 'panel', ref=view_name, app=app_dir)
-
-            # Write the dashboard XML
-            xml_str = etree.tostring(dashboard, encoding='utf-8').decode()
-            view_xml_path = os.path.join(views_path, view_name + '.xml')
-            write_file(view_xml_path, xml_str)
-
-            # Convert the Markdown content to HTML for the panel
-            preprocessed = convert_colons_to_blocks(preprocessed)
-            html = markdown.markdown(preprocessed, extensions=extensions, extension_configs=extension_configs)
-
-            # Apply custom styles and update image paths
-            html = update_img_src(app_dict, html)
-            
-            # Process download links if this is a downloads file
-            if 'downloads' in file_name.lower():
-                html = process_download_links(
-                    html, 
-                    app_dict['md_files_path'], 
-                    app_dict['static_path'], 
-                    app_dict['app_dir'], 
-                    app_dict.get('course_title')
-                )
-            
-            html = add_custom_styles(html)
-
-            # Wrap the processed HTML with opening and closing tags
-            content = f"{opening_tags}{html}{closing_tags}" # Using f-string for content. [1, 2, 3, 4, 6]
-            panel_xml_path = os.path.join(panels_path, panel_name)
-
-            # Write the panel content
-            write_file(panel_xml_path, content)
\ No newline at end of file
+
+    view_name = os.path.splitext(file_name)[0]
+    panel_name = os.path.splitext(file_name)[0] + '.xml'
+    guide_path = os.path.join(md_files_path, file_name)
+
+    # Read the guide file and process its content
+    with open(guide_path, 'r', encoding="utf-8") as file:
+        lines = file.readlines()
+
+    # Determine guide title. For downloads.md, if the file is empty, use a default title.
+    # Otherwise, extract from the first line, assuming it follows the '# Title' format.
+    if file_name == "downloads.md" and not lines:
+        guide_title = "Downloads"
+    elif lines:
+        guide_title = lines[0].strip()[2:]  # Extract the title from the first line
+    else:
+        guide_title = view_name.replace('-', ' ').title() # Fallback title if file is empty and not downloads.md
+
+    preprocessed = ''.join(lines)
+
+    # Create an individual dashboard XML for the guide
+    from lxml import etree
+    dashboard = etree.Element('dashboard', version="1.1", stylesheet=app_dict.get('stylesheet', 'dashboard.css'), hideEdit="true")
+    label = etree.SubElement(dashboard, 'label')
+    label.text = guide_title
+    row1 = etree.SubElement(dashboard, 'row')
+    panel = etree.SubElement(row1, 'panel', ref=view_name, app=app_dir)
+
+    xml_str = etree.tostring(dashboard, encoding='utf-8').decode()
+    view_xml_path = os.path.join(views_path, view_name + '.xml')
+
+    # With responsive images or fingerprinted assets the panel also depends on the
+    # size or the content of every image it shows
+    images_folder = os.path.join(md_files_path, 'images')
+    image_dependencies = {}
+    if app_dict.get('responsive_images') or app_dict.get('asset_fingerprints') or app_dict.get('image_aliases'):
+        for reference in sorted(find_image_references(preprocessed)):
+            image_path = os.path.join(images_folder, reference)
+            if os.path.isfile(image_path):
+                image_dependencies[image_path] = reference
+
+    # Download links are resolved against files next to the guide, so only pages
+    # without them can be served from the shared render cache.
+    render_cache = app_dict.get('render_cache')
+    cache_key = None
+    cache_status = None
+    if render_cache is not None and 'downloads' not in file_name.lower():
+        settings = {
+            'app_dir': app_dir,
+            'command': app_dict.get('command'),
+            'heading_style_rules': heading_style_rules,
+            'responsive_images': app_dict.get('responsive_images'),
+        }
+        if app_dict.get('responsive_images'):
+            settings['image_sizes'] = {reference: get_image_size(path) for path, reference in image_dependencies.items()}
+        if app_dict.get('image_aliases'):
+            aliases = app_dict['image_aliases']
+            settings['image_aliases'] = {reference: aliases.get(reference) for reference in image_dependencies.values()}
+        if app_dict.get('asset_fingerprints'):
+            fingerprints = app_dict['asset_fingerprints']
+            settings['image_fingerprints'] = {reference: fingerprints.get(reference) for reference in image_dependencies.values()}
+        cache_key = render_cache.make_key(preprocessed, extensions, extension_configs, settings)
+
+    context = {
+        'app_dict': app_dict,
+        'file_name': file_name,
+        'img_src_map': {} if img_src_map is None else img_src_map,
+        'download_assets': [],
+    }
+    timings = {}
+    html = render_cache.get(cache_key) if cache_key else None
+    if html is not None:
+        cache_status = 'hit'
+    else:
+        # Convert the Markdown content to HTML for the panel
+        preprocessed = convert_colons_to_blocks(preprocessed)
+        html = render_markdown(preprocessed, extensions, extension_configs)
+
+        # Update image paths, process download links and apply custom styles on one parsed tree
+        html = panel_pipeline.run(html, context, timings)
+
+        if cache_key:
+            render_cache.put(cache_key, html)
+            cache_status = 'miss'
+
+    # Wrap the processed HTML with opening and closing tags
+    content = f"{opening_tags}{html}{closing_tags}" # Using f-string for content. [1, 2, 3, 4, 6]
+    panel_xml_path = os.path.join(panels_path, panel_name)
+
+    return {
+        'file_name': file_name,
+        'view_xml_path': view_xml_path,
+        'view_xml': xml_str,
+        'panel_xml_path': panel_xml_path,
+        'panel_xml': content,
+        'downloads': context['download_assets'],
+        'images': list(image_dependencies),
+        'dependencies': context.get('dependencies', []),
+        'deduplicated': context.get('deduplicated', []),
+        'timings': timings,
+        'cache': cache_status,
+        'profile': {'started': started, 'seconds': time.perf_counter() - start, 'pid': os.getpid(),
+                    **usage_delta(usage, resource_usage())},
+    }
+
+
+def generate_guides(app_dict, file_names=None):
+    """
+    Generates a view and a panel for each guide.
+
+    Guides are rendered in a process pool when app_dict['jobs'] is greater than one,
+    using app_dict['executor'] if the caller keeps a pool warm across builds.
+    With app_dict['sink'] set, the views, panels and downloads go to the archive.
+    Results are always written in file order from this process, so the output is
+    identical to a serial build and workers never race on the downloads folder.
+
+    Args:
+        app_dict (dict): Build settings and paths.
+        file_names (list): Guide file names to render. Defaults to every guide in md_files_path.
+
+    Returns:
+        dict: Keyed by guide file name, the generated artifacts (relative to output_path),
+              the source files each guide depends on besides itself and the profile
+              returned by render_guide.
+    """
+    output_path = app_dict.get('output_path')
+    jobs = app_dict.get('jobs') or 1
+    sink = app_dict.get('sink')
+
+    if file_names is None:
+        file_names = list_guides(app_dict)
+
+    executor = None
+    if jobs > 1 and len(file_names) > 1:
+        pool = app_dict.get('executor')
+        if pool is None:
+            executor = pool = new_process_pool(min(jobs, len(file_names)))
+        logging.info(f"Rendering {len(file_names)} guides with up to {min(jobs, len(file_names))} worker processes")
+        # The pool itself cannot be sent to the workers, and they never write to the sink
+        worker_app_dict = dict(app_dict, executor=None, sink=None, catalog=None)
+        rendered = pool.map(render_guide, itertools.repeat(worker_app_dict), file_names)
+    else:
+        img_src_map = {}
+        rendered = (render_guide(app_dict, file_name, img_src_map) for file_name in file_names)
+
+    results = {}
+    timings = {}
+    cache_counts = {'hit': 0, 'miss': 0}
+    try:
+        for guide in rendered:
+            if guide['cache']:
+                cache_counts[guide['cache']] += 1
+            for name, seconds in guide['timings'].items():
+                timings[name] = timings.get(name, 0.0) + seconds
+            # Write the dashboard XML and the panel content
+            write_file(guide['view_xml_path'], guide['view_xml'], sink)
+            write_file(guide['panel_xml_path'], guide['panel_xml'], sink)
+            copy_download_assets(guide['downloads'], sink)
+
+            artifacts = [guide['view_xml_path'], guide['panel_xml_path']] + [destination for _, destination in guide['downloads']]
+            if output_path:
+                artifacts = [pathlib.Path(artifact).relative_to(output_path).as_posix() for artifact in artifacts]
+            results[guide['file_name']] = {
+                'artifacts': artifacts,
+                'dependencies': [str(source) for source, _ in guide['downloads']] + guide['images'] + guide['dependencies'],
+                'deduplicated': guide['deduplicated'],
+                'profile': guide['profile'],
+            }
+            logging.debug(f"Rendered {guide['file_name']} in {guide['profile']['seconds'] * 1000:.1f} ms")
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if timings:
+        summary = ', '.join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in timings.items())
+        logging.info(f"Panel post-processing time across {len(results)} guides: {summary}")
+
+    render_cache = app_dict.get('render_cache')
+    if render_cache is not None:
+        logging.info(f"Render cache: {cache_counts['hit']} hits, {cache_counts['miss']} misses "
+                     f"({len(results) - cache_counts['hit'] - cache_counts['miss']} guides not cacheable).")
+        render_cache.prune()
+
+    return results
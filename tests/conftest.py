@@ -0,0 +1,64 @@
+import os
+
+import pytest
+from PIL import Image
+
+from md2splunk.md2app import build_app
+from md2splunk.build_config import BuildConfig
+
+GUIDES = {
+    '00-introduction.md': "# Introduction\n\nWelcome. ![logo](images/logo.png)\n\n::: note\nThis is a note.\n:::\n",
+    '01-lab-one.md': (
+        "# Lab One\n\n### Task 1: Do things\n\n1. Step one\n2. Step two\n    ![shot](./images/sub/shot.png)\n"
+        "3. What is the answer?\n\n    ::: answers\n    The answer is 42.\n    :::\n\n4. Next step\n\n"
+        "::: warning\nCareful!\n:::\n"
+    ),
+    '02-lab-two.md': "# Lab Two\n\n### Task 1: More\n\nImage again ![x](images/logo.png)\n",
+    'downloads.md': "# Downloads\n\n- [Data file](files/data.csv)\n- [External](https://example.com)\n",
+}
+
+
+def write_image(path, size=(64, 32), color=(200, 30, 30)):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.new('RGB', size, color).save(path, format='PNG')
+
+
+@pytest.fixture
+def make_course(tmp_path):
+    """Returns a function that writes a small course to tmp_path/<name>/course and returns its path."""
+    def make(name='a', title='Test Course'):
+        course = tmp_path / name / 'course'
+        course.mkdir(parents=True)
+        (course / 'metadata.yml').write_text(f"course_title: {title}\nversion: 1.0.0\ndescription: A test course\n")
+        for file_name, text in GUIDES.items():
+            (course / file_name).write_text(text)
+        write_image(str(course / 'images' / 'logo.png'))
+        write_image(str(course / 'images' / 'sub' / 'shot.png'), color=(30, 200, 30))
+        write_image(str(course / 'images' / 'unused.png'), color=(30, 30, 200))
+        write_image(str(course / 'static' / 'appIcon.png'), size=(36, 36))
+        (course / 'static' / 'extra.css').write_text(".extra {}\n")
+        (course / 'files').mkdir()
+        (course / 'files' / 'data.csv').write_text("a,b\n1,2\n")
+        return course
+    return make
+
+
+@pytest.fixture
+def build(tmp_path):
+    """Returns a function that builds a course without packaging or caches and returns the BuildResult."""
+    def run(course, **settings):
+        settings = {'jobs': 1, 'no_package': True, 'no_cache': True,
+                    'image_cache_dir': str(tmp_path / 'image-cache'), **settings}
+        return build_app(BuildConfig(str(course), **settings))
+    return run
+
+
+def read_tree(path):
+    """Returns the content of every file under path, keyed by path relative to it."""
+    files = {}
+    for root, _, names in os.walk(path):
+        for name in names:
+            full_path = os.path.join(root, name)
+            with open(full_path, 'rb') as f:
+                files[os.path.relpath(full_path, path)] = f.read()
+    return files
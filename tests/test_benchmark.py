@@ -0,0 +1,26 @@
+import sys
+import json
+import subprocess
+
+import pytest
+
+from md2splunk.benchmark import DEFERRED_IMPORTS, STARTUP_MODULES
+
+CHECK = """
+import sys, json, logging
+import {module}
+print(json.dumps({{'modules': sorted(sys.modules), 'handlers': len(logging.getLogger().handlers)}}))
+"""
+
+
+@pytest.mark.parametrize('module', STARTUP_MODULES)
+def test_command_line_tools_defer_build_imports(module):
+    output = subprocess.run([sys.executable, '-c', CHECK.format(module=module)],
+                            capture_output=True, text=True, check=True).stdout
+    result = json.loads(output)
+
+    loaded = sorted({package for package in DEFERRED_IMPORTS for name in result['modules']
+                     if name == package or name.startswith(f"{package}.")})
+    assert loaded == []
+    # Importing the package must not configure the host application's logging
+    assert result['handlers'] == 0
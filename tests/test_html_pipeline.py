@@ -0,0 +1,59 @@
+import os
+
+from lxml import etree
+
+from md2splunk.file_handler import hash_file, process_download_links
+from md2splunk.html_pipeline import HtmlPipeline, panel_pipeline
+from md2splunk.xml_generator import add_custom_styles
+
+
+def _run_downloads_page(html, app_dict):
+    context = {'app_dict': app_dict, 'file_name': 'downloads.md'}
+    return panel_pipeline.run(html, context), context
+
+
+def test_download_of_the_published_file_itself_is_not_reported_as_deduplicated(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('course/static')
+    os.makedirs('course/files')
+    with open('course/static/handout.pdf', 'w') as f:
+        f.write("handout")
+    with open('course/files/copy.pdf', 'w') as f:
+        f.write("handout")
+    # The course is given as a relative path, as on the command line
+    app_dict = {
+        'md_files_path': 'course',
+        'static_path': 'course_app/appserver/static',
+        'app_dir': 'course_app',
+        'dedup_targets': {hash_file('course/static/handout.pdf'): ('handout.pdf', os.path.join('course', 'static', 'handout.pdf'))},
+    }
+
+    html, context = _run_downloads_page('<a href="static/handout.pdf">Handout</a>', app_dict)
+    assert 'href="/static/app/course_app/handout.pdf"' in html
+    assert context.get('deduplicated', []) == []
+
+    html, context = _run_downloads_page('<a href="files/copy.pdf">Copy</a>', app_dict)
+    assert 'href="/static/app/course_app/handout.pdf"' in html
+    assert context['deduplicated'] == [(str((tmp_path / 'course' / 'files' / 'copy.pdf').resolve()), len("handout"))]
+
+
+def test_leading_text_is_escaped():
+    html = HtmlPipeline().run('Fish & chips <b>&lt;today&gt;</b> & more', {})
+
+    assert html == 'Fish &amp; chips <b>&lt;today&gt;</b> &amp; more'
+    etree.fromstring(f"<panel>{html}</panel>")
+
+
+def test_add_custom_styles_and_process_download_links_run_the_pipeline_transforms(tmp_path):
+    styled = add_custom_styles('<h3>Task 1</h3><h3>Notes</h3>')
+    assert styled == '<h3 style="border-bottom: 1px solid black; padding: 5px;">Task 1</h3><h3>Notes</h3>'
+
+    (tmp_path / 'files').mkdir()
+    (tmp_path / 'files' / 'data.csv').write_text("a,b\n")
+    copied = []
+    html = process_download_links('<a href="files/data.csv">Data</a>', str(tmp_path), tmp_path / 'static', 'course_app',
+                                  copied_files=copied)
+
+    assert html == '<a href="/static/app/course_app/downloads/data.csv">Data</a>'
+    assert (tmp_path / 'static' / 'downloads' / 'data.csv').read_text() == "a,b\n"
+    assert copied == [((tmp_path / 'files' / 'data.csv').resolve(), tmp_path / 'static' / 'downloads' / 'data.csv')]
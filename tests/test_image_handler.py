@@ -0,0 +1,32 @@
+import markdown
+from lxml import html
+
+from md2splunk.image_handler import find_image_references, image_reference_from_src
+
+
+def _rendered_references(text):
+    """The image references of the img srcs Python-Markdown renders for text."""
+    root = html.fragment_fromstring(markdown.markdown(text), create_parent='div')
+    return {image_reference_from_src(img.get('src')) for img in root.iter('img')}
+
+
+def test_file_names_with_spaces_match_the_rendered_src():
+    text = (
+        '![x](images/Screen Shot 1.png)\n\n'
+        '![y](images/sub/a b.png "A title")\n\n'
+        "![z](./images/c d.png 'Title')\n\n"
+        '![w](<images/e f.png>)\n\n'
+        '![v](images/g(1).png)\n'
+    )
+    expected = {'Screen Shot 1.png', 'sub/a b.png', 'c d.png', 'e f.png', 'g(1).png'}
+
+    assert _rendered_references(text) == expected
+    assert find_image_references(text) == expected
+
+
+def test_html_and_css_references():
+    text = ('<img src="images/h i.png"> <img src=\'./images/j.png\'>\n'
+            '.hero { background: url(images/k.png); } .logo { background: url("images/l m.png"); }\n'
+            'See images/n.png or myimages/o.png')
+
+    assert find_image_references(text) == {'h i.png', 'j.png', 'k.png', 'l m.png', 'n.png'}
@@ -0,0 +1,37 @@
+import os
+
+from PIL import Image
+
+from md2splunk.image_optimizer import optimize_image
+
+
+def _write_photo(path, quality):
+    """Writes a JPEG with enough detail that re-encoding at a higher quality grows it."""
+    image = Image.effect_noise((640, 480), 64).convert('RGB')
+    image.save(path, format='JPEG', quality=quality)
+
+
+def test_untagged_jpeg_is_never_made_larger(tmp_path):
+    source = tmp_path / 'photo.jpg'
+    destination = tmp_path / 'optimized.jpg'
+    _write_photo(source, quality=50)
+
+    size = optimize_image(str(source), str(destination), max_width=0)
+
+    assert size == (640, 480)
+    assert os.path.getsize(destination) <= os.path.getsize(source)
+
+
+def test_orientation_tag_is_applied(tmp_path):
+    source = tmp_path / 'rotated.jpg'
+    destination = tmp_path / 'optimized.jpg'
+    exif = Image.Exif()
+    exif[0x0112] = 6  # Rotate 90 degrees clockwise to display
+    Image.new('RGB', (40, 20), (200, 10, 10)).save(source, format='JPEG', exif=exif)
+
+    size = optimize_image(str(source), str(destination), max_width=0)
+
+    assert size == (20, 40)
+    with Image.open(destination) as optimized:
+        assert optimized.size == (20, 40)
+        assert optimized.getexif().get(0x0112, 1) == 1
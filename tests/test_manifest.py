@@ -0,0 +1,67 @@
+import os
+import shutil
+
+import pytest
+
+from conftest import read_tree
+
+PANELS = os.path.join('default', 'data', 'ui', 'panels')
+VIEWS = os.path.join('default', 'data', 'ui', 'views')
+
+
+@pytest.fixture
+def course(make_course, build):
+    """A course with a finished incremental build."""
+    course = make_course()
+    build(course, incremental=True)
+    return course
+
+
+def assert_matches_full_build(result, course, build):
+    """The incremental app must be exactly what a full build of the same sources writes."""
+    reference = course.parent.parent / 'reference' / 'course'
+    shutil.copytree(course, reference)
+    assert read_tree(result.output_path) == read_tree(build(reference).output_path)
+
+
+def test_unchanged_rebuild_renders_nothing(course, build):
+    before = read_tree(course.parent / 'test_course_app')
+
+    result = build(course, incremental=True)
+
+    assert result.report['guides'] == {}
+    assert read_tree(result.output_path) == before
+
+
+def test_edited_guide_is_rendered_again(course, build):
+    with open(course / '02-lab-two.md', 'a') as f:
+        f.write("\nA new paragraph.\n")
+
+    result = build(course, incremental=True)
+
+    assert sorted(result.report['guides']) == ['02-lab-two.md']
+    assert b'A new paragraph.' in read_tree(result.output_path)[os.path.join(PANELS, '02-lab-two.xml')]
+    assert_matches_full_build(result, course, build)
+
+
+def test_deleted_image_is_pruned(course, build):
+    published = course.parent / 'test_course_app' / 'appserver' / 'static' / 'images' / 'unused.png'
+    assert published.is_file()
+    os.remove(course / 'images' / 'unused.png')
+
+    result = build(course, incremental=True)
+
+    assert not published.exists()
+    assert result.report['guides'] == {}
+    assert_matches_full_build(result, course, build)
+
+
+def test_deleted_guide_artifacts_are_pruned(course, build):
+    guide_artifacts = {os.path.join(PANELS, '02-lab-two.xml'), os.path.join(VIEWS, '02-lab-two.xml')}
+    assert guide_artifacts <= set(read_tree(course.parent / 'test_course_app'))
+    os.remove(course / '02-lab-two.md')
+
+    result = build(course, incremental=True)
+
+    assert not guide_artifacts & set(read_tree(result.output_path))
+    assert_matches_full_build(result, course, build)
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from md2splunk.md2app import package_app
+from md2splunk.packager import ARCHIVE_FORMATS, archive_format_available, get_archive_path
+
+
+def write_app(path, umask, mtime):
+    """Writes the same small app under path with the given umask and file timestamps."""
+    previous_umask = os.umask(umask)
+    try:
+        files = {
+            'default/app.conf': "[launcher]\nversion = 1.0.0\n",
+            'default/data/ui/views/01-lab.xml': "<dashboard/>\n",
+            'appserver/static/images/logo.png': "not really a png",
+            'bin/run.sh': "#!/bin/sh\n",
+        }
+        for relative_path, content in files.items():
+            file_path = path / relative_path
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            file_path.write_text(content)
+            os.utime(file_path, (mtime, mtime))
+        os.chmod(path / 'bin' / 'run.sh', 0o777 & ~umask)
+    finally:
+        os.umask(previous_umask)
+
+
+@pytest.mark.parametrize('archive_format', [name for name in ARCHIVE_FORMATS if archive_format_available(name)])
+def test_same_tree_gives_byte_identical_archives(tmp_path, monkeypatch, archive_format):
+    monkeypatch.delenv('SOURCE_DATE_EPOCH', raising=False)
+    first = tmp_path / 'first' / 'course_app'
+    second = tmp_path / 'second' / 'course_app'
+    write_app(first, 0o022, 1_600_000_000)
+    write_app(second, 0o077, 1_700_000_000)
+
+    package_app(first, 'course_app', archive_format)
+    package_app(second, 'course_app', archive_format)
+
+    first_bytes = get_archive_path(first, 'course_app', archive_format).read_bytes()
+    second_bytes = get_archive_path(second, 'course_app', archive_format).read_bytes()
+    assert first_bytes == second_bytes
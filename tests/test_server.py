@@ -0,0 +1,73 @@
+import json
+import shutil
+import threading
+import http.client
+import http.server
+
+import pytest
+
+from md2splunk.server import BuildServer, BuildRequestHandler, config_from_request
+
+
+@pytest.fixture
+def build_server():
+    server = BuildServer(concurrency=2, jobs=1)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def post(build_server):
+    """Returns a function that sends a POST /builds body to an HTTP server and returns (status, JSON reply)."""
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), BuildRequestHandler)
+    httpd.build_server = build_server
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+
+    def send(body):
+        connection = http.client.HTTPConnection('127.0.0.1', httpd.server_address[1])
+        connection.request('POST', '/builds', body=body)
+        response = connection.getresponse()
+        return response.status, json.loads(response.read())
+
+    yield send
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.mark.parametrize('request_body, field', [
+    ({'source_path': '/x', 'jobs': 'x'}, 'jobs'),
+    ({'source_path': '/x', 'jobs': 0}, 'jobs'),
+    ({'source_path': '/x', 'jpeg_quality': 200}, 'jpeg_quality'),
+    ({'source_path': '/x', 'incremental': 'yes'}, 'incremental'),
+    ({'source_path': '/x', 'srcset_widths': [480, -1]}, 'srcset_widths'),
+    ({'source_path': ['/x']}, 'source_path'),
+])
+def test_invalid_settings_name_the_field(request_body, field):
+    with pytest.raises(ValueError, match=f"Invalid {field} "):
+        config_from_request(request_body, 1)
+
+
+@pytest.mark.parametrize('body', [b'[1]', b'"course"', b'{"source_path": "/x", "wait": "yes"}', b'{'])
+def test_malformed_requests_get_a_400(post, body):
+    status, reply = post(body)
+
+    assert status == 400
+    assert 'pop expected' not in reply['error']
+
+
+def test_courses_building_into_the_same_app_never_run_at_once(make_course, build_server, post):
+    first = make_course('shared')
+    second = first.parent / 'other-course'
+    shutil.copytree(first, second)
+
+    jobs = [post(json.dumps({'source_path': str(course), 'no_package': True, 'no_cache': True})) for course in (first, second)]
+    assert [status for status, _ in jobs] == [202, 202]
+    jobs = [build_server.get(reply['id']) for _, reply in jobs]
+    for job in jobs:
+        job.done.wait(60)
+
+    assert jobs[0].output_path == jobs[1].output_path
+    assert [job.status for job in jobs] == ['succeeded', 'succeeded']
+    earlier, later = sorted(jobs, key=lambda job: job.started_at)
+    assert later.started_at >= earlier.finished_at
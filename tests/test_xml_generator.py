@@ -0,0 +1,68 @@
+import pytest
+
+from conftest import read_tree
+from md2splunk.xml_generator import convert_colons_to_blocks
+
+# Golden outputs of the original regex-based conversion; the single-pass rewrite
+# must produce them exactly, quirks included.
+CASES = {
+    'answers nested in a list': (
+        "1. Run the search.\n\n    ::: answers\n    index=main\n      | stats count\n    :::\n\n2. Next step.\n",
+        "1. Run the search.\n\n    /// answers\n    index=main\n    | stats count\n    ///\n\n2. Next step.\n",
+    ),
+    'answers type on the following line in a list': (
+        "1. Step.\n:::\nanswers\nYes.\n:::\n",
+        "1. Step.\n\n    /// answers\n    Yes.\n    ///\n",
+    ),
+    'standalone answers': (
+        "Intro.\n\n::: answers\n  The answer.\n:::\nAfter.\n",
+        "Intro.\n/// answers\nThe answer.\n///\nAfter.\n",
+    ),
+    'back-to-back blocks': (
+        "::: note\nFirst.\n:::\n::: warning\nSecond.\n:::\n",
+        "/// note\nFirst.\n///\n/// warning\nSecond.\n///\n",
+    ),
+    'back-to-back answers': (
+        "::: answers\nA\n:::\n\n::: answers\nB\n:::\n",
+        "/// answers\nA\n////// answers\nB\n///",
+    ),
+    'back-to-back answers after a list item': (
+        "1. Step.\n::: answers\nA\n:::\n::: answers\nB\n:::\n2. Next.\n",
+        "1. Step.\n\n    /// answers\n    A\n    ///\n\n/// answers\nB\n///\n2. Next.\n",
+    ),
+    'answers followed by a note': (
+        "::: answers\nA\n:::\n::: note\nN\n:::",
+        "/// answers\nA\n///\n/// note\nN\n///\n",
+    ),
+    'block type on the following line': (
+        ":::\n\nnote\nBody.\n:::\n",
+        "/// note\nBody.\n///\n",
+    ),
+    'CRLF input': (
+        "::: tip\r\nUse CRLF.\r\n:::\r\n",
+        "/// tip\nUse CRLF.\n///\n",
+    ),
+    'unclosed answers block': (
+        "::: answers\nNo closer here.\n",
+        "::: answers\nNo closer here.\n",
+    ),
+    'unclosed note': (
+        "::: note\nStill open.\n",
+        "/// note\nStill open.\n",
+    ),
+}
+
+
+@pytest.mark.parametrize('text, expected', CASES.values(), ids=CASES.keys())
+def test_convert_colons_to_blocks(text, expected):
+    assert convert_colons_to_blocks(text) == expected
+
+
+@pytest.mark.parametrize('settings', [{}, {'fingerprint_assets': True, 'dedup_assets': True, 'responsive_images': True}],
+                         ids=['defaults', 'fingerprinted'])
+def test_serial_and_parallel_builds_write_the_same_app(make_course, build, settings):
+    serial = build(make_course('serial'), jobs=1, **settings)
+    parallel = build(make_course('parallel'), jobs=2, **settings)
+
+    assert serial.output_path != parallel.output_path
+    assert read_tree(parallel.output_path) == read_tree(serial.output_path)